@@ -0,0 +1,129 @@
+"""
+bench_dsr.py — Verificación y throughput de dsr_decoder con payloads grabados.
+
+Uso:
+    python bench_dsr.py                  # fixtures/dsr/*.json
+    python bench_dsr.py --dir capturas   # payloads grabados con POWERBI_QUERYDATA_DUMP
+    python bench_dsr.py --rows 200000    # tamaño de la matriz sintética
+
+1. Decodifica cada fixture ({"request", "response"}) y, si existe
+   fixtures/dsr/expected.json, compara las filas con las esperadas.
+2. Mide filas/s decodificando los fixtures en bucle.
+3. Arma una matriz grande a partir del esquema de la tabla de tiendas y
+   compara el pico de memoria del recorrido en streaming contra `flatten`.
+"""
+
+import argparse
+import json
+import sys
+import time
+import tracemalloc
+from datetime import datetime
+from pathlib import Path
+
+import dsr_decoder
+
+FIXTURES = Path(__file__).parent / "fixtures" / "dsr"
+
+
+def _jsonable(row: dict) -> dict:
+    return {k: v.isoformat() if isinstance(v, datetime) else v for k, v in row.items()}
+
+
+def check(fixtures: list[Path], expected: dict) -> bool:
+    ok = True
+    for path in fixtures:
+        payload = json.loads(path.read_text(encoding="utf-8"))["response"]
+        try:
+            rows = [_jsonable(r) for _, r in dsr_decoder.iter_response(payload)]
+        except dsr_decoder.DSRError as e:
+            print(f"❌ {path.name}: {e}")
+            ok = False
+            continue
+        want = expected.get(path.stem)
+        if want is None:
+            print(f"➖ {path.name}: {len(rows)} filas (sin esperado)")
+        elif rows == want:
+            print(f"✅ {path.name}: {len(rows)} filas")
+        else:
+            ok = False
+            print(f"❌ {path.name}: difiere del esperado")
+            for got, exp in zip(rows, want):
+                if got != exp:
+                    print(f"   obtenido: {got}\n   esperado: {exp}")
+                    break
+            if len(rows) != len(want):
+                print(f"   filas: {len(rows)} vs {len(want)}")
+    return ok
+
+
+def throughput(fixtures: list[Path], seconds: float = 2.0):
+    payloads = [json.loads(p.read_text(encoding="utf-8"))["response"] for p in fixtures]
+    rows, loops = 0, 0
+    t0 = time.perf_counter()
+    while time.perf_counter() - t0 < seconds:
+        for payload in payloads:
+            for _ in dsr_decoder.iter_response(payload):
+                rows += 1
+        loops += 1
+    elapsed = time.perf_counter() - t0
+    print(f"⚡ fixtures: {rows / elapsed:,.0f} filas/s ({loops} vueltas, {rows} filas)")
+
+
+def synthetic(template: dict, n_rows: int) -> dict:
+    """Repite las filas comprimidas de la tabla grabada hasta `n_rows`."""
+    data = json.loads(json.dumps(template["results"][0]["result"]["data"]))
+    ds = data["dsr"]["DS"][0]
+    entries = ds["PH"][0]["DM0"]
+    head, body = entries[0], [e for e in entries[1:] if "S" not in e] or [entries[0]]
+    repeated = [head] + [body[i % len(body)] for i in range(n_rows - 1)]
+    ds["PH"][0]["DM0"] = repeated
+    return data
+
+
+def memory(template: dict, n_rows: int):
+    data = synthetic(template, n_rows)
+
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    count = sum(1 for _ in dsr_decoder.iter_rows(data))
+    stream_s = time.perf_counter() - t0
+    _, stream_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+
+    tracemalloc.start()
+    t0 = time.perf_counter()
+    _, rows = dsr_decoder.flatten(data)
+    flat_s = time.perf_counter() - t0
+    _, flat_peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del rows
+
+    print(f"📦 matriz sintética de {count:,} filas:")
+    print(f"   streaming: {count / stream_s:,.0f} filas/s, pico {stream_peak / 1024:,.0f} KB")
+    print(f"   flatten:   {count / flat_s:,.0f} filas/s, pico {flat_peak / 1024:,.0f} KB")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--dir", type=Path, default=FIXTURES)
+    ap.add_argument("--rows", type=int, default=100_000)
+    ap.add_argument("--seconds", type=float, default=2.0)
+    args = ap.parse_args()
+
+    fixtures = sorted(p for p in args.dir.glob("*.json") if p.name != "expected.json")
+    if not fixtures:
+        sys.exit(f"Sin payloads en {args.dir}")
+    expected_path = args.dir / "expected.json"
+    expected = json.loads(expected_path.read_text(encoding="utf-8")) if expected_path.exists() else {}
+
+    ok = check(fixtures, expected)
+    throughput(fixtures, args.seconds)
+    table = FIXTURES / "store_table.json"
+    if table.exists():
+        memory(json.loads(table.read_text(encoding="utf-8"))["response"], args.rows)
+    sys.exit(0 if ok else 1)
+
+
+if __name__ == "__main__":
+    main()
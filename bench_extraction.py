@@ -0,0 +1,264 @@
+"""
+bench_extraction.py — Primitivas de extracción contra los dumps del DOM, sin PowerBI.
+
+Uso:
+    python bench_extraction.py                        # 30 vueltas, bench_extraction.json
+    python bench_extraction.py --iterations 200
+    python bench_extraction.py --only page_text,harvest_rows
+    python bench_extraction.py --baseline antes.json  # compara p50 con otra corrida
+
+Levanta un servidor HTTP en 127.0.0.1 que sirve los dumps grabados con
+dump_dom.py como un reporte estático:
+
+    reporte     dom_dump.html con sus iframes de visuales apuntando a
+                dom_dump_frame_1..5.html (mismo orden que page.frames)
+    top_places  top_places_dom.html dentro de un <visual-container>
+
+A todos se les quitan los <script> y las hojas de estilo externas (el visor
+de PowerBI re-renderizaría la página) y Chromium aborta cualquier request
+fuera de 127.0.0.1. Sobre cada fixture mide, vuelta por vuelta, las
+primitivas del camino caliente (texto de la página, índice de visuales,
+snapshots, cosecha y barrido de filas, parsers) y escribe los percentiles
+en JSON. Los selectores aprendidos no se tocan (POWERBI_SELECTOR_CACHE=off).
+"""
+
+import os
+
+os.environ.setdefault("POWERBI_SELECTOR_CACHE", "off")
+
+import argparse
+import asyncio
+import json
+import math
+import platform
+import re
+import statistics
+import sys
+import threading
+import time
+from datetime import datetime
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+import report_parser
+from browser_pool import BrowserPool
+from extraction_core import VIEWPORT, normalize_text
+from table_rows import harvest_rows
+from visual_index import RECORD, SUCCESS_RATE, index_for, text_parts
+
+ROOT      = Path(__file__).parent
+OUT       = "bench_extraction.json"
+TIENDA    = "PORONGOCHE"
+SLICER    = "Nro. Visita"
+PCTS      = (50, 90, 95, 99)
+
+_SCRIPT_RE = re.compile(r"<script\b[^>]*>.*?</script>", re.IGNORECASE | re.DOTALL)
+_LINK_RE   = re.compile(r"<link\b[^>]*>", re.IGNORECASE)
+_IFRAME_RE = re.compile(r"(<iframe\b[^>]*?\bsrc=\")[^\"]*(\")", re.IGNORECASE)
+
+
+# ── Fixtures ──────────────────────────────────────────────────────────────────
+def static_html(html: str) -> str:
+    """El dump sin scripts ni estilos externos: queda el DOM tal como se grabó."""
+    return _LINK_RE.sub("", _SCRIPT_RE.sub("", html))
+
+
+def build_site() -> dict[str, dict[str, bytes]]:
+    """{fixture: {ruta: html}}; la primera ruta de cada fixture es la página."""
+    read = lambda name: (ROOT / name).read_text(encoding="utf-8", errors="replace")
+    frames = sorted(ROOT.glob("dom_dump_frame_[1-9].html"))
+    sources = iter(f"/reporte/{p.name}" for p in frames)
+    # Los iframes del dump, en orden, a los frames grabados; los que sobren quedan vacíos
+    main = _IFRAME_RE.sub(lambda m: m.group(1) + next(sources, "about:blank") + m.group(2),
+                          static_html(read("dom_dump.html")))
+    site = {"reporte": {"/reporte/": main, **{f"/reporte/{p.name}": static_html(read(p.name)) for p in frames}}}
+    if (ROOT / "top_places_dom.html").exists():
+        site["top_places"] = {"/top_places/": (
+            "<!DOCTYPE html><html><body><visual-container class=\"visual-container-component\">"
+            f"{read('top_places_dom.html')}</visual-container></body></html>")}
+    return {name: {path: html.encode("utf-8") for path, html in pages.items()} for name, pages in site.items()}
+
+
+def serve(site: dict) -> ThreadingHTTPServer:
+    pages = {path: body for fixture in site.values() for path, body in fixture.items()}
+
+    class Handler(BaseHTTPRequestHandler):
+        def log_message(self, *args):
+            pass
+
+        def do_GET(self):
+            body = pages.get(self.path.split("?")[0])
+            self.send_response(200 if body is not None else 404)
+            self.send_header("Content-Type", "text/html; charset=utf-8")
+            self.send_header("Content-Length", str(len(body or b"")))
+            self.end_headers()
+            self.wfile.write(body or b"")
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+# ── Primitivas ────────────────────────────────────────────────────────────────
+async def inner_text_body(page):
+    """Lectura anterior a visual_index: inner_text del body, frame por frame."""
+    parts = []
+    for frame in page.frames:
+        try:
+            parts += (await frame.inner_text("body", timeout=5000)).split("\n")
+        except Exception:
+            pass
+    return parts
+
+
+async def row_scan(page):
+    """La parte sin clicks de find_score_in_table: cosecha, match de la tienda y nota de la fila."""
+    rows = await harvest_rows(page, await index_for(page).report_frames())
+    tienda = normalize_text(TIENDA)
+    return [report_parser.row_score(r.text) for r in rows if tienda in normalize_text(r.text)]
+
+
+def primitives(page, text: str, rows: list[str]) -> dict:
+    """{nombre: corrutina sin argumentos}; el índice queda caliente salvo en index_build."""
+    idx = index_for(page)
+    parse, row_score = report_parser.parse, report_parser.row_score.__wrapped__
+
+    async def index_build():
+        idx.invalidate()
+        await idx.ensure()
+
+    async def page_text_visuals():
+        return await text_parts(page, await idx.of_kind(RECORD, SUCCESS_RATE))
+
+    async def parse_page():
+        parsed = parse(text)
+        return parsed.success_rates, parsed.record_updates
+
+    async def parse_rows():
+        return [row_score(r) for r in rows]
+
+    return {
+        "page_text":             lambda: text_parts(page),
+        "page_text_visuals":     page_text_visuals,
+        "inner_text_body":       lambda: inner_text_body(page),
+        "index_build":           index_build,
+        "slicer_lookup":         lambda: idx.slicer(SLICER),
+        "snapshot_all":          lambda: idx.snapshot(),
+        "snapshot_success_rate": lambda: idx.snapshot(SUCCESS_RATE),
+        "harvest_rows":          lambda: harvest_rows(page, idx.frames or None),
+        "row_scan":              lambda: row_scan(page),
+        "parse_page":            parse_page,
+        "parse_rows":            parse_rows,
+    }
+
+
+# ── Medición ──────────────────────────────────────────────────────────────────
+def percentile(ordered: list[float], p: float) -> float:
+    """Percentil por rango más cercano sobre una lista ordenada."""
+    return ordered[max(0, math.ceil(p / 100 * len(ordered)) - 1)]
+
+
+def summarize(times_ms: list[float]) -> dict:
+    ordered = sorted(times_ms)
+    out = {"n": len(ordered), "mean": statistics.fmean(ordered), "min": ordered[0], "max": ordered[-1],
+           "stdev": statistics.pstdev(ordered)}
+    out.update({f"p{p}": percentile(ordered, p) for p in PCTS})
+    return {k: round(v, 3) if isinstance(v, float) else v for k, v in out.items()}
+
+
+async def measure(fn, iterations: int, warmup: int) -> dict:
+    for _ in range(warmup):
+        await fn()
+    times = []
+    for _ in range(iterations):
+        t0 = time.perf_counter()
+        await fn()
+        times.append((time.perf_counter() - t0) * 1000)
+    return summarize(times)
+
+
+async def bench_fixture(pool: BrowserPool, base: str, name: str, path: str, args) -> dict:
+    async with pool.page() as page:
+        await page.route("**/*", lambda route: route.continue_()
+                         if route.request.url.startswith(base) else route.abort())
+        t0 = time.perf_counter()
+        await page.goto(base + path, wait_until="load")
+        load_ms = (time.perf_counter() - t0) * 1000
+
+        idx = await index_for(page).ensure()
+        text = "\n".join(await text_parts(page))
+        rows = [r.text for r in await harvest_rows(page)]
+        found = {
+            "load_ms": round(load_ms, 1), "frames": len(page.frames), "visuals": len(idx.visuals),
+            "kinds": {k: len(v) for k, v in idx.by_kind.items()}, "slicers": sorted(idx.slicers),
+            "rows": len(rows), "text_chars": len(text),
+            "success_rate": getattr(report_parser.success_rate(text), "value", None),
+            "record_update": report_parser.record_update(text)[0],
+        }
+        print(f"\n📄 {name}: {found['frames']} frames, {found['visuals']} visuales {found['kinds']}, "
+              f"{found['rows']} filas, {found['text_chars']:,} caracteres (carga {load_ms:.0f} ms)")
+        if not idx.visuals:
+            print("   ⚠️ El índice no reconoce visuales en este dump; las primitivas del índice miden vacío")
+
+        results = {}
+        for label, fn in primitives(page, text, rows).items():
+            if args.only and label not in args.only:
+                continue
+            results[label] = stats = await measure(fn, args.iterations, args.warmup)
+            print(f"   ⏱️ {label:<22} p50={stats['p50']:>8.2f} ms  p95={stats['p95']:>8.2f} ms  "
+                  f"p99={stats['p99']:>8.2f} ms")
+        return {"fixture": found, "primitives": results}
+
+
+def compare(current: dict, baseline_path: str):
+    """Razón de p50 contra otra corrida (x<1 = más rápido ahora)."""
+    baseline = json.loads(Path(baseline_path).read_text(encoding="utf-8"))["results"]
+    print(f"\n📊 p50 contra {baseline_path}")
+    for fixture, data in current.items():
+        for label, stats in data["primitives"].items():
+            old = baseline.get(fixture, {}).get("primitives", {}).get(label)
+            if old and old["p50"]:
+                print(f"   {fixture}/{label:<22} {old['p50']:>8.2f} → {stats['p50']:>8.2f} ms  "
+                      f"(x{stats['p50'] / old['p50']:.2f})")
+
+
+async def run(args) -> dict:
+    site = build_site()
+    server = serve(site)
+    base = f"http://127.0.0.1:{server.server_port}"
+    results = {}
+    try:
+        async with BrowserPool(size=1, viewport=VIEWPORT) as pool:
+            for name, pages in site.items():
+                results[name] = await bench_fixture(pool, base, name, next(iter(pages)), args)
+    finally:
+        server.shutdown()
+    return results
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--iterations", type=int, default=30)
+    ap.add_argument("--warmup", type=int, default=3)
+    ap.add_argument("--only", type=lambda s: {x.strip() for x in s.split(",") if x.strip()}, default=None,
+                    help="primitivas separadas por coma")
+    ap.add_argument("--out", default=OUT)
+    ap.add_argument("--baseline", help="JSON de una corrida anterior para comparar")
+    args = ap.parse_args()
+
+    results = asyncio.run(run(args))
+    report = {
+        "meta": {"date": datetime.now().isoformat(timespec="seconds"), "iterations": args.iterations,
+                 "warmup": args.warmup, "viewport": VIEWPORT, "python": platform.python_version(),
+                 "platform": platform.platform()},
+        "results": results,
+    }
+    Path(args.out).write_text(json.dumps(report, ensure_ascii=False, indent=1), encoding="utf-8")
+    print(f"\n💾 Resultados en {args.out}")
+    if args.baseline:
+        compare(results, args.baseline)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
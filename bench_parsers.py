@@ -0,0 +1,221 @@
+"""
+bench_parsers.py — report_parser contra los parsers anteriores, sobre los textos grabados.
+
+Uso:
+    python bench_parsers.py                 # debug_Visita*.txt, log_final.txt, parsed*.txt
+    python bench_parsers.py --seconds 5     # más tiempo por medición
+    python bench_parsers.py otro.txt ...    # otros textos
+
+1. Compara, texto por texto, el resultado de report_parser con el de las
+   funciones que había en check_and_notify.py y telegram_bot.py (copiadas
+   abajo tal cual, sin los prints) y lista las diferencias.
+2. Mide llamadas/s de cada función vieja y de la nueva; row_score en frío
+   (sin memoización) y en caliente (la misma fila otra vez, como pasa entre
+   visitas), RecordUpdate sobre la página completa y sobre el texto corto
+   de la tarjeta.
+"""
+
+import argparse
+import re
+import sys
+import time
+from pathlib import Path
+
+import report_parser
+
+ROOT = Path(__file__).parent
+CORPORA = ["debug_Visita*.txt", "log_final.txt", "parsed.txt", "parsed2.txt"]
+
+
+# ── Parsers anteriores (referencia) ──────────────────────────────────────────
+def legacy_success_rate_cn(text: str) -> str | None:
+    """parse_success_rate de check_and_notify.py."""
+    lines = [line.strip() for line in text.split("\n") if line.strip()]
+    normalized = " ".join(text.split())
+    for pattern in (r"Suce?ss\s+Rat[e\s]*[\s\n]*(\d{1,3})\s*%", r"Suce?ss\s*Rat[^%]{0,200}?(\d{1,3})\s*%"):
+        m = re.search(pattern, normalized, re.IGNORECASE)
+        if m and 0 < int(m.group(1)) <= 100:
+            return f"{int(m.group(1))}%"
+    valid_pcts = []
+    for line in lines[-80:]:
+        if any(kw in line.lower() for kw in ['ampliado', 'microsoft', 'top places', 'lugar', 'growth']):
+            continue
+        m = re.fullmatch(r"(\d{1,3})\s*%", line)
+        if m and 0 < int(m.group(1)) <= 100:
+            valid_pcts.append(int(m.group(1)))
+    if valid_pcts:
+        return f"{valid_pcts[-1]}%"
+    for pattern in (r"Resumen General[^%]{0,200}?(\d{1,3})\s*%", r"Nota\D{0,30}?(\d{1,3})\s*%",
+                    r"Items\s+con\s+nota[^%]{0,100}?(\d{1,3})\s*%"):
+        m = re.search(pattern, normalized, re.IGNORECASE)
+        if m and 0 < int(m.group(1)) <= 100:
+            return f"{int(m.group(1))}%"
+    return None
+
+
+def legacy_success_rate_tg(text: str) -> str | None:
+    """parse_success_rate de telegram_bot.py."""
+    lines = [line.strip() for line in text.split("\n") if line.strip()]
+    sr_idx = next((i for i, line in enumerate(lines) if re.search(r"Suce?ss\s*Rate", line, re.IGNORECASE)), None)
+    if sr_idx is None:
+        return None
+    after = lines[sr_idx + 1: sr_idx + 15]
+    for j, aline in enumerate(after):
+        if any(kw in aline.lower() for kw in ['top places', 'time line', 'controllers', 'criterio', 'barra de datos']):
+            continue
+        m = re.fullmatch(r"(\d{1,3})\s*%", aline)
+        if m and 0 < int(m.group(1)) <= 100:
+            return f"{int(m.group(1))}%"
+        if re.fullmatch(r"\d{1,3}", aline) and j + 1 < len(after) and re.fullmatch(r"%", after[j + 1]):
+            if 0 < int(aline) <= 100:
+                return f"{int(aline)}%"
+    return None
+
+
+def legacy_record_update(text: str) -> tuple[str | None, str | None]:
+    t = re.sub(r'RecordUpdat\s*e', 'RecordUpdate', text, flags=re.IGNORECASE)
+    m = re.search(r"RecordUpdate\s*([\d]{1,2}\s*-\s*([A-Za-z]{3})\s*[\d]{1,2}\s*:\s*[\d]{2})", t, re.IGNORECASE)
+    if m:
+        return m.group(1).strip(), m.group(2).strip().capitalize()
+    m = re.search(r"([\d]{1,2}\s*-\s*([A-Za-z]{3})\s*[\d]{1,2}\s*:\s*[\d]{2})", t, re.IGNORECASE)
+    return (m.group(1).strip(), m.group(2).strip().capitalize()) if m else (None, None)
+
+
+def legacy_row_score(row_text: str) -> str | None:
+    valid = [int(x) for x in re.findall(r"(\d{1,3})\s*%", row_text) if 0 < int(x) <= 100]
+    if valid:
+        return f"{valid[0]}%"
+    valid_dec = [int(x) for x in re.findall(r"(\d{1,3})[.,]\d+", row_text) if 0 < int(x) <= 100]
+    return f"{valid_dec[0]}%" if valid_dec else None
+
+
+# ── Nuevos, con la misma firma ───────────────────────────────────────────────
+def new_success_rate(text: str) -> str | None:
+    c = report_parser.success_rate(text)
+    return c.value if c else None
+
+
+def new_row_score(text: str) -> str | None:
+    c = report_parser.row_score(text)
+    return c.value if c else None
+
+
+# ── Corpus ───────────────────────────────────────────────────────────────────
+def read_text(path: Path) -> str:
+    raw = path.read_bytes()
+    if raw[:2] in (b"\xff\xfe", b"\xfe\xff"):
+        text = raw.decode("utf-16")
+    else:
+        text = raw.decode("utf-8-sig", errors="replace")
+    return text.replace("\r\n", "\n")
+
+
+def load(paths: list[str]) -> dict[str, str]:
+    files = [Path(p) for p in paths] if paths else sorted(
+        {p for pattern in CORPORA for p in ROOT.glob(pattern)})
+    return {p.name: read_text(p) for p in files}
+
+
+# ── Comparación y medición ───────────────────────────────────────────────────
+def compare(texts: dict[str, str], rows: list[str]) -> int:
+    diffs = 0
+    pairs = [("success_rate (check_and_notify)", legacy_success_rate_cn, new_success_rate),
+             ("success_rate (telegram_bot)", legacy_success_rate_tg, new_success_rate),
+             ("record_update", legacy_record_update, report_parser.record_update)]
+    for name, text in texts.items():
+        for label, old, new in pairs:
+            a, b = old(text), new(text)
+            mark = "✅" if a == b else "➖"
+            diffs += a != b
+            prov = report_parser.success_rate(text) if label.startswith("success") else None
+            print(f"{mark} {name} · {label}: {a!r} → {b!r}" + (f" ({prov.label})" if prov else ""))
+    row_diffs = [(r, legacy_row_score(r), new_row_score(r)) for r in rows
+                 if legacy_row_score(r) != new_row_score(r)]
+    # row_score tiene su propio recorrido (solo números); debe coincidir con parse()
+    paths = [r for r in rows if new_row_score(r) != next(
+        (c.value for c in report_parser.parse(r).row_scores), None)]
+    print(f"{'✅' if not paths else '❌'} row_score vs parse(): {len(rows) - len(paths)}/{len(rows)} líneas iguales")
+    print(f"{'✅' if not row_diffs else '➖'} row_score: {len(rows) - len(row_diffs)}/{len(rows)} líneas iguales")
+    for r, a, b in row_diffs[:10]:
+        print(f"   {r[:70]!r}: {a!r} → {b!r}")
+    return diffs + len(row_diffs) + len(paths)
+
+
+def rate(fn, inputs: list[str], seconds: float) -> float:
+    calls = 0
+    t0 = time.perf_counter()
+    while time.perf_counter() - t0 < seconds:
+        for text in inputs:
+            fn(text)
+        calls += len(inputs)
+    return calls / (time.perf_counter() - t0)
+
+
+def cold(fn, cached=report_parser.row_score):
+    """`fn` sin la memoización de `cached`: cada llamada vuelve a recorrer el texto."""
+    name = cached.__name__
+
+    def run(text):
+        setattr(report_parser, name, cached.__wrapped__)
+        try:
+            return fn(text)
+        finally:
+            setattr(report_parser, name, cached)
+    return run
+
+
+def card_texts(pages: list[str]) -> list[str]:
+    """Texto de la tarjeta RecordUpdate armado con la fecha de cada página (lo que lee el camino por visual)."""
+    cards = []
+    for text in pages:
+        m = re.search(r"^.*\d{1,2}\s*-\s*[A-Za-z]{3}\s*\d{1,2}\s*:\s*\d{2}.*$", text, re.MULTILINE)
+        if m:
+            cards.append(f"RecordUpdate\n{m.group(0).strip()}")
+    return cards
+
+
+def measure(texts: dict[str, str], rows: list[str], seconds: float):
+    pages = list(texts.values())
+    cards = card_texts(pages)
+    cases = [
+        ("success_rate", pages, [("check_and_notify", legacy_success_rate_cn), ("telegram_bot", legacy_success_rate_tg),
+                                 ("report_parser", new_success_rate)]),
+        ("record_update", pages, [("anterior", legacy_record_update),
+                                  ("report_parser", report_parser.record_update)]),
+        ("RU tarjeta", cards, [("anterior", legacy_record_update),
+                               ("report_parser", report_parser.record_update)]),
+        ("row_score", rows, [("anterior", legacy_row_score),
+                             ("report_parser frío", cold(new_row_score, report_parser.row_score)),
+                             ("report_parser caliente", new_row_score)]),
+    ]
+    for case, inputs, fns in cases:
+        if not inputs:
+            print(f"➖ {case:<18} sin textos")
+            continue
+        base = None
+        for label, fn in fns:
+            r = rate(fn, inputs, seconds)
+            base = base or r
+            print(f"⚡ {case:<18} {label:<24} {r:>12,.0f} llamadas/s  (x{r / base:.1f})")
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("files", nargs="*")
+    ap.add_argument("--seconds", type=float, default=1.0)
+    args = ap.parse_args()
+
+    texts = load(args.files)
+    if not texts:
+        print("❌ Sin textos para medir")
+        return 1
+    rows = [line for text in texts.values() for line in text.split("\n") if line.strip()]
+    print(f"📄 {len(texts)} textos, {sum(map(len, texts.values())):,} caracteres, {len(rows)} líneas\n")
+    diffs = compare(texts, rows)
+    print(f"\n{diffs} diferencias con los parsers anteriores\n")
+    measure(texts, rows, args.seconds)
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
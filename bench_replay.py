@@ -0,0 +1,174 @@
+"""
+bench_replay.py — Prueba de query_replay contra un servidor querydata local.
+
+Levanta un servidor HTTP/1.1 en 127.0.0.1 que imita el endpoint querydata:
+responde en formato DSR a partir de una pequeña tabla en memoria, aplicando
+los filtros Mes / Supervisor / Nro. Visita que trae cada query. El motor
+aprende las plantillas de fixtures/dsr (como si vinieran de una corrida con
+navegador) y luego:
+
+1. lee RecordUpdate y las notas por replay y las compara con lo esperado,
+2. mide la latencia de `extract_scores` en varias vueltas,
+3. verifica los caminos de respaldo: HTTP 500 y cambio de esquema.
+
+Uso:
+    python bench_replay.py [--rounds 50]
+"""
+
+import argparse
+import asyncio
+import json
+import statistics
+import sys
+import tempfile
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+
+from query_replay import ReplayEngine, _in_conditions, _filter_kind
+from querydata_capture import QueryCapture
+
+FIXTURES   = Path(__file__).parent / "fixtures" / "dsr"
+REPORT_URL = ("https://app.powerbi.com/view?r=eyJrIjoiZWQ1YWNiYjctNWNiNC00MTNlLThjOG"
+              "EtNjE1NDc2NTI4NWU2IiwidCI6ImE4MzE3NzZjLWM0ZTUtNDNhMC04ZmZhLTFkNjIxZWNlZDAzNiIsImMiOjl9")
+TIENDAS    = ["PORONGOCHE", "MALL PORONGOCHE"]
+VISITAS    = ["Visita 1", "Visita 2"]
+RECORD_MS  = 1747315380000   # 15 - MAY 13:23
+
+# (Mes, Supervisor, Nro. Visita, Tienda, Success Rate)
+DATA = [
+    ("Mayo", "YOHN",  "Visita 1", "PORONGOCHE",      0.86),
+    ("Mayo", "YOHN",  "Visita 1", "MALL PORONGOCHE", 0.83),
+    ("Mayo", "YOHN",  "Visita 2", "PORONGOCHE",      0.91),
+    ("Mayo", "MARIA", "Visita 1", "CALLAO",          1.0),
+    ("Abril", "YOHN", "Visita 1", "PORONGOCHE",      0.5),
+]
+EXPECTED = {
+    "PORONGOCHE":      {"Visita 1": "86%", "Visita 2": "91%"},
+    "MALL PORONGOCHE": {"Visita 1": "83%", "Visita 2": "Sin visita"},
+}
+
+
+class StandIn(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+    mode = "ok"          # ok | error | schema
+    requests = 0
+
+    def log_message(self, *args):
+        pass
+
+    def do_POST(self):
+        StandIn.requests += 1
+        body = json.loads(self.rfile.read(int(self.headers["Content-Length"])))
+        if StandIn.mode == "error" or not self.headers.get("X-PowerBI-ResourceKey"):
+            return self._reply(500, {"error": "boom"})
+        results = [{"jobId": f"j{i}", "result": {"data": self._answer(q)}}
+                   for i, q in enumerate(body["queries"])]
+        self._reply(200, {"jobIds": [r["jobId"] for r in results], "results": results})
+
+    def _answer(self, query: dict) -> dict:
+        select = [s["Name"] for s in query["Query"]["Commands"][0]["SemanticQueryDataShapeCommand"]["Query"]["Select"]]
+        if StandIn.mode == "schema":
+            select = select + ["Base.Columna Nueva"]
+        keys = [f"G{i}" for i in range(len(select))]
+        descriptor = {"Select": [{"Value": k, "Name": n} for k, n in zip(keys, select)]}
+        if any("RecordUpdate" in n for n in select):
+            rows = [{"S": [{"N": "G0", "T": 7}], "G0": RECORD_MS}]
+        else:
+            filters = {}
+            for cond, prop in _in_conditions(query):
+                filters[_filter_kind(prop)] = cond["Values"][0][0]["Literal"]["Value"].strip("'")
+            hits = [r for r in DATA if r[0] == filters.get("mes") and r[1] == filters.get("supervisor")
+                    and r[2] == filters.get("visita")]
+            by_name = {"Base.Fecha": lambda r: "05/12", "Base.Nro. Visita": lambda r: r[2],
+                       "Base.Tienda": lambda r: r[3], "Base.Success Rate": lambda r: r[4]}
+            rows = []
+            for i, r in enumerate(hits):
+                row = {k: by_name.get(n, lambda r: None)(r) for k, n in zip(keys, select)}
+                if i == 0:
+                    row["S"] = [{"N": k} for k in keys]
+                rows.append(row)
+        return {"descriptor": descriptor, "dsr": {"DS": [{"N": "DS0", "PH": [{"DM0": rows}]}]}}
+
+    def _reply(self, status: int, payload: dict):
+        data = json.dumps(payload).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+
+def learned_capture(api_url: str) -> QueryCapture:
+    """Captura como la que deja una corrida con navegador (requests de los fixtures)."""
+    capture = QueryCapture()
+    for name in ("record_update_card", "store_table"):
+        fx = json.loads((FIXTURES / f"{name}.json").read_text(encoding="utf-8"))
+        capture.remember(api_url, fx["request"])
+    return capture
+
+
+async def run(rounds: int) -> bool:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), StandIn)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    api_url = f"http://127.0.0.1:{server.server_port}/public/reports/querydata?synchronous=true"
+    ok = True
+
+    with tempfile.TemporaryDirectory() as tmp:
+        engine = ReplayEngine(path=str(Path(tmp) / "replay.json"))
+        n = engine.learn(learned_capture(api_url), REPORT_URL, {"mes": "May", "supervisor": "YOHN"})
+        print(f"📚 {n} plantillas aprendidas")
+
+        record = await engine.record_update()
+        scores = await engine.extract_scores("May", "YOHN", VISITAS, TIENDAS)
+        print(f"🕐 RecordUpdate: {record!r}")
+        print(f"📊 Notas: {scores}")
+        if record != "15 - MAY    13 : 23" or scores != EXPECTED:
+            print("❌ El replay no coincide con lo esperado")
+            ok = False
+
+        todas = await engine.extract_scores("May", "MARIA", VISITAS)
+        print(f"📊 MARIA, todas las tiendas: {todas}")
+        if todas != {"CALLAO": {"Visita 1": "100%", "Visita 2": "Sin visita"}}:
+            print("❌ El descubrimiento de tiendas no coincide")
+            ok = False
+
+        times = []
+        for _ in range(rounds):
+            t0 = time.perf_counter()
+            await engine.extract_scores("May", "YOHN", VISITAS, TIENDAS)
+            times.append((time.perf_counter() - t0) * 1000)
+        times.sort()
+        print(f"⚡ extract_scores x{rounds}: p50={statistics.median(times):.1f} ms "
+              f"p95={times[int(len(times) * 0.95) - 1]:.1f} ms | requests={StandIn.requests} "
+              f"conexiones={engine._pool.stats['connections']}")
+
+        StandIn.mode = "error"
+        if await engine.extract_scores("May", "YOHN", VISITAS, TIENDAS) is not None:
+            print("❌ HTTP 500 debería caer al navegador")
+            ok = False
+        else:
+            print("✅ HTTP 500 → respaldo por navegador")
+
+        StandIn.mode = "schema"
+        if await engine.extract_scores("May", "YOHN", VISITAS, TIENDAS) is not None or engine.ready:
+            print("❌ Un cambio de esquema debería descartar las plantillas")
+            ok = False
+        else:
+            print("✅ Cambio de esquema → plantillas descartadas")
+        engine.close()
+
+    server.shutdown()
+    return ok
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--rounds", type=int, default=50)
+    args = ap.parse_args()
+    sys.exit(0 if asyncio.run(run(args.rounds)) else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,228 @@
+"""
+browser_pool.py — Pool de Chromium persistente para el bot de PowerBI.
+
+Mantiene vivos el driver de Playwright, el navegador headless y un pequeño
+conjunto de contextos/páginas ya creados, para que cada revisión horaria y
+cada /reporte no pague el arranque del driver ni el lanzamiento de Chromium.
+Las páginas se entregan tras un chequeo de salud; si el navegador se cae se
+relanza automáticamente en la siguiente petición.
+
+Con un `ProfileStore` (ver browser_profile.py) el pool lanza Chromium sobre
+un perfil persistente o carga un storage_state, de modo que la caché HTTP y
+las cookies sobreviven entre corridas y reinicios del bot.
+"""
+
+import asyncio
+import logging
+from contextlib import asynccontextmanager
+
+from playwright.async_api import async_playwright
+
+from browser_profile import ProfileStore
+import timing
+
+logger = logging.getLogger(__name__)
+
+LAUNCH_ARGS = ["--no-sandbox", "--disable-setuid-sandbox", "--disable-dev-shm-usage"]
+USER_AGENT  = (
+    "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
+    "AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36"
+)
+HEALTH_TIMEOUT = 5.0   # segundos máximos para que una página responda al chequeo
+
+
+class BrowserPool:
+    """
+    Pool de páginas de Chromium reutilizables.
+
+    Cada página vive en su propio contexto (cookies y estado aislados) y se
+    presta con `async with pool.page() as page:`. Como máximo `size` páginas
+    están prestadas a la vez; el resto de llamadas espera su turno. En modo
+    perfil persistente todas las páginas comparten el único contexto que
+    Chromium permite sobre un user-data-dir.
+    """
+
+    def __init__(self, size: int = 1, viewport: dict | None = None,
+                 locale: str = "es-PE", headless: bool = True,
+                 profile: ProfileStore | None = None):
+        self.size     = max(1, size)
+        self.headless = headless
+        self.profile  = profile if profile and profile.enabled else None
+        self.context_options = {
+            "user_agent": USER_AGENT,
+            "viewport": viewport or {"width": 1920, "height": 1080},
+            "locale": locale,
+        }
+        self._pw          = None
+        self._browser     = None
+        self._shared_ctx  = None   # contexto persistente (modo perfil)
+        self._idle        = []
+        self._crashed     = set()
+        self._slots       = asyncio.Semaphore(self.size)
+        self._launch_lock = asyncio.Lock()
+        self._closed      = False
+        self.stats = {"launches": 0, "pages_created": 0, "pages_reused": 0, "pages_discarded": 0}
+
+    async def __aenter__(self):
+        await self.start()
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.close()
+
+    # ── Ciclo de vida del navegador ──────────────────────────────────────────
+    async def start(self):
+        """Arranca driver y navegador (idempotente)."""
+        await self._ensure_browser()
+
+    @property
+    def persistent(self) -> bool:
+        return self.profile is not None and self.profile.mode == "persistent"
+
+    def _alive(self) -> bool:
+        if self.persistent:
+            return self._shared_ctx is not None
+        return self._browser is not None and self._browser.is_connected()
+
+    async def _ensure_browser(self):
+        async with self._launch_lock:
+            if self._closed:
+                raise RuntimeError("BrowserPool cerrado")
+            if self._alive():
+                return
+            if self.stats["launches"]:
+                logger.warning("🔁 Chromium desconectado, relanzando...")
+                self._idle.clear()
+                self._crashed.clear()
+            with timing.span("launch", persistent=self.persistent, relaunch=bool(self.stats["launches"])):
+                if self._pw is None:
+                    self._pw = await async_playwright().start()
+                if self.persistent:
+                    await self._launch_persistent()
+                else:
+                    if self.profile:
+                        # storage_state: mismas validaciones (tope, vencimiento, corrupción) y metadatos
+                        self.profile.prepare()
+                    self._browser = await self._pw.chromium.launch(args=LAUNCH_ARGS, headless=self.headless)
+                    self._browser.on("disconnected", lambda _: logger.warning("⚠️ Chromium se desconectó"))
+            self.stats["launches"] += 1
+            logger.info(f"🚀 Chromium lanzado (#{self.stats['launches']})")
+
+    async def _launch_persistent(self):
+        for attempt in (1, 2):
+            self.profile.prepare()
+            try:
+                ctx = await self._pw.chromium.launch_persistent_context(
+                    self.profile.user_data_dir, args=LAUNCH_ARGS, headless=self.headless,
+                    **self.context_options,
+                )
+                break
+            except Exception as e:
+                if attempt == 2:
+                    raise
+                # Perfil ilegible o bloqueado: se descarta y se arranca en frío
+                logger.warning(f"⚠️ No se pudo abrir el perfil persistente ({e}); limpiándolo...")
+                self.profile.wipe()
+        ctx.on("close", lambda _: self._on_shared_close())
+        self._shared_ctx = ctx
+        # Chromium abre una pestaña inicial en el contexto persistente
+        for page in ctx.pages:
+            page.on("crash", lambda p: self._on_crash(p))
+            self._idle.append(page)
+
+    def _on_shared_close(self):
+        logger.warning("⚠️ Contexto persistente de Chromium cerrado")
+        self._shared_ctx = None
+
+    async def close(self):
+        """Cierra páginas, navegador y driver. Seguro de llamar varias veces."""
+        self._closed = True
+        for page in self._idle:
+            await self._discard(page, count=False)
+        self._idle.clear()
+        if self._shared_ctx is not None:
+            try:
+                await self._shared_ctx.close()
+            except Exception as e:
+                logger.warning(f"BrowserPool.close (perfil): {e}")
+            self._shared_ctx = None
+        if self._browser is not None:
+            try:
+                await self._browser.close()
+            except Exception as e:
+                logger.warning(f"BrowserPool.close: {e}")
+            self._browser = None
+        if self._pw is not None:
+            try:
+                await self._pw.stop()
+            except Exception as e:
+                logger.warning(f"BrowserPool.close (driver): {e}")
+            self._pw = None
+        logger.info(f"🧹 BrowserPool cerrado. Stats: {self.stats}")
+
+    # ── Préstamo de páginas ──────────────────────────────────────────────────
+    @asynccontextmanager
+    async def page(self):
+        """Presta una página sana; al salir vuelve al pool para reutilizarla."""
+        async with self._slots:
+            page = await self._checkout()
+            try:
+                yield page
+                if self.profile:
+                    try:
+                        await self.profile.commit(page.context)
+                    except Exception as e:
+                        logger.warning(f"No se pudo guardar el perfil: {e}")
+            finally:
+                self._checkin(page)
+
+    async def _checkout(self):
+        await self._ensure_browser()
+        while self._idle:
+            page = self._idle.pop()
+            if await self._is_healthy(page):
+                self.stats["pages_reused"] += 1
+                return page
+            await self._discard(page)
+        return await self._new_page()
+
+    def _checkin(self, page):
+        if self._closed or page.is_closed() or page in self._crashed:
+            asyncio.ensure_future(self._discard(page))
+            return
+        self._idle.append(page)
+
+    async def _new_page(self):
+        if self.persistent:
+            page = await self._shared_ctx.new_page()
+        else:
+            state = self.profile.state_path if self.profile else None
+            ctx = await self._browser.new_context(storage_state=state, **self.context_options)
+            page = await ctx.new_page()
+        page.on("crash", lambda p: self._on_crash(p))
+        self.stats["pages_created"] += 1
+        return page
+
+    def _on_crash(self, page):
+        logger.warning("💥 Página de Chromium crasheó; se descartará.")
+        self._crashed.add(page)
+
+    async def _is_healthy(self, page) -> bool:
+        if page.is_closed() or page in self._crashed:
+            return False
+        try:
+            return await asyncio.wait_for(page.evaluate("1 + 1"), timeout=HEALTH_TIMEOUT) == 2
+        except Exception:
+            return False
+
+    async def _discard(self, page, count: bool = True):
+        self._crashed.discard(page)
+        if count:
+            self.stats["pages_discarded"] += 1
+        try:
+            if self.persistent:
+                await page.close()
+            else:
+                await page.context.close()
+        except Exception:
+            pass
@@ -0,0 +1,187 @@
+"""
+browser_profile.py — Perfil de Chromium persistente entre corridas.
+
+Guarda en disco la caché HTTP, la caché de código V8 y las cookies (incluido
+el consentimiento del banner) para que las cargas siguientes de PowerBI no
+vuelvan a descargar los bundles del visor. Dos modos:
+
+    persistent     → user-data-dir completo (caché HTTP + V8 + cookies)
+    storage_state  → solo cookies/localStorage en un JSON (más liviano)
+
+El directorio tiene un tope de tamaño y se invalida si está corrupto, si es
+más viejo que el máximo configurado o si cambió la versión de Playwright.
+
+Configuración por entorno:
+    POWERBI_PROFILE_MODE         = off (por defecto) | persistent | storage_state
+    POWERBI_PROFILE_DIR          = .powerbi_profile
+    POWERBI_PROFILE_MAX_MB       = 300
+    POWERBI_PROFILE_MAX_AGE_DAYS = 7
+"""
+
+import json
+import logging
+import os
+import shutil
+import time
+from importlib import metadata
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+PROFILE_MODE     = os.getenv("POWERBI_PROFILE_MODE", "off").strip().lower()
+PROFILE_DIR      = os.getenv("POWERBI_PROFILE_DIR", ".powerbi_profile")
+PROFILE_MAX_MB   = int(os.getenv("POWERBI_PROFILE_MAX_MB", "300"))
+PROFILE_MAX_AGE  = float(os.getenv("POWERBI_PROFILE_MAX_AGE_DAYS", "7"))
+
+MODES       = ("off", "persistent", "storage_state")
+META_FILE   = "profile_meta.json"
+STATE_FILE  = "storage_state.json"
+USER_DATA   = "user_data"
+# Subdirectorios que se pueden borrar sin perder cookies
+CACHE_DIRS  = ("Default/Cache", "Default/Code Cache", "Default/GPUCache", "Default/Service Worker/CacheStorage")
+LOCK_FILES  = ("SingletonLock", "SingletonCookie", "SingletonSocket")
+
+
+def _playwright_version() -> str:
+    try:
+        return metadata.version("playwright")
+    except metadata.PackageNotFoundError:
+        return "?"
+
+
+def _dir_size(path: Path) -> int:
+    total = 0
+    for root, _, files in os.walk(path):
+        for f in files:
+            try:
+                total += os.path.getsize(os.path.join(root, f))
+            except OSError:
+                pass
+    return total
+
+
+class ProfileStore:
+    """Directorio de perfil con metadatos, tope de tamaño e invalidación."""
+
+    def __init__(self, mode: str = PROFILE_MODE, path: str = PROFILE_DIR,
+                 max_mb: int = PROFILE_MAX_MB, max_age_days: float = PROFILE_MAX_AGE):
+        if mode not in MODES:
+            raise ValueError(f"Modo de perfil desconocido: {mode!r} (usa {', '.join(MODES)})")
+        self.mode      = mode
+        self.path      = Path(path)
+        self.max_bytes = max_mb * 1024 * 1024
+        self.max_age   = max_age_days * 86400
+        self.meta      = {}
+        self.warm      = False
+
+    @classmethod
+    def from_env(cls) -> "ProfileStore | None":
+        """Devuelve el perfil configurado, o None si está desactivado."""
+        return None if PROFILE_MODE == "off" else cls()
+
+    @property
+    def enabled(self) -> bool:
+        return self.mode != "off"
+
+    @property
+    def user_data_dir(self) -> str:
+        return str(self.path / USER_DATA)
+
+    @property
+    def state_path(self) -> str | None:
+        """Ruta del storage_state si existe y es válido (modo storage_state)."""
+        p = self.path / STATE_FILE
+        return str(p) if self.mode == "storage_state" and p.exists() else None
+
+    @property
+    def consent_accepted(self) -> bool:
+        return bool(self.meta.get("consent_accepted"))
+
+    # ── Validación antes de lanzar ───────────────────────────────────────────
+    def prepare(self):
+        """Valida el perfil en disco; si está corrupto, viejo o excede el tope, lo limpia."""
+        self.path.mkdir(parents=True, exist_ok=True)
+        reason = self._invalid_reason()
+        if reason:
+            logger.info(f"🗑️ Perfil de navegador invalidado ({reason}); arranque en frío.")
+            self.wipe()
+        else:
+            self._trim()
+        for name in LOCK_FILES:
+            # Locks que deja un Chromium muerto a mitad de corrida
+            try:
+                (self.path / USER_DATA / name).unlink()
+            except OSError:
+                pass
+        self.warm = bool(self.meta)
+        if not self.meta:
+            self.meta = {"created": time.time(), "playwright": _playwright_version(), "mode": self.mode}
+            self._write_meta()
+        logger.info(f"🗂️ Perfil {self.mode} en {self.path} ({'caliente' if self.warm else 'frío'})")
+
+    def _invalid_reason(self) -> str | None:
+        meta_path = self.path / META_FILE
+        if not meta_path.exists():
+            return "sin metadatos" if any(self.path.iterdir()) else None
+        try:
+            self.meta = json.loads(meta_path.read_text(encoding="utf-8"))
+        except (OSError, ValueError):
+            self.meta = {}
+            return "metadatos corruptos"
+        if self.meta.get("mode") != self.mode:
+            return "cambio de modo"
+        if self.meta.get("playwright") != _playwright_version():
+            return "cambio de versión de Playwright"
+        if time.time() - self.meta.get("created", 0) > self.max_age:
+            return "perfil vencido"
+        if self.mode == "storage_state" and (self.path / STATE_FILE).exists():
+            try:
+                json.loads((self.path / STATE_FILE).read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                return "storage_state corrupto"
+        return None
+
+    def _trim(self):
+        size = _dir_size(self.path)
+        if size <= self.max_bytes:
+            return
+        logger.info(f"✂️ Perfil en {size // 2**20} MB > tope {self.max_bytes // 2**20} MB; vaciando cachés")
+        for sub in CACHE_DIRS:
+            shutil.rmtree(self.path / USER_DATA / sub, ignore_errors=True)
+        if _dir_size(self.path) > self.max_bytes:
+            self.wipe()
+
+    def wipe(self):
+        shutil.rmtree(self.path, ignore_errors=True)
+        self.path.mkdir(parents=True, exist_ok=True)
+        self.meta = {}
+        self.warm = False
+
+    # ── Después de una corrida ───────────────────────────────────────────────
+    async def commit(self, context):
+        """Guarda storage_state (si aplica) y marca el perfil como sano."""
+        self.path.mkdir(parents=True, exist_ok=True)
+        if self.mode == "storage_state":
+            await context.storage_state(path=str(self.path / STATE_FILE))
+        self.meta["last_ok"] = time.time()
+        self._write_meta()
+
+    def remember_consent(self):
+        self.meta["consent_accepted"] = True
+        self._write_meta()
+
+    def _write_meta(self):
+        meta_path = self.path / META_FILE
+        if "created" not in self.meta:
+            # prepare() no cargó los metadatos: se completan los del disco en vez de pisarlos
+            try:
+                on_disk = json.loads(meta_path.read_text(encoding="utf-8"))
+            except (OSError, ValueError):
+                on_disk = {}
+            base = {"created": time.time(), "playwright": _playwright_version(), "mode": self.mode}
+            self.meta = {**base, **(on_disk if isinstance(on_disk, dict) else {}), **self.meta}
+        try:
+            self.path.mkdir(parents=True, exist_ok=True)
+            meta_path.write_text(json.dumps(self.meta), encoding="utf-8")
+        except OSError as e:
+            logger.warning(f"No se pudo escribir metadatos del perfil: {e}")
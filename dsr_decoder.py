@@ -0,0 +1,228 @@
+"""
+dsr_decoder.py — Decodificador en streaming del formato DSR de PowerBI.
+
+Las respuestas querydata traen los datos comprimidos en un "data shape
+result" (DSR):
+
+    data.descriptor.Select   → nombre de cada columna (G0, G1, M0 …)
+    data.dsr.DS[i].PH        → jerarquía primaria: listas DM0 con filas
+    data.dsr.DS[i].SH        → jerarquía secundaria (columnas de una matriz)
+    data.dsr.DS[i].ValueDicts→ diccionarios de valores repetidos
+
+Cada lista DMn es una secuencia de filas que comparten esquema ("S"). Una
+fila puede traer sus valores por clave ({"G0": …, "M0": …}) o comprimidos en
+"C", donde solo aparecen las columnas que no se repiten ("R", bitmask de
+columnas iguales a la fila anterior) ni son nulas ("Ø", bitmask de nulos).
+Las columnas con "DN" guardan un índice al diccionario de valores. Las filas
+pueden anidar hijos en "M" ([{"DM1": [...]}]) y, en matrices, celdas de
+intersección en "X" cuyo índice "I" apunta a un miembro de SH.
+
+`iter_rows()` recorre todo eso como generador: produce filas planas con los
+nombres del descriptor y valores tipados sin armar la lista de filas. No
+es un parser incremental: el payload ya llega completo (json.loads) y los
+miembros de la jerarquía secundaria se decodifican antes de la primera fila;
+lo que se ahorra es la tabla plana, que quien consume puede recortar o
+cortar a mitad de camino.
+"""
+
+import re
+from datetime import datetime, timezone
+from typing import Iterator
+
+# Códigos "T" del esquema según los payloads observados del servicio
+TYPES = {1: "text", 2: "decimal", 3: "double", 4: "int", 5: "bool", 7: "datetime"}
+
+# Literales EDM que el servicio a veces usa para números: "12L", "0.75D", "3.5M"
+_EDM_NUMBER_RE = re.compile(r"^(-?\d+(?:\.\d+)?(?:[eE][-+]?\d+)?)([LDMF])$")
+
+
+class DSRError(ValueError):
+    """El payload no tiene la forma DSR esperada."""
+
+
+class Column:
+    """Columna del esquema DSR: clave interna (G0/M0), nombre visible y tipo."""
+
+    __slots__ = ("key", "name", "type", "dict_name")
+
+    def __init__(self, key: str, name: str, type_code: int | None = None, dict_name: str | None = None):
+        self.key       = key
+        self.name      = name
+        self.type      = TYPES.get(type_code, "any")
+        self.dict_name = dict_name
+
+    def __repr__(self):
+        return f"Column({self.key}={self.name!r}, {self.type})"
+
+
+def coerce(value, type_name: str):
+    """Convierte un valor crudo del DSR al tipo Python de la columna."""
+    if value is None:
+        return None
+    if isinstance(value, str):
+        m = _EDM_NUMBER_RE.match(value)
+        if m:
+            num = m.group(1)
+            value = int(num) if m.group(2) == "L" and "." not in num else float(num)
+        elif type_name in ("decimal", "double", "int"):
+            try:
+                value = float(value)
+            except ValueError:
+                return value
+    if type_name == "datetime" and isinstance(value, (int, float)):
+        # Fechas: milisegundos desde epoch (UTC)
+        return datetime.fromtimestamp(value / 1000, tz=timezone.utc)
+    if type_name in ("decimal", "double") and isinstance(value, int) and not isinstance(value, bool):
+        return float(value)
+    if type_name == "int" and isinstance(value, float) and value.is_integer():
+        return int(value)
+    if type_name == "bool" and isinstance(value, int):
+        return bool(value)
+    return value
+
+
+class _Level:
+    """Estado de una lista DMn mientras se recorre: esquema y fila anterior."""
+
+    __slots__ = ("schema", "prev")
+
+    def __init__(self):
+        self.schema = None
+        self.prev   = {}
+
+
+def _decode_entry(entry: dict, level: _Level, dicts: dict, names: dict) -> dict:
+    if "S" in entry:
+        level.schema = [
+            Column(s["N"], names.get(s["N"], s["N"]), s.get("T"), s.get("DN"))
+            for s in entry["S"]
+        ]
+        level.prev = {}
+    schema = level.schema
+    if schema is None:
+        raise DSRError("fila DSR sin esquema previo")
+
+    row = {}
+    if "C" in entry:
+        values = entry["C"]
+        repeat, nulls = entry.get("R", 0), entry.get("Ø", 0)
+        pos = 0
+        for i, col in enumerate(schema):
+            bit = 1 << i
+            if repeat & bit:
+                row[col.key] = level.prev.get(col.key)
+                continue
+            if nulls & bit:
+                row[col.key] = None
+                continue
+            if pos >= len(values):
+                raise DSRError(f"'C' sin valor para {col.key}")
+            row[col.key] = _resolve(values[pos], col, dicts)
+            pos += 1
+    else:
+        nulls = entry.get("Ø", 0)
+        for i, col in enumerate(schema):
+            if col.key in entry:
+                row[col.key] = _resolve(entry[col.key], col, dicts)
+            elif nulls & (1 << i):
+                row[col.key] = None
+            else:
+                row[col.key] = level.prev.get(col.key)
+    level.prev = row
+    return row
+
+
+def _resolve(raw, col: Column, dicts: dict):
+    if col.dict_name is not None and isinstance(raw, int):
+        try:
+            raw = dicts[col.dict_name][raw]
+        except (KeyError, IndexError):
+            raise DSRError(f"índice {raw} fuera del diccionario {col.dict_name}")
+    return coerce(raw, col.type)
+
+
+def _named(row: dict, names: dict) -> dict:
+    return {names.get(k, k): v for k, v in row.items()}
+
+
+def _walk(entries: list, inherited: dict, dicts: dict, names: dict,
+          secondary: list, cell_level: _Level) -> Iterator[dict]:
+    level = _Level()
+    for entry in entries:
+        row = _decode_entry(entry, level, dicts, names)
+        merged = {**inherited, **_named(row, names)}
+        children = entry.get("M")
+        cells = entry.get("X")
+        if children:
+            for group in children:
+                for key, child_entries in group.items():
+                    if key.startswith("DM"):
+                        yield from _walk(child_entries, merged, dicts, names, secondary, cell_level)
+        elif cells:
+            idx = -1
+            for cell in cells:
+                idx = cell.get("I", idx + 1)
+                if "S" in cell or cell_level.schema:
+                    values = _decode_entry(cell, cell_level, dicts, names)
+                else:
+                    values = {k: coerce(v, "any") for k, v in cell.items() if k != "I"}
+                header = secondary[idx] if idx < len(secondary) else {}
+                yield {**merged, **header, **_named(values, names)}
+        else:
+            yield merged
+
+
+def _secondary_members(ds: dict, dicts: dict, names: dict) -> list[dict]:
+    members = []
+    for group in ds.get("SH", []):
+        for key, entries in group.items():
+            if key.startswith("DM"):
+                members.extend(_walk(entries, {}, dicts, names, [], _Level()))
+    return members
+
+
+def _select_names(data: dict) -> dict:
+    try:
+        return {s["Value"]: s.get("Name", s["Value"]) for s in data["descriptor"]["Select"]}
+    except (KeyError, TypeError):
+        raise DSRError("descriptor.Select ausente")
+
+
+def iter_rows(data: dict, ds_index: int = 0) -> Iterator[dict]:
+    """
+    Genera las filas planas del DataShape `ds_index` de `data` (el objeto
+    `result.data` de una respuesta querydata).
+    """
+    names = _select_names(data)
+    try:
+        ds = data["dsr"]["DS"][ds_index]
+    except (KeyError, IndexError, TypeError):
+        raise DSRError(f"dsr.DS[{ds_index}] ausente")
+    dicts = ds.get("ValueDicts", {})
+    secondary = _secondary_members(ds, dicts, names)
+    cell_level = _Level()   # las celdas X comparten esquema en todo el DataShape
+    for ph in ds.get("PH", []):
+        for key, entries in ph.items():
+            if key.startswith("DM"):
+                yield from _walk(entries, {}, dicts, names, secondary, cell_level)
+
+
+def columns(data: dict) -> list[str]:
+    """Nombres de columna en el orden del descriptor."""
+    return list(_select_names(data).values())
+
+
+def flatten(data: dict, ds_index: int = 0) -> tuple[list[str], list[dict]]:
+    """Atajo no-streaming: (columnas, filas) materializadas."""
+    return columns(data), list(iter_rows(data, ds_index))
+
+
+def iter_response(payload: dict) -> Iterator[tuple[int, dict]]:
+    """Recorre una respuesta querydata completa: (índice de query, fila)."""
+    for i, res in enumerate(payload.get("results") or []):
+        try:
+            data = res["result"]["data"]
+        except (KeyError, TypeError):
+            raise DSRError(f"results[{i}] sin result.data")
+        for row in iter_rows(data):
+            yield i, row
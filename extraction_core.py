@@ -0,0 +1,649 @@
+"""
+extraction_core.py — Motor de extracción común al bot y al cron.
+
+check_and_notify.py y telegram_bot.py tenían cada uno su copia de la carga
+del reporte, los clicks de slicers, la búsqueda en la tabla y la extracción
+completa, y las copias habían divergido (viewport, esperas, parsers). Aquí
+vive una sola versión; los scripts solo deciden cuándo extraer y cómo avisar.
+
+La extracción pasa por un backend intercambiable:
+
+    replay    HTTP directo a querydata con las plantillas aprendidas
+              (query_replay.py); sin navegador
+    capture   Chromium aplica los slicers; RecordUpdate y notas salen solo de
+              las respuestas querydata (querydata_capture.py)
+    dom       Chromium aplica los slicers; todo sale del DOM (filas de la
+              tabla, donut, texto de la página), sin mirar querydata
+    auto      replay si hay plantillas; si no, Chromium leyendo querydata con
+              el DOM de respaldo
+
+`extract()` prueba en orden los backends de la cadena elegida: uno que no
+logra leer cede al siguiente. Devuelve un `Report` con el backend que
+respondió y lo que tardó.
+
+Configuración por entorno:
+    POWERBI_BACKEND      = auto       auto, replay, capture o dom
+    POWERBI_VIEWPORT     = 767x730    las coordenadas calibradas de los slicers dependen de él
+    POWERBI_TIENDAS      = PORONGOCHE,MALL PORONGOCHE   (* = todas las de la tabla)
+    POWERBI_SUPERVISORES = YOHN
+"""
+
+import asyncio
+import logging
+import os
+import re
+import time
+from abc import ABC, abstractmethod
+from contextlib import AsyncExitStack, asynccontextmanager
+from datetime import datetime
+
+import pbi_runtime
+import timing
+from browser_pool import BrowserPool
+from browser_profile import ProfileStore
+from extraction_workers import WORKER_PROCESSES, run_in_processes
+from network_profile import NetworkBlocker
+from page_workers import PARALLEL_PAGES, env_list, merge_scores, run_on_pages, work_units
+from powerbi_wait import settle, wait_for_report_ready
+from query_replay import ReplayEngine
+from querydata_capture import capture_for
+from report_parser import canonical_record_update, record_update as parse_record_update, row_score, success_rate
+from selector_cache import selector_cache
+from slicer_state import apply_option
+from table_rows import Row, harvest_rows, remember_row
+from visual_index import RECORD, SUCCESS_RATE, index_for, text_parts
+
+logger = logging.getLogger(__name__)
+
+URL = (
+    "https://app.powerbi.com/view?r=eyJrIjoiZWQ1YWNiYjctNWNiNC00MTNlLThjOGEtNjE1N"
+    "Dc2NTI4NWU2IiwidCI6ImE4MzE3NzZjLWM0ZTUtNDNhMC04ZmZhLTFkNjIxZWNlZDAzNiIsImMiOjl9"
+)
+BACKENDS = ("auto", "replay", "capture", "dom")
+BACKEND  = os.getenv("POWERBI_BACKEND", "auto").strip().lower()
+_w, _h   = os.getenv("POWERBI_VIEWPORT", "767x730").lower().split("x")
+VIEWPORT = {"width": int(_w), "height": int(_h)}
+
+TIENDAS      = [t.upper() for t in env_list("POWERBI_TIENDAS", "PORONGOCHE,MALL PORONGOCHE")]
+SUPERVISORES = env_list("POWERBI_SUPERVISORES", "YOHN")
+ALL_STORES   = TIENDAS == ["*"]
+VISITAS      = ["Visita 1", "Visita 2"]
+# Por orden de prueba; selector_cache.py pone primero la que funcionó la última vez
+COOKIE_SELECTORS = ["button:has-text('Accept')", "button:has-text('Aceptar')", "button:has-text('OK')"]
+MESES_ES = {
+    1: "Ene", 2: "Feb", 3: "Mar", 4: "Abr", 5: "May", 6: "Jun",
+    7: "Jul", 8: "Ago", 9: "Set", 10: "Oct", 11: "Nov", 12: "Dic",
+}
+LOAD_TIMEOUT_MS  = 90000
+PROBE_TIMEOUT_MS = 45000
+
+
+def current_month_es() -> str:
+    """Mes actual en hora Perú (UTC-5)."""
+    now = datetime.utcnow()
+    mes_num = now.month if (now.hour - 5) >= 0 else (now.month - 1 or 12)
+    return MESES_ES[mes_num]
+
+
+def normalize_text(value: str | None) -> str:
+    """Normaliza espacios y mayúsculas para comparar texto del DOM."""
+    if value is None:
+        return ""
+    return re.sub(r"\s+", " ", value.replace("\xa0", " ")).strip().upper()
+
+
+# ── Resultado ─────────────────────────────────────────────────────────────────
+class Report:
+    """
+    Resultado de una extracción: RecordUpdate, mes y notas
+    {tienda: {visita: nota}}. `tiendas` es None si el RecordUpdate no cambió
+    y no se extrajo nada.
+    """
+
+    __slots__ = ("record_update", "mes", "tiendas", "backend", "seconds")
+
+    def __init__(self, record_update: str, mes: str, tiendas: dict[str, dict[str, str]] | None,
+                 backend: str, seconds: float = 0.0):
+        self.record_update = record_update
+        self.mes           = mes
+        self.tiendas       = tiendas
+        self.backend       = backend
+        self.seconds       = seconds
+
+    @property
+    def extracted(self) -> bool:
+        return self.tiendas is not None
+
+    def as_dict(self) -> dict:
+        return {"record_update": self.record_update, "mes": self.mes, "tiendas": self.tiendas,
+                "backend": self.backend, "seconds": round(self.seconds, 2)}
+
+    def __repr__(self):
+        n = "sin extraer" if self.tiendas is None else f"{len(self.tiendas)} tiendas"
+        return f"Report({self.record_update!r}, {self.mes}, {n}, {self.backend} en {self.seconds:.1f}s)"
+
+
+# ── Lecturas sobre la página ─────────────────────────────────────────────────
+async def page_text(page, visuals=None) -> list[str]:
+    """Texto de los frames con visuales (o solo de `visuals`), en paralelo, por partes."""
+    return await text_parts(page, visuals)
+
+
+async def success_rate_from_visual(page) -> str | None:
+    """Porcentaje del donut 'Sucess Rate' leído de ese visual (aria-label o texto), sin adivinar."""
+    for snap in await index_for(page).snapshot(SUCCESS_RATE):
+        score = snap.percent()
+        if score:
+            logger.info(f"    🍩 Score del visual '{snap.title or 'Success Rate'}': {score}")
+            return score
+    return None
+
+
+def parse_success_rate(text: str) -> str | None:
+    """Porcentaje del donut en el texto de la página (último recurso; estrategias en report_parser.py)."""
+    with timing.span("parse", kind="success_rate") as sp:
+        score = success_rate(text)
+        sp.tag(outcome="found" if score else "missing")
+    if score:
+        logger.info(f"    ✅ Score ({score.label}): {score.value}")
+        return score.value
+    logger.warning("    ❌ No se encontró porcentaje válido")
+    return None
+
+
+async def donut_score(page, clicked_at: float, source: str) -> str | None:
+    """Success Rate tras un cross-filter: querydata, el visual del donut y, al final, el texto."""
+    if source != "dom":
+        score = capture_for(page).success_rate(since=clicked_at)
+        if score:
+            logger.info(f"    📡 Score del donut desde querydata: {score}")
+            timing.tag(donut="querydata")
+            return score
+    if source == "capture":
+        return None
+    score = await success_rate_from_visual(page)
+    if score:
+        timing.tag(donut="visual")
+        return score
+    timing.tag(donut="page_text")
+    return parse_success_rate("\n".join(await page_text(page)))
+
+
+# ── Carga del reporte ─────────────────────────────────────────────────────────
+async def load_report(page, profile: ProfileStore | None = None):
+    """Navega al reporte y acepta cookies, sin esperar el render completo."""
+    logger.info("⏳ Cargando PowerBI...")
+    await pbi_runtime.install(page)
+    t0 = time.monotonic()
+    cache = "sin perfil" if profile is None else ("caliente" if profile.warm else "fría")
+    with timing.span("goto", cache=cache) as sp:
+        try:
+            await page.goto(URL, wait_until="domcontentloaded", timeout=LOAD_TIMEOUT_MS)
+            sp.tag(outcome="ok")
+        except Exception as e:
+            sp.tag(outcome="incomplete")
+            logger.warning(f"⚠️ Carga incompleta: {e}, continuando...")
+    logger.info(f"⏱️ goto en {time.monotonic() - t0:.1f}s (caché {cache})")
+
+    # Aceptar cookies (con perfil persistente el consentimiento ya quedó guardado)
+    if profile and profile.consent_accepted:
+        return
+    with timing.span("cookies", outcome="none") as sp:
+        for sel in selector_cache().order("cookie_button", COOKIE_SELECTORS):
+            try:
+                b = page.locator(sel).first
+                if await b.is_visible(timeout=1000):
+                    await b.click()
+                    await page.wait_for_timeout(500)
+                    selector_cache().remember("cookie_button", sel, strategy="locator")
+                    sp.tag(outcome="accepted", strategy=sel)
+                    if profile:
+                        profile.remember_consent()
+                    break
+            except Exception:
+                pass
+
+
+async def probe_record_update(page, source: str = "auto", timeout_ms: int = PROBE_TIMEOUT_MS):
+    """
+    Termina con lo primero que llegue: la respuesta querydata de la tarjeta
+    RecordUpdate, o el reporte listo en el DOM (tarjeta con fecha o visuales
+    estables). Devuelve (record_update, mes) o (None, None).
+    """
+    with timing.span("record_update", source=source) as sp:
+        record, mes = await _probe_record_update(page, source, timeout_ms)
+        sp.tag(outcome="found" if record else "missing")
+    return record, mes
+
+
+async def _probe_record_update(page, source: str, timeout_ms: int):
+    if source != "dom":
+        ready = asyncio.ensure_future(wait_for_report_ready(page, ceiling_ms=timeout_ms)) \
+            if source == "auto" else None
+        captured = asyncio.ensure_future(
+            capture_for(page).wait_for(lambda c: c.record_update(), timeout_ms / 1000)
+        )
+        await asyncio.wait({f for f in (ready, captured) if f}, return_when=asyncio.FIRST_COMPLETED)
+        if captured.done() and captured.result():
+            record, mes = parse_record_update(f"RecordUpdate {captured.result()}")
+            if record:
+                if ready:
+                    ready.cancel()
+                logger.info(f"🔖 RecordUpdate (querydata): {record}")
+                timing.tag(strategy="querydata")
+                return record, mes
+        if ready is None:
+            await captured
+            logger.warning(f"❌ RecordUpdate no llegó por querydata en {timeout_ms // 1000}s")
+            return None, None
+        await ready
+        captured.cancel()
+    else:
+        await wait_for_report_ready(page, ceiling_ms=timeout_ms)
+
+    # Primero solo la tarjeta RecordUpdate; si no alcanza, todo el reporte
+    cards = await index_for(page).snapshot(RECORD)
+    with timing.span("parse", kind="record_update"):
+        record, mes = parse_record_update("\n".join(c.text for c in cards)) if cards else (None, None)
+    timing.tag(strategy="card")
+    if not record:
+        text = "\n".join(await page_text(page))
+        with timing.span("parse", kind="record_update"):
+            record, mes = parse_record_update(text)
+        timing.tag(strategy="page_text")
+    if record:
+        logger.info(f"🔖 RecordUpdate: {record}")
+    else:
+        logger.warning(f"❌ RecordUpdate no apareció en {timeout_ms // 1000}s")
+    return record, mes
+
+
+# ── Slicers y tabla ───────────────────────────────────────────────────────────
+async def click_slicer(page, label: str, option: str, deselect_all: bool = True) -> bool:
+    """Deja el slicer `label` en `option` (nada si ya está; ver slicer_state.apply_option)."""
+    with timing.span("slicer", label=label, option=option) as sp:
+        slicer = await index_for(page).slicer(label)
+        if slicer is None:
+            sp.tag(outcome="missing")
+            logger.warning(f"⚠️ Slicer '{label}' no está en el reporte")
+            return False
+        ok = await apply_option(page, slicer, option, deselect_all=deselect_all)
+        sp.tag(outcome="ok" if ok else "failed")
+    if not ok:
+        logger.warning(f"⚠️ Slicer '{label}' → '{option}' no encontrado")
+    return ok
+
+
+async def find_score_in_table(page, tienda: str, visita: str, source: str = "auto",
+                              since: float = 0.0) -> str | None:
+    """
+    Nota de (tienda, visita) desde la tabla:
+
+      0. la fila ya llegó en la respuesta querydata de la tabla (posterior a `since`)
+      1. fila con tienda+visita → % del texto de la propia fila
+      2. si la fila no tiene %, se clica y se lee el donut (Sucess Rate) filtrado
+      3. sin fila tienda+visita, fila con solo tienda (el slicer ya filtra la visita)
+    """
+    if source != "dom":
+        score = capture_for(page).store_score(tienda, visita, since=since)
+        if score:
+            logger.info(f"    📡 Score desde querydata ({tienda}/{visita}): {score}")
+            timing.tag(strategy="querydata")
+            return score
+        if source == "capture":
+            return None
+
+    async def try_row(row: Row, label: str) -> str | None:
+        try:
+            logger.info(f"    📋 Fila encontrada ({label}): {row.text[:120]!r}")
+            score = row_score(row.text)
+            if score:
+                logger.info(f"    📊 Score de {score.label}: {score.value}")
+                timing.tag(strategy="row")
+                return score.value
+            logger.info("    🖱️ Fila sin %, haciendo clic para filtrar el donut...")
+            timing.tag(strategy="row_click")
+            clicked_at = time.monotonic()
+            await row.click(force=True)
+            await settle(page)
+            try:
+                return await donut_score(page, clicked_at, source)
+            finally:
+                # Segundo click: quita el cross-filter para la tienda siguiente
+                await row.click(force=True)
+                await settle(page)
+        except Exception as e:
+            logger.warning(f"    ⚠️ Error procesando fila {label}: {e}")
+            return None
+
+    tienda_norm, visita_norm = normalize_text(tienda), normalize_text(visita)
+    # Una evaluación por frame; las dos pasadas se hacen sobre la misma lista
+    rows = await harvest_rows(page, await index_for(page).report_frames())
+    for row in rows:
+        row_norm = normalize_text(row.text)
+        if tienda_norm in row_norm and visita_norm in row_norm:
+            score = await try_row(row, f"{tienda}/{visita}")
+            if score:
+                remember_row(page, row)
+                return score
+
+    logger.info(f"    🔄 Sin fila '{tienda}+{visita}'; buscando fila solo con '{tienda}'...")
+    for row in rows:
+        # Excluir filas que sean encabezados (no tienen números)
+        if tienda_norm in normalize_text(row.text) and re.search(r"\d", row.text):
+            score = await try_row(row, f"{tienda} (slicer)")
+            if score:
+                remember_row(page, row)
+                return score
+    return None
+
+
+async def score_from_store_label(page, tienda: str, visita: str, source: str = "auto") -> str | None:
+    """Último recurso: clic en cualquier texto visible de la tienda y lectura del donut filtrado."""
+    for frame in await index_for(page).report_frames():
+        labels = frame.locator(f"text='{tienda}'")
+        for i in range(await labels.count()):
+            lbl = labels.nth(i)
+            if not await lbl.is_visible():
+                continue
+            try:
+                await lbl.scroll_into_view_if_needed()
+                timing.tag(strategy="label")
+                clicked_at = time.monotonic()
+                await lbl.click(force=True)
+                await settle(page)
+                score = await donut_score(page, clicked_at, source)
+                if not score:
+                    # Texto de la página para diagnosticar (ver bench_parsers.py)
+                    debug_file = f"debug_{tienda.replace(' ', '_')}_{visita.replace(' ', '_')}.txt"
+                    with open(debug_file, "w", encoding="utf-8") as f:
+                        f.write("\n".join(await page_text(page)))
+                    logger.info(f"    💾 Debug guardado en: {debug_file}")
+                # Clic neutro para deseleccionar
+                await lbl.click(force=True)
+                await settle(page)
+                return score
+            except Exception as e:
+                logger.debug(f"Clic en '{tienda}' falló: {e}")
+    return None
+
+
+# ── Unidades de trabajo (supervisor, visita) ─────────────────────────────────
+async def apply_global_filters(page, mes: str):
+    """Filtro común a todas las unidades de trabajo: Mes."""
+    logger.info(f"🗓️  Aplicando filtro Mes = {mes}...")
+    await click_slicer(page, "Mes", mes)
+
+
+async def extract_visita(page, visita: str, tiendas: list[str] | None, source: str = "auto") -> dict:
+    """
+    Aplica Nro. Visita y lee la nota de cada tienda: {tienda: nota}. Con
+    `tiendas=None` se leen todas las que trae la tabla (querydata).
+    """
+    logger.info(f"🔄 Filtrando {visita}...")
+    clicked_at = time.monotonic()
+    if not await click_slicer(page, "Nro. Visita", visita):
+        logger.warning(f"  ⚠️ No se pudo aplicar filtro {visita}, saltando...")
+        return {tienda: "Sin visita" for tienda in tiendas or []}
+
+    capture = capture_for(page)
+    present = (capture.stores(since=clicked_at) or capture.stores()) if source != "dom" else []
+    if tiendas is None:
+        if source == "dom":
+            logger.warning("  ⚠️ POWERBI_TIENDAS=* necesita querydata; con el backend dom no hay lista de tiendas")
+        tiendas = present
+        logger.info(f"  🏪 {len(tiendas)} tiendas en la tabla")
+    elif len(SUPERVISORES) > 1 and present:
+        # Solo las tiendas de este supervisor; el resto sale de otra unidad
+        tiendas = [t for t in tiendas if t in present]
+
+    scores = {}
+    for tienda in tiendas:
+        logger.info(f"  → {tienda} | {visita}")
+        with timing.span("store", tienda=tienda, visita=visita, source=source) as sp:
+            try:
+                score = await find_score_in_table(page, tienda, visita, source, since=clicked_at)
+                if not score and source != "capture":
+                    score = await score_from_store_label(page, tienda, visita, source)
+                scores[tienda] = score or "Sin visita"
+                sp.tag(outcome="found" if score else "missing")
+            except Exception as e:
+                logger.error(f"    ❌ Error en {tienda}: {e}")
+                scores[tienda] = "Error"
+                sp.tag(outcome="error", error=type(e).__name__)
+        logger.info(f"    🏁 {tienda} | {visita} → {scores[tienda]}")
+    return scores
+
+
+async def extract_unit(page, unit: tuple[str, str], supervisor_of: dict, source: str = "auto",
+                       main_page=None) -> dict:
+    """
+    Notas de una unidad (supervisor, visita) sobre una página con el Mes ya
+    aplicado. `supervisor_of` recuerda el supervisor de cada página para no
+    re-clickearlo entre visitas; en `main_page` se guarda la captura de filtros.
+    """
+    supervisor, visita = unit
+    with timing.span("unit", supervisor=supervisor, visita=visita):
+        return await _extract_unit(page, supervisor, visita, supervisor_of, source, main_page)
+
+
+async def _extract_unit(page, supervisor: str, visita: str, supervisor_of: dict, source: str, main_page) -> dict:
+    try:
+        if supervisor_of.get(page) != supervisor:
+            logger.info(f"👤 Aplicando filtro Supervisor = {supervisor}...")
+            await click_slicer(page, "Supervisor", supervisor)
+            supervisor_of[page] = supervisor
+            if page is main_page:
+                await page.screenshot(path="screenshot_filtros.png")
+        scores = await extract_visita(page, visita, None if ALL_STORES else TIENDAS, source)
+    except Exception:
+        supervisor_of.pop(page, None)
+        raise
+    if scores and all(v == "Error" for v in scores.values()):
+        supervisor_of.pop(page, None)
+        raise RuntimeError("todas las tiendas fallaron")
+    return scores
+
+
+@asynccontextmanager
+async def report_page(pool: BrowserPool):
+    """Página adicional del pool con el reporte cargado y listo (unidades en paralelo)."""
+    async with pool.page() as page:
+        blocker = NetworkBlocker()
+        await blocker.install(page)
+        capture_for(page).reset()
+        try:
+            await load_report(page, pool.profile)
+            await wait_for_report_ready(page)
+            yield page
+        finally:
+            await blocker.uninstall()
+            logger.info(blocker.format_summary())
+
+
+def make_pool(size: int = 1, profile: ProfileStore | None = None) -> BrowserPool:
+    """Pool de Chromium con el viewport y el perfil de la configuración (o el del worker)."""
+    return BrowserPool(size=size, viewport=VIEWPORT, profile=profile or ProfileStore.from_env())
+
+
+async def extract_shard(pool: BrowserPool, mes: str, units: list[tuple[str, str]],
+                        source: str = "auto") -> dict:
+    """Extrae un shard de unidades en páginas propias del pool (un proceso worker)."""
+    supervisor_of = {}
+    return await run_on_pages(
+        units, lambda p, unit: extract_unit(p, unit, supervisor_of, source),
+        session=lambda: report_page(pool),
+        setup=lambda p: apply_global_filters(p, mes),
+        limit=pool.size,
+    )
+
+
+async def extract_scores(page, mes: str, pool: BrowserPool | None = None, source: str = "auto",
+                         main_page=None) -> dict:
+    """
+    Aplica Mes, Supervisor y Nro. Visita y devuelve {tienda: {visita: nota}}.
+    El trabajo se parte en unidades (supervisor, visita); con `pool` y
+    POWERBI_PARALLEL_PAGES > 1 se reparten entre varias páginas, y con
+    POWERBI_WORKER_PROCESSES > 1 entre varios procesos con su propio Chromium.
+    """
+    units = work_units(SUPERVISORES, VISITAS)
+    if WORKER_PROCESSES > 1:
+        by_unit = await run_in_processes(__name__, mes, units, options={"source": source})
+    else:
+        await apply_global_filters(page, mes)
+        supervisor_of = {}   # supervisor aplicado en cada página
+        limit = min(PARALLEL_PAGES, pool.size) if pool else 1
+        by_unit = await run_on_pages(
+            units, lambda p, unit: extract_unit(p, unit, supervisor_of, source, main_page),
+            session=(lambda: report_page(pool)) if pool else None,
+            setup=lambda p: apply_global_filters(p, mes),
+            limit=limit, first_page=page,
+        )
+    return merge_scores(by_unit, units, [] if ALL_STORES else TIENDAS, VISITAS)
+
+
+# ── Backends ──────────────────────────────────────────────────────────────────
+class Backend(ABC):
+    """Fuente de RecordUpdate y notas; se usa como `async with backend:`."""
+
+    name = "?"
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        pass
+
+    @abstractmethod
+    async def record_update(self) -> tuple[str | None, str | None]:
+        """(RecordUpdate, mes), o (None, None) si este backend no pudo leerlo."""
+
+    @abstractmethod
+    async def scores(self, mes: str) -> dict | None:
+        """{tienda: {visita: nota}}, o None si este backend no alcanza."""
+
+
+class ReplayBackend(Backend):
+    """Sin navegador: las querydata aprendidas, re-enviadas por HTTP con otros filtros."""
+
+    name = "replay"
+
+    def __init__(self, replay: ReplayEngine | None):
+        self.replay = replay
+
+    async def record_update(self):
+        if not (self.replay and self.replay.ready):
+            return None, None
+        with timing.span("record_update", source="replay", strategy="querydata") as sp:
+            record, mes = parse_record_update(f"RecordUpdate {await self.replay.record_update() or ''}")
+            sp.tag(outcome="found" if record else "missing")
+        if record:
+            logger.info(f"⚡ RecordUpdate (replay): {record}")
+        return record, mes
+
+    async def scores(self, mes):
+        return await self.replay.extract_units(mes, SUPERVISORES, VISITAS, None if ALL_STORES else TIENDAS)
+
+
+class BrowserBackend(Backend):
+    """
+    Chromium del pool. `source` elige de dónde salen los valores: "auto"
+    (querydata con el DOM de respaldo), "capture" o "dom". Con `replay`, las
+    querydata de la corrida quedan como plantillas para la próxima.
+    """
+
+    def __init__(self, pool: BrowserPool, source: str = "auto", replay: ReplayEngine | None = None,
+                 screenshots: bool = False):
+        self.pool        = pool
+        self.source      = source
+        self.replay      = replay
+        self.screenshots = screenshots
+        self.name        = "browser" if source == "auto" else source
+        self.page        = None
+        self._stack      = None
+        self._blocker    = None
+
+    async def __aenter__(self):
+        self._stack = AsyncExitStack()
+        self.page = await self._stack.enter_async_context(self.pool.page())
+        self._blocker = NetworkBlocker()
+        await self._blocker.install(self.page)
+        capture_for(self.page).reset()   # escuchar querydata desde antes del goto
+        await load_report(self.page, self.pool.profile)
+        return self
+
+    async def __aexit__(self, *exc):
+        try:
+            await self._blocker.uninstall()
+            logger.info(self._blocker.format_summary())
+            logger.info(selector_cache().format_summary())
+        finally:
+            await self._stack.aclose()
+
+    async def record_update(self):
+        record = await probe_record_update(self.page, self.source)
+        if self.screenshots:
+            await self.page.screenshot(path="screenshot_inicio.png")
+        return record
+
+    async def scores(self, mes):
+        if self.source != "dom":
+            # Si el RecordUpdate llegó por querydata, el sondeo no esperó el DOM y los
+            # slicers lo necesitan listo; con el reporte ya pintado vuelve en el primer sondeo
+            await wait_for_report_ready(self.page)
+        tiendas = await extract_scores(self.page, mes, self.pool, self.source,
+                                       main_page=self.page if self.screenshots else None)
+        if self.replay:
+            self.replay.learn(capture_for(self.page), URL, {"mes": mes})
+        return tiendas
+
+
+def backend_chain(name: str, pool: BrowserPool | None, replay: ReplayEngine | None = None,
+                  screenshots: bool = False) -> list[Backend]:
+    """Backends a probar, en orden, para `name` (ver BACKENDS)."""
+    if name not in BACKENDS:
+        raise ValueError(f"Backend desconocido: {name!r} (opciones: {', '.join(BACKENDS)})")
+    if name == "replay":
+        return [ReplayBackend(replay)]
+    if name != "auto":
+        return [BrowserBackend(pool, name, replay, screenshots)]
+    chain = [ReplayBackend(replay)] if replay and replay.ready else []
+    return chain + [BrowserBackend(pool, "auto", replay, screenshots)]
+
+
+async def extract(pool: BrowserPool | None, replay: ReplayEngine | None = None, backend: str = BACKEND,
+                  last: str | None = None, force: bool = False, screenshots: bool = False) -> Report | None:
+    """
+    Lee el RecordUpdate y, si difiere de `last` (o con `force`), las notas.
+    Con el RecordUpdate igual a `last` devuelve un Report sin `tiendas`; None
+    si ningún backend de la cadena pudo leer el RecordUpdate. Ambos se
+    comparan en forma canónica (ver report_parser.canonical_record_update).
+    """
+    mes_actual = current_month_es()
+    last = canonical_record_update(last)
+    for b in backend_chain(backend, pool, replay, screenshots):
+        t0 = time.monotonic()
+        with timing.span("backend", strategy=b.name) as sp:
+            async with b:
+                record, mes = await b.record_update()
+                record = canonical_record_update(record)
+                if not record:
+                    sp.tag(outcome="no_record")
+                    logger.info(f"↪️ {b.name}: sin RecordUpdate")
+                    continue
+                mes = mes or mes_actual
+                if record == last and not force:
+                    # Sin cambio: no se tocan slicers ni tiendas
+                    sp.tag(outcome="unchanged")
+                    return Report(record, mes, None, b.name, time.monotonic() - t0)
+                with timing.span("scores", source=b.name):
+                    tiendas = await b.scores(mes)
+                if tiendas is None:
+                    sp.tag(outcome="no_scores")
+                    logger.info(f"↪️ {b.name}: sin notas")
+                    continue
+                sp.tag(outcome="extracted")
+                report = Report(record, mes, tiendas, b.name, time.monotonic() - t0)
+                logger.info(f"📦 {report}")
+                return report
+    return None
@@ -0,0 +1,136 @@
+"""
+extraction_workers.py — Extracción en varios procesos para crawls grandes.
+
+Un solo event loop maneja una sola conexión de Playwright; con muchas
+tiendas el lado Python (regex sobre el texto de la página, una llamada por
+elemento) termina siendo el cuello de botella. En este modo cada proceso
+worker tiene su propio driver de Playwright y su propio Chromium, toma
+shards de unidades (supervisor, visita) de la cola del ProcessPoolExecutor
+y devuelve las notas como JSON compacto.
+
+El módulo de entrada (extraction_core) se importa en cada worker y debe
+exponer:
+
+    make_pool(size, profile=None)               → BrowserPool con la configuración
+    extract_shard(pool, mes, units, **options)  → {(supervisor, visita): {tienda: nota}}
+
+`options` (p. ej. {"source": "dom"}) viaja al worker tal cual; tiene que
+ser serializable con pickle.
+
+Los procesos se crean con "spawn" (cada uno importa el módulo desde cero y
+hereda el entorno). Con perfil persistente cada worker arma su propio
+ProfileStore sobre <POWERBI_PROFILE_DIR>_w<n> y se lo pasa a make_pool:
+Chromium no comparte un user-data-dir entre procesos.
+
+Configuración por entorno:
+    POWERBI_WORKER_PROCESSES = 0   procesos worker (0 o 1 = todo en este proceso)
+    POWERBI_WORKER_PAGES     = 1   páginas simultáneas dentro de cada worker
+"""
+
+import asyncio
+import atexit
+import importlib
+import json
+import logging
+import multiprocessing
+import os
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+from browser_profile import PROFILE_DIR, PROFILE_MODE, ProfileStore
+
+logger = logging.getLogger(__name__)
+
+WORKER_PROCESSES = int(os.getenv("POWERBI_WORKER_PROCESSES", "0"))
+WORKER_PAGES     = int(os.getenv("POWERBI_WORKER_PAGES", "1"))
+
+# Estado del proceso worker: loop propio, módulo de entrada y pool de Chromium
+_worker = {}
+
+
+def _init_worker(module_name: str, counter):
+    with counter.get_lock():
+        counter.value += 1
+        index = counter.value
+    logging.basicConfig(format=f"[w{index}] %(message)s", level=logging.INFO)
+    _worker.update(
+        index=index,
+        loop=asyncio.new_event_loop(),
+        module=importlib.import_module(module_name),
+        profile=_worker_profile(index),
+        pool=None,
+    )
+    atexit.register(_close_worker)
+
+
+def _worker_profile(index: int) -> ProfileStore | None:
+    """Perfil del worker: con user-data-dir persistente, un directorio por proceso."""
+    if PROFILE_MODE == "persistent":
+        return ProfileStore(path=f"{PROFILE_DIR}_w{index}")
+    return ProfileStore.from_env()
+
+
+def _close_worker():
+    pool, loop = _worker.get("pool"), _worker.get("loop")
+    if pool is not None:
+        try:
+            loop.run_until_complete(pool.close())
+        except Exception:
+            pass
+
+
+def _run_shard(mes: str, units: list, options: dict) -> str:
+    """Corre en el worker: extrae un shard y lo devuelve serializado."""
+    module, loop = _worker["module"], _worker["loop"]
+
+    async def run():
+        if _worker["pool"] is None:
+            # El navegador vive todo lo que vive el proceso: los shards siguientes lo reutilizan
+            _worker["pool"] = module.make_pool(WORKER_PAGES, profile=_worker["profile"])
+            await _worker["pool"].start()
+        return await module.extract_shard(_worker["pool"], mes, [tuple(u) for u in units], **options)
+
+    by_unit = loop.run_until_complete(run())
+    rows = [[sup, visita, scores] for (sup, visita), scores in by_unit.items()]
+    return json.dumps(rows, ensure_ascii=False, separators=(",", ":"))
+
+
+def shard_units(units: list[tuple[str, str]], processes: int) -> list[list[tuple[str, str]]]:
+    """
+    Un shard por supervisor (un solo click de Supervisor por shard); si hay
+    menos supervisores que procesos, un shard por unidad para ocuparlos a todos.
+    """
+    by_sup = {}
+    for unit in units:
+        by_sup.setdefault(unit[0], []).append(unit)
+    shards = list(by_sup.values())
+    return shards if len(shards) >= processes else [[u] for u in units]
+
+
+async def run_in_processes(module_name: str, mes: str, units: list[tuple[str, str]],
+                           processes: int = WORKER_PROCESSES, options: dict | None = None) -> dict:
+    """Reparte `units` entre procesos worker; devuelve {unidad: {tienda: nota}}."""
+    shards = shard_units(units, processes)
+    workers = max(1, min(processes, len(shards)))
+    ctx = multiprocessing.get_context("spawn")
+    counter = ctx.Value("i", 0)
+    logger.info(f"🧮 {len(units)} unidades en {len(shards)} shards sobre {workers} procesos")
+
+    t0 = time.monotonic()
+    results = {}
+    executor = ProcessPoolExecutor(max_workers=workers, mp_context=ctx,
+                                   initializer=_init_worker, initargs=(module_name, counter))
+    try:
+        futures = [asyncio.wrap_future(executor.submit(_run_shard, mes, shard, options or {})) for shard in shards]
+        for done, fut in enumerate(asyncio.as_completed(futures), 1):
+            try:
+                payload = await fut
+            except Exception as e:
+                logger.error(f"❌ Shard falló en su proceso: {e}")
+                continue
+            for sup, visita, scores in json.loads(payload):
+                results[(sup, visita)] = scores
+            logger.info(f"📈 {done}/{len(shards)} shards en {time.monotonic() - t0:.0f}s")
+    finally:
+        await asyncio.to_thread(executor.shutdown)
+    return {unit: results[unit] for unit in units if unit in results}
@@ -0,0 +1,202 @@
+"""
+network_profile.py — Perfil de bloqueo de red para las cargas de PowerBI.
+
+El visor de PowerBI descarga fuentes, imágenes, telemetría y tiles de mapas
+que no afectan al texto que parseamos. Este módulo instala un `route` sobre
+la página con una lista blanca de lo que el reporte necesita para pintar sus
+visuales (documento, JS/CSS del visor y las llamadas querydata /
+conceptualschema) y descarta el resto, llevando la cuenta de lo ahorrado.
+
+Lo permitido se mide: bytes en el cable de cada request terminada
+(`request.sizes()`, cuerpo codificado + headers; vale también con gzip o
+chunked, donde no hay content-length). Lo bloqueado nunca se descarga, así
+que lo ahorrado es una estimación: por tipo de recurso, el tamaño medio
+medido en esta corrida para ese tipo y, si no hubo ninguno permitido (fuentes,
+imágenes), el tamaño típico de AVG_BYTES. El resumen indica qué base usó
+cada tipo.
+
+El bloqueo es opcional: hay que activarlo con POWERBI_BLOCK_PROFILE.
+
+Configuración por entorno:
+    POWERBI_BLOCK_PROFILE = off (por defecto) | safe | allowlist
+    POWERBI_BLOCK_ALLOW   = regex extra separadas por coma que nunca se bloquean
+"""
+
+import asyncio
+import os
+import re
+from collections import Counter
+
+BLOCK_PROFILE = os.getenv("POWERBI_BLOCK_PROFILE", "off").strip().lower()
+EXTRA_ALLOW   = [p.strip() for p in os.getenv("POWERBI_BLOCK_ALLOW", "").split(",") if p.strip()]
+
+# Llamadas de datos del reporte: nunca se bloquean
+ESSENTIAL_RE = re.compile(
+    r"querydata|conceptualschema|modelsAndExploration|/explore/|/public/reports/",
+    re.IGNORECASE,
+)
+# Dominios desde donde el visor sirve su HTML, JS, CSS y API
+ALLOW_HOSTS_RE = re.compile(
+    r"^https://([\w-]+\.)*(powerbi\.com|analysis\.windows\.net|pbidedicated\.windows\.net"
+    r"|powerbi[\w-]*\.azureedge\.net|pbi[\w-]*\.azureedge\.net)(:\d+)?/",
+    re.IGNORECASE,
+)
+# Telemetría y mapas: se bloquean aunque vengan de un dominio permitido
+DENY_RE = re.compile(
+    r"dc\.services\.visualstudio\.com|browser\.events\.data\.microsoft\.com|applicationinsights"
+    r"|/telemetry|clarity\.ms|virtualearth\.net|atlas\.microsoft\.com|bing\.com/maps",
+    re.IGNORECASE,
+)
+
+ALLOW_TYPES   = {"document", "script", "stylesheet", "xhr", "fetch"}
+NOISE_TYPES   = {"image", "media", "font"}
+
+# Tamaño típico por tipo (bytes): respaldo de la estimación de lo ahorrado
+# cuando en la corrida no se midió ninguna request permitida de ese tipo
+AVG_BYTES = {
+    "image": 25_000, "media": 200_000, "font": 60_000, "script": 150_000,
+    "stylesheet": 40_000, "xhr": 5_000, "fetch": 5_000, "other": 2_000,
+}
+
+PROFILES = ("allowlist", "safe", "off")
+MEASURE_WAIT = 2.0   # segundos que uninstall espera las mediciones pendientes
+
+
+class NetworkBlocker:
+    """
+    Bloqueador de requests con estadísticas por corrida.
+
+    - allowlist: solo documento/JS/CSS/XHR de los dominios de PowerBI.
+    - safe: deja pasar todo salvo imágenes, fuentes, media, telemetría y mapas.
+    - off: no intercepta nada.
+    """
+
+    def __init__(self, profile: str = BLOCK_PROFILE, extra_allow: list[str] | None = None):
+        if profile not in PROFILES:
+            raise ValueError(f"Perfil de bloqueo desconocido: {profile!r} (usa {', '.join(PROFILES)})")
+        self.profile = profile
+        self.extra_allow = [re.compile(p, re.IGNORECASE) for p in (extra_allow or EXTRA_ALLOW)]
+        self._target = None
+        self._pending = set()
+        self.reset()
+
+    def reset(self):
+        self.allowed         = 0
+        self.allowed_bytes   = 0            # medidos con request.sizes()
+        self.unmeasured      = 0            # requests permitidas sin tamaño disponible
+        self.measured        = {}           # tipo → [bytes, requests] medidos
+        self.blocked         = Counter()   # por tipo de recurso
+        self.blocked_hosts   = Counter()
+        self.essential_blocked = []
+
+    # ── Instalación ──────────────────────────────────────────────────────────
+    async def install(self, target):
+        """Instala el bloqueo en una página o contexto de Playwright."""
+        if self.profile == "off":
+            return
+        self._target = target
+        await target.route("**/*", self._handle)
+        target.on("requestfinished", self._on_finished)
+
+    async def uninstall(self):
+        if self._target is None:
+            return
+        try:
+            await self._target.unroute("**/*", self._handle)
+            self._target.remove_listener("requestfinished", self._on_finished)
+        except Exception:
+            pass
+        self._target = None
+        if self._pending:
+            # Que el resumen incluya las mediciones que siguen en vuelo
+            await asyncio.wait(set(self._pending), timeout=MEASURE_WAIT)
+
+    # ── Decisión por request ─────────────────────────────────────────────────
+    def should_block(self, url: str, resource_type: str) -> bool:
+        if ESSENTIAL_RE.search(url) or any(p.search(url) for p in self.extra_allow):
+            return False
+        if DENY_RE.search(url) or resource_type in NOISE_TYPES:
+            return True
+        if self.profile == "safe":
+            return False
+        return resource_type not in ALLOW_TYPES or not ALLOW_HOSTS_RE.search(url)
+
+    async def _handle(self, route):
+        req = route.request
+        if not self.should_block(req.url, req.resource_type):
+            await route.continue_()
+            return
+        self.blocked[req.resource_type] += 1
+        self.blocked_hosts[_host(req.url)] += 1
+        if req.resource_type in ("xhr", "fetch") and "powerbi" in req.url.lower():
+            # Posible llamada necesaria para los datos: se reporta en el resumen
+            self.essential_blocked.append(req.url[:160])
+        await route.abort()
+
+    def _on_finished(self, request):
+        self.allowed += 1
+        task = asyncio.ensure_future(self._measure(request))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    async def _measure(self, request):
+        try:
+            sizes = await request.sizes()
+            size = max(0, sizes["responseBodySize"]) + max(0, sizes["responseHeadersSize"])
+        except Exception:
+            self.unmeasured += 1
+            return
+        self.allowed_bytes += size
+        by_type = self.measured.setdefault(request.resource_type, [0, 0])
+        by_type[0] += size
+        by_type[1] += 1
+
+    def estimate_saved(self) -> tuple[int, dict]:
+        """(bytes estimados, {tipo: "medido" | "tabla"}) de lo bloqueado."""
+        total, basis = 0, {}
+        for rtype, n in self.blocked.items():
+            size, count = self.measured.get(rtype, (0, 0))
+            if count:
+                total += size * n // count
+                basis[rtype] = "medido"
+            else:
+                total += AVG_BYTES.get(rtype, AVG_BYTES["other"]) * n
+                basis[rtype] = "tabla"
+        return total, basis
+
+    # ── Resumen ──────────────────────────────────────────────────────────────
+    def summary(self) -> dict:
+        blocked_total = sum(self.blocked.values())
+        saved_bytes, basis = self.estimate_saved()
+        return {
+            "profile": self.profile,
+            "allowed_requests": self.allowed,
+            "allowed_bytes": self.allowed_bytes,
+            "allowed_unmeasured": self.unmeasured,
+            "blocked_requests": blocked_total,
+            "blocked_by_type": dict(self.blocked),
+            "est_saved_bytes": saved_bytes,
+            "est_saved_basis": basis,
+            "top_blocked_hosts": self.blocked_hosts.most_common(5),
+            "suspicious_blocks": self.essential_blocked[:5],
+        }
+
+    def format_summary(self) -> str:
+        s = self.summary()
+        if self.profile == "off":
+            return "🌐 Bloqueo de red desactivado"
+        unmeasured = f", {s['allowed_unmeasured']} sin medir" if s["allowed_unmeasured"] else ""
+        txt = (
+            f"🌐 Red [{s['profile']}]: {s['blocked_requests']} requests bloqueadas "
+            f"(≈{s['est_saved_bytes'] // 1024} KB ahorrados, estimado {s['est_saved_basis']}), "
+            f"{s['allowed_requests']} permitidas ({s['allowed_bytes'] // 1024} KB medidos{unmeasured}). "
+            f"Por tipo: {s['blocked_by_type']}"
+        )
+        if s["suspicious_blocks"]:
+            txt += f" ⚠️ XHR de PowerBI bloqueadas: {s['suspicious_blocks']}"
+        return txt
+
+
+def _host(url: str) -> str:
+    m = re.match(r"^\w+://([^/:]+)", url)
+    return m.group(1) if m else url[:40]
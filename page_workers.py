@@ -0,0 +1,154 @@
+"""
+page_workers.py — Reparto de trabajo del reporte entre varias páginas.
+
+Cada pasada de "Nro. Visita" re-aplica un slicer y recorre todas las
+tiendas; hacerlo en serie en una sola página suma los tiempos. Aquí el
+trabajo se parte en unidades (supervisor, visita) que se atienden en un
+conjunto acotado de páginas del mismo BrowserPool —un contexto por página,
+salvo en modo perfil persistente donde comparten el único contexto—, con
+reintentos por unidad y avance en el log.
+
+Configuración por entorno:
+    POWERBI_PARALLEL_PAGES = 1   páginas simultáneas como máximo (1 = en serie)
+    POWERBI_UNIT_RETRIES   = 1   reintentos de una unidad que falló
+"""
+
+import asyncio
+import logging
+import os
+import time
+
+logger = logging.getLogger(__name__)
+
+PARALLEL_PAGES = int(os.getenv("POWERBI_PARALLEL_PAGES", "1"))
+UNIT_RETRIES   = int(os.getenv("POWERBI_UNIT_RETRIES", "1"))
+EMPTY_SCORES   = ("Sin visita", "Error")
+
+
+def env_list(name: str, default: str) -> list[str]:
+    """Lista separada por comas desde el entorno (POWERBI_TIENDAS=A,B)."""
+    return [v.strip() for v in os.getenv(name, default).split(",") if v.strip()]
+
+
+def work_units(supervisores: list[str], visitas: list[str]) -> list[tuple[str, str]]:
+    """Unidades (supervisor, visita); agrupadas por supervisor para no re-clickearlo."""
+    return [(sup, visita) for sup in supervisores for visita in visitas]
+
+
+async def run_on_pages(items: list, work, session=None, setup=None,
+                       limit: int = PARALLEL_PAGES, first_page=None,
+                       retries: int = UNIT_RETRIES) -> dict:
+    """
+    Ejecuta `await work(page, item)` para cada ítem y devuelve {ítem: resultado}
+    en el orden de `items`.
+
+    - first_page: página ya cargada y preparada (se usa como primer worker)
+    - session():  context manager async que presta una página nueva con el
+                  reporte cargado (p. ej. report_session(pool))
+    - setup(page): prepara cada página nueva antes de tomar ítems (filtros
+                  globales, p. ej. Mes)
+    - limit:      páginas simultáneas como máximo, contando first_page; el
+                  semáforo del BrowserPool acota además las páginas prestadas
+                  (si la cola se vacía antes de conseguir turno, se deja de
+                  esperar: otra corrida puede tener ocupado el pool)
+    - retries:    reintentos de un ítem cuyo `work` lanzó excepción; el
+                  reintento vuelve a la cola y puede tomarlo otra página
+
+    Si una página nueva no logra prepararse, sus ítems los toman las demás.
+    Los ítems que nadie pudo atender no aparecen en el resultado.
+    """
+    pending = asyncio.Queue()
+    for item in items:
+        pending.put_nowait(item)
+    results, attempts = {}, {}
+    drained = asyncio.Event()   # ya no quedan ítems por tomar
+    t0 = time.monotonic()
+
+    async def drain(page, name: str):
+        while True:
+            try:
+                item = pending.get_nowait()
+            except asyncio.QueueEmpty:
+                drained.set()
+                return
+            attempts[item] = attempts.get(item, 0) + 1
+            logger.info(f"🧵 [{name}] {item} (intento {attempts[item]})")
+            try:
+                results[item] = await work(page, item)
+            except Exception as e:
+                if attempts[item] <= retries:
+                    logger.warning(f"⚠️ [{name}] {item} falló ({e}); se reintentará")
+                    pending.put_nowait(item)
+                else:
+                    logger.error(f"❌ [{name}] {item} falló {attempts[item]} veces: {e}")
+                continue
+            done = len(results)
+            logger.info(f"📈 {done}/{len(items)} unidades ({done * 100 // len(items)}%) "
+                        f"en {time.monotonic() - t0:.0f}s")
+
+    async def borrowed(n: int):
+        name = f"página {n}"
+        working = False
+
+        async def lend():
+            nonlocal working
+            async with session() as page:
+                if pending.empty():
+                    return
+                if setup:
+                    await setup(page)
+                working = True
+                await drain(page, name)
+
+        if pending.empty():
+            return
+        task = asyncio.ensure_future(lend())
+        waiting = asyncio.ensure_future(drained.wait())
+        try:
+            await asyncio.wait((task, waiting), return_when=asyncio.FIRST_COMPLETED)
+            if not task.done() and not working:
+                # Las demás páginas vaciaron la cola mientras esta esperaba turno o se preparaba
+                logger.info(f"🧵 [{name}] la cola se vació antes de tener la página lista; se libera")
+                task.cancel()
+            await asyncio.wait((task,))
+        finally:
+            waiting.cancel()
+            task.cancel()
+        if not task.cancelled() and task.exception() is not None:
+            logger.warning(f"⚠️ [{name}] falló: {task.exception()}")
+
+    workers = max(1, min(limit, len(items)))
+    tasks = []
+    if first_page is not None:
+        tasks.append(drain(first_page, "página 1"))
+        workers -= 1
+    if session is not None:
+        tasks += [borrowed(len(tasks) + i + 1) for i in range(workers)]
+    await asyncio.gather(*tasks)
+
+    missing = [item for item in items if item not in results]
+    if missing:
+        logger.warning(f"⚠️ {len(missing)} unidades sin resultado: {missing}")
+    return {item: results[item] for item in items if item in results}
+
+
+def merge_scores(by_unit: dict, units: list[tuple[str, str]], tiendas: list[str],
+                 visitas: list[str]) -> dict:
+    """
+    Combina {(supervisor, visita): {tienda: nota}} en {tienda: {visita: nota}}.
+    Una nota real gana sobre "Sin visita"/"Error" (la misma tienda puede
+    aparecer vacía bajo otro supervisor). Si alguna unidad de una visita no
+    tuvo resultado, lo que falte de esa visita queda como "Error".
+    """
+    merged = {t: {} for t in tiendas}
+    for unit in units:
+        _, visita = unit
+        for tienda, score in by_unit.get(unit, {}).items():
+            current = merged.setdefault(tienda, {}).get(visita)
+            if current is None or (current in EMPTY_SCORES and score not in EMPTY_SCORES):
+                merged[tienda][visita] = score
+    failed = {unit[1] for unit in units if unit not in by_unit}
+    return {
+        tienda: {v: scores.get(v, "Error" if v in failed else "Sin visita") for v in visitas}
+        for tienda, scores in merged.items()
+    }
@@ -0,0 +1,164 @@
+"""
+pbi_runtime.py — Ayudante JS dentro de cada frame para operar slicers.
+
+Cada operación de slicer eran decenas de llamadas de Playwright (count,
+nth(i).inner_text, is_visible, click) con un round trip cada una. Este
+módulo instala con `add_init_script` un objeto `window.__pbi` en todos los
+frames de la página y expone operaciones que terminan en UN round trip y
+devuelven un resultado estructurado:
+
+    readSelection(ref)              → {restatement, selected, open}
+    selectOnly(ref, value, opts)    → {ok, clicked, cleared, steps, selection}
+    measure(ref)                    → {header, items: [{text, at}]}  (centros, coords del frame)
+
+`ref` es el título del slicer ('Supervisor', 'Nro. Visita') o 'key:<clave>'
+de visual_index.py. Opciones de selectOnly: clear (selectores del borrador,
+en orden de prueba), deselectAll, search (false = no usar el buscador). Los clicks se despachan como la secuencia pointer/mouse
+completa, que es lo que escucha el visor de PowerBI. Si el frame se cargó
+antes de instalar el init script, el primer llamado inyecta el ayudante.
+"""
+
+import asyncio
+import logging
+import weakref
+
+logger = logging.getLogger(__name__)
+
+RUNTIME_JS = r"""(() => {
+if (window.__pbi) return;
+const norm = s => (s || '').replace(/\u00a0/g, ' ').replace(/\s+/g, ' ').trim().toUpperCase();
+const ALL = /^(SELECCIONAR TODO|SELECT ALL)$/;
+const sleep = ms => new Promise(r => setTimeout(r, ms));
+const visible = e => { const r = e.getBoundingClientRect(); return r.width > 0 && r.height > 0; };
+async function waitFor(fn, ms = 2000) {
+    const end = Date.now() + ms;
+    let v;
+    while (!(v = fn()) && Date.now() < end) await sleep(50);
+    return v;
+}
+function fire(el) {
+    const r = el.getBoundingClientRect();
+    const o = {bubbles: true, cancelable: true, view: window, button: 0,
+               clientX: r.x + r.width / 2, clientY: r.y + r.height / 2};
+    el.dispatchEvent(new PointerEvent('pointerdown', o));
+    el.dispatchEvent(new MouseEvent('mousedown', o));
+    el.dispatchEvent(new PointerEvent('pointerup', o));
+    el.dispatchEvent(new MouseEvent('mouseup', o));
+    el.dispatchEvent(new MouseEvent('click', o));
+}
+function slicer(ref) {
+    if (ref.startsWith('key:')) return document.querySelector(`[data-pbi-visual="${ref.slice(4)}"]`);
+    const h = [...document.querySelectorAll('h3.slicer-header-text')].find(h => norm(h.textContent).includes(norm(ref)));
+    return h ? (h.closest('div.slicer-container') || h.closest('.visual-container-modern, visual-container')) : null;
+}
+const itemText = e => (e.innerText || e.getAttribute('title') || '').trim();
+const isSelected = e => e.getAttribute('aria-selected') === 'true' || e.getAttribute('aria-checked') === 'true'
+    || !!e.querySelector('[aria-checked="true"], .partiallySelected');
+// Ítems a la vista: los del popup abierto (dropdown) o los del propio slicer (lista)
+const openItems = () => [...document.querySelectorAll('.slicerItemContainer')].filter(visible);
+const isOpen = root => !root.querySelector('.slicer-restatement')
+    || [...document.querySelectorAll('.slicer-dropdown-popup')].some(visible);
+function readSelection(ref) {
+    const root = slicer(ref);
+    if (!root) return null;
+    const restate = root.querySelector('.slicer-restatement');
+    return {
+        restatement: restate ? (restate.innerText || restate.getAttribute('title') || '').trim() : null,
+        selected: [...root.querySelectorAll('.slicerItemContainer')].filter(isSelected).map(itemText).filter(t => t),
+        open: isOpen(root),
+    };
+}
+async function open(root) {
+    const restate = root.querySelector('.slicer-restatement');
+    if (!restate) return true;                       // slicer de lista: siempre visible
+    if (!isOpen(root)) fire(restate);
+    return !!(await waitFor(() => openItems().length));
+}
+function close(root) {
+    const restate = root.querySelector('.slicer-restatement');
+    if (restate && isOpen(root)) fire(restate);
+}
+async function selectOnly(ref, value, opts = {}) {
+    const root = slicer(ref);
+    const steps = [];
+    if (!root) return {ok: false, clicked: false, steps: ['sin slicer'], selection: null};
+    const target = norm(value);
+    const find = () => openItems().find(e => norm(itemText(e)).includes(target) && !ALL.test(norm(itemText(e))));
+    if (!(await open(root))) steps.push('dropdown sin ítems');
+    let cleared = null;
+    for (const sel of opts.clear || []) {
+        const clear = root.querySelector(sel);
+        if (clear && visible(clear)) { fire(clear); cleared = sel; steps.push('borrar'); await sleep(100); break; }
+    }
+    let allCleared = false;
+    if (opts.deselectAll) {
+        const all = () => openItems().find(e => ALL.test(norm(itemText(e))));
+        // "Seleccionar todo" es un toggle: se clickea hasta que quede desmarcado (máx. 2 veces)
+        for (let i = 0; i < 2 && all(); i++) {
+            fire(all()); allCleared = true; steps.push('seleccionar todo');
+            await sleep(150);
+            if (!isSelected(all())) break;
+        }
+    }
+    let item = find();
+    if (!item && opts.search !== false) {
+        const input = root.querySelector('input.searchInput') || document.querySelector('.slicer-dropdown-popup input.searchInput');
+        if (input) {
+            const setter = Object.getOwnPropertyDescriptor(HTMLInputElement.prototype, 'value').set;
+            setter.call(input, value);
+            input.dispatchEvent(new Event('input', {bubbles: true}));
+            input.dispatchEvent(new KeyboardEvent('keyup', {bubbles: true, key: 'Enter'}));
+            steps.push('buscar');
+            item = await waitFor(find);
+        }
+    }
+    let clicked = false;
+    if (item) {
+        // Tras desmarcar "Seleccionar todo" el ítem quedó libre aunque el DOM tarde en reflejarlo;
+        // sin ese ítem, clickear uno ya marcado lo desmarcaría
+        if (!isSelected(item) || allCleared) { fire(item); clicked = true; steps.push('click'); }
+        else steps.push('ya marcado');
+        await sleep(100);
+    }
+    close(root);
+    return {ok: !!item, clicked, cleared, steps, selection: readSelection(ref)};
+}
+async function measure(ref) {
+    const root = slicer(ref);
+    const restate = root && root.querySelector('.slicer-restatement');
+    if (!restate) return null;                       // solo slicers dropdown
+    const center = e => { const r = e.getBoundingClientRect(); return [r.x + r.width / 2, r.y + r.height / 2]; };
+    const wasOpen = isOpen(root);
+    if (!(await open(root))) return null;
+    const items = [...document.querySelectorAll('.slicer-dropdown-popup .slicerItemContainer')].filter(visible)
+        .map(e => ({text: itemText(e), at: center(e)}));
+    const header = center(restate);
+    if (!wasOpen) close(root);
+    return {header, items};
+}
+window.__pbi = {readSelection, selectOnly, measure};
+})();"""
+
+_CALL_JS = "([name, args]) => window.__pbi ? window.__pbi[name](...args) : '__missing__'"
+
+# Páginas con el init script ya registrado (las del pool se recargan muchas veces)
+_installed = weakref.WeakSet()
+
+
+async def install(page):
+    """Registra el ayudante para todos los frames de la página (una sola vez, antes del goto)."""
+    if page in _installed:
+        return
+    await page.add_init_script(RUNTIME_JS)
+    _installed.add(page)
+
+
+async def call(frame, name: str, *args, timeout: float = 10.0):
+    """Ejecuta `window.__pbi[name](*args)` en `frame`; inyecta el ayudante si falta."""
+    result = await asyncio.wait_for(frame.evaluate(_CALL_JS, [name, list(args)]), timeout=timeout)
+    if result == "__missing__":
+        logger.debug(f"Ayudante JS ausente en {frame.url[:60]}; inyectando")
+        await frame.evaluate(RUNTIME_JS)
+        result = await asyncio.wait_for(frame.evaluate(_CALL_JS, [name, list(args)]), timeout=timeout)
+    return result
+
@@ -0,0 +1,195 @@
+"""
+powerbi_wait.py — Esperas basadas en señales reales del reporte de PowerBI.
+
+Reemplaza los `wait_for_timeout` fijos después de cargar la página: en vez
+de dormir 8–15 s a ciegas, se sondea el estado de todos los frames y se
+termina apenas el reporte es usable, con un techo duro. Lo mismo después de
+cada click en slicers o filas: `settle()` espera a que no queden requests
+querydata en vuelo y a que los visuales dejen de mutar.
+
+Configuración por entorno:
+    POWERBI_READY_CEILING_MS  = 30000   techo duro de la espera de render
+    POWERBI_SETTLE_QUIET_MS   = 350     silencio requerido tras una interacción
+    POWERBI_SETTLE_CEILING_MS = 8000    techo duro de cada settle
+"""
+
+import asyncio
+import logging
+import os
+import re
+import weakref
+
+import timing
+
+logger = logging.getLogger(__name__)
+
+READY_CEILING_MS   = int(os.getenv("POWERBI_READY_CEILING_MS", "30000"))
+SETTLE_QUIET_MS    = int(os.getenv("POWERBI_SETTLE_QUIET_MS", "350"))
+SETTLE_CEILING_MS  = int(os.getenv("POWERBI_SETTLE_CEILING_MS", "8000"))
+
+QUERY_RE = re.compile(r"querydata", re.IGNORECASE)
+
+# Estado de un frame en una sola evaluación: spinners visibles, cantidad de
+# visuales y si la tarjeta RecordUpdate ya muestra una fecha.
+_READY_JS = r"""() => {
+    if (!document.body) return {spinners: 0, visuals: 0, record: false};
+    const spinners = [...document.querySelectorAll('.powerbi-spinner, .spinner, .circle-spinner')]
+        .filter(e => e.offsetParent !== null).length;
+    const visuals = document.querySelectorAll('.visual-container-modern, visual-container-modern, visual-container').length;
+    const txt = document.body.textContent || '';
+    const record = /R\s*e\s*c\s*o\s*r\s*d\s*U\s*p\s*d\s*a\s*t\s*e\s*\d{1,2}\s*-\s*[A-Za-z]{3}\s*\d{1,2}\s*:\s*\d{2}/i.test(txt);
+    return {spinners, visuals, record};
+}"""
+
+
+async def _frame_state(frame) -> dict | None:
+    try:
+        return await asyncio.wait_for(frame.evaluate(_READY_JS), timeout=3.0)
+    except Exception:
+        return None
+
+
+async def report_state(page) -> dict:
+    """Suma el estado de todos los frames (evaluados en paralelo)."""
+    states = await asyncio.gather(*(_frame_state(f) for f in page.frames))
+    total = {"spinners": 0, "visuals": 0, "record": False}
+    for st in states:
+        if not st:
+            continue
+        total["spinners"] += st["spinners"]
+        total["visuals"]  += st["visuals"]
+        total["record"]    = total["record"] or st["record"]
+    return total
+
+
+async def wait_for_report_ready(page, ceiling_ms: int = READY_CEILING_MS,
+                                poll_ms: int = 250, stable_polls: int = 4) -> str:
+    """
+    Espera a que el reporte sea usable y devuelve la señal que lo confirmó:
+
+      - "record_update": sin spinners y la tarjeta RecordUpdate con fecha
+      - "visuals_stable": sin spinners y la cantidad de visuales sin cambios
+                          durante `stable_polls` sondeos seguidos
+      - "ceiling": se alcanzó el techo sin ninguna de las anteriores
+    """
+    with timing.span("ready") as sp:
+        signal = await _wait_ready(page, ceiling_ms, poll_ms, stable_polls)
+        sp.tag(outcome=signal)
+    return signal
+
+
+async def _wait_ready(page, ceiling_ms: int, poll_ms: int, stable_polls: int) -> str:
+    track_queries(page)
+    loop = asyncio.get_running_loop()
+    t0 = loop.time()
+    deadline = t0 + ceiling_ms / 1000
+    last_visuals, stable = -1, 0
+    while True:
+        st = await report_state(page)
+        if st["visuals"] and st["visuals"] == last_visuals:
+            stable += 1
+        else:
+            stable = 0
+        last_visuals = st["visuals"]
+
+        signal = None
+        if st["spinners"] == 0 and st["visuals"]:
+            if st["record"]:
+                signal = "record_update"
+            elif stable >= stable_polls:
+                signal = "visuals_stable"
+        if signal is None and loop.time() >= deadline:
+            signal = "ceiling"
+        if signal:
+            elapsed = loop.time() - t0
+            log = logger.warning if signal == "ceiling" else logger.info
+            log(f"✅ Reporte listo en {elapsed:.1f}s (señal: {signal}, "
+                f"visuales={st['visuals']}, spinners={st['spinners']})")
+            return signal
+        await asyncio.sleep(poll_ms / 1000)
+
+
+# ── Settle tras interacciones ────────────────────────────────────────────────
+class QueryTracker:
+    """Cuenta las requests querydata en vuelo de una página."""
+
+    def __init__(self, page):
+        self.inflight = 0
+        self.last_activity = asyncio.get_running_loop().time()
+        page.on("request", self._on_start)
+        page.on("requestfinished", self._on_end)
+        page.on("requestfailed", self._on_end)
+
+    def _on_start(self, request):
+        if QUERY_RE.search(request.url):
+            self.inflight += 1
+            self.last_activity = asyncio.get_running_loop().time()
+
+    def _on_end(self, request):
+        if QUERY_RE.search(request.url):
+            self.inflight = max(0, self.inflight - 1)
+            self.last_activity = asyncio.get_running_loop().time()
+
+
+_trackers = weakref.WeakKeyDictionary()
+
+
+def track_queries(page) -> QueryTracker:
+    """Instala (una sola vez por página) el contador de querydata."""
+    tracker = _trackers.get(page)
+    if tracker is None:
+        tracker = _trackers[page] = QueryTracker(page)
+    return tracker
+
+
+# Instala un MutationObserver (idempotente) que registra la última mutación
+# dentro de un visual o del popup de un slicer; devuelve los ms desde entonces.
+_MUTATION_IDLE_JS = r"""() => {
+    if (!document.body) return 1e9;
+    if (!window.__pbiSettle) {
+        const st = window.__pbiSettle = {last: performance.now()};
+        const scope = '.visual-container-modern, visual-container-modern, visual-container, .slicer-dropdown-popup';
+        new MutationObserver(muts => {
+            for (const m of muts) {
+                const el = m.target.nodeType === 1 ? m.target : m.target.parentElement;
+                if (el && el.closest(scope)) { st.last = performance.now(); return; }
+            }
+        }).observe(document.body, {subtree: true, childList: true, characterData: true, attributes: true});
+    }
+    return performance.now() - window.__pbiSettle.last;
+}"""
+
+
+async def _dom_idle_ms(page) -> float:
+    async def one(frame):
+        try:
+            return await asyncio.wait_for(frame.evaluate(_MUTATION_IDLE_JS), timeout=2.0)
+        except Exception:
+            return 1e9   # frame inaccesible: no bloquea el settle
+    idles = await asyncio.gather(*(one(f) for f in page.frames))
+    return min(idles, default=1e9)
+
+
+async def settle(page, quiet_ms: int = SETTLE_QUIET_MS,
+                 ceiling_ms: int = SETTLE_CEILING_MS, poll_ms: int = 100) -> float:
+    """
+    Espera a que PowerBI termine de reaccionar a la última interacción: sin
+    querydata en vuelo y sin mutaciones en los visuales durante `quiet_ms`.
+    Siempre espera al menos `quiet_ms` (el re-query puede tardar en salir).
+    Devuelve los segundos esperados.
+    """
+    tracker = track_queries(page)
+    loop = asyncio.get_running_loop()
+    t0 = loop.time()
+    deadline = t0 + ceiling_ms / 1000
+    quiet = quiet_ms / 1000
+    while True:
+        now = loop.time()
+        net_quiet = tracker.inflight == 0 and now - max(tracker.last_activity, t0) >= quiet
+        if net_quiet and now - t0 >= quiet and await _dom_idle_ms(page) >= quiet_ms:
+            logger.debug(f"settle: {now - t0:.2f}s")
+            return now - t0
+        if now >= deadline:
+            logger.info(f"⏱️ settle alcanzó el techo ({ceiling_ms} ms, querydata en vuelo={tracker.inflight})")
+            return now - t0
+        await asyncio.sleep(poll_ms / 1000)
@@ -0,0 +1,405 @@
+"""
+query_replay.py — Camino rápido sin navegador: re-envía las querydata aprendidas.
+
+Una corrida completa con Chromium deja en `QueryCapture.sent` los POST
+querydata que hizo el visor (endpoint, modelId y la query semántica de cada
+visual). `ReplayEngine.learn()` los guarda como plantillas; en las corridas
+siguientes `extract_scores()` reconstruye esas queries cambiando solo los
+literales de los filtros Mes / Supervisor / Nro. Visita (y Tienda para el
+donut filtrado por fila) y las envía directo por HTTP con conexiones
+persistentes, sin abrir Chromium.
+
+La clave del recurso sale del token `view?r=` del reporte. Si el replay
+falla (HTTP, timeout, respuesta vacía) los métodos devuelven None y el
+llamador sigue por el navegador; si cambia el esquema de un visual las
+plantillas se descartan y se vuelven a aprender en la siguiente corrida
+con navegador.
+
+Configuración por entorno:
+    POWERBI_REPLAY              = on (por defecto) | off
+    POWERBI_REPLAY_FILE         = .powerbi_replay.json
+    POWERBI_API_BASE            = (vacío) reemplaza esquema/host del endpoint
+                                  aprendido, p. ej. http://127.0.0.1:8765
+    POWERBI_REPLAY_CONNECTIONS  = 4
+    POWERBI_REPLAY_TIMEOUT      = 15     segundos por request
+"""
+
+import asyncio
+import base64
+import copy
+import http.client
+import json
+import logging
+import os
+import queue
+import re
+import time
+import uuid
+from pathlib import Path
+from urllib.parse import parse_qs, urlsplit
+
+from page_workers import merge_scores, work_units
+from querydata_capture import RECORD_RE, SR_RE, STORE_RE, VISITA_RE, QueryCapture, _in_conditions, _visual_id
+
+logger = logging.getLogger(__name__)
+
+REPLAY_MODE    = os.getenv("POWERBI_REPLAY", "on").strip().lower()
+REPLAY_FILE    = os.getenv("POWERBI_REPLAY_FILE", ".powerbi_replay.json")
+API_BASE       = os.getenv("POWERBI_API_BASE", "")
+REPLAY_CONNS   = int(os.getenv("POWERBI_REPLAY_CONNECTIONS", "4"))
+REPLAY_TIMEOUT = float(os.getenv("POWERBI_REPLAY_TIMEOUT", "15"))
+
+# Tipo de filtro según la propiedad de la columna en la query semántica
+FILTER_KINDS = {
+    "mes":        re.compile(r"^\s*mes\s*$|month", re.IGNORECASE),
+    "supervisor": re.compile(r"supervisor", re.IGNORECASE),
+    "visita":     VISITA_RE,
+    "tienda":     STORE_RE,
+}
+
+
+class ReplayError(Exception):
+    """El replay no pudo completarse; el llamador debe usar el navegador."""
+
+
+class SchemaChanged(ReplayError):
+    """La respuesta ya no tiene las columnas aprendidas."""
+
+
+def resource_key_from_url(url: str) -> str | None:
+    """Extrae la clave 'k' del token base64 `r=` de un link view?r=…"""
+    token = parse_qs(urlsplit(url).query).get("r", [None])[0]
+    if not token:
+        return None
+    try:
+        data = json.loads(base64.b64decode(token + "=" * (-len(token) % 4)))
+    except (ValueError, TypeError):
+        return None
+    return data.get("k")
+
+
+def _filter_kind(prop: str) -> str | None:
+    return next((kind for kind, rx in FILTER_KINDS.items() if rx.search(prop or "")), None)
+
+
+def _select_names(query: dict) -> list[str]:
+    cmd = query["Query"]["Commands"][0]["SemanticQueryDataShapeCommand"]["Query"]
+    return [s.get("Name") for s in cmd.get("Select", [])]
+
+
+def _literal(value: str, previous: str) -> str:
+    """Literal con el mismo tipo que el aprendido: 'texto' o numérico (5L, 1D)."""
+    if previous.startswith("'"):
+        return "'" + str(value).replace("'", "''") + "'"
+    return str(value)
+
+
+def substitute(query: dict, filters: dict[str, str], literals: dict | None = None) -> dict:
+    """
+    Copia de `query` con los literales de cada filtro reemplazados. Falla si
+    la query filtra por algo que no viene en `filters` o viceversa.
+    `literals` ({tipo: {valor: literal}}) trae los literales exactos vistos
+    en el navegador para valores que el slicer escribe distinto (Mes).
+    """
+    literals = literals or {}
+    query = copy.deepcopy(query)
+    done = set()
+    for cond, prop in _in_conditions(query):
+        kind = _filter_kind(prop)
+        if kind is None:
+            continue
+        if kind not in filters:
+            raise ReplayError(f"la plantilla filtra por {prop!r} y no hay valor")
+        try:
+            previous = cond["Values"][0][0]["Literal"]["Value"]
+        except (KeyError, IndexError, TypeError):
+            raise ReplayError(f"filtro {prop!r} sin literal simple")
+        literal = literals.get(kind, {}).get(filters[kind]) or _literal(filters[kind], previous)
+        cond["Values"] = [[{"Literal": {"Value": literal}}]]
+        done.add(kind)
+    missing = set(filters) - done
+    if missing:
+        raise ReplayError(f"la plantilla no filtra por {', '.join(sorted(missing))}")
+    return query
+
+
+class HTTPPool:
+    """Conexiones HTTP(S) keep-alive reutilizables hacia un mismo host."""
+
+    def __init__(self, base_url: str, size: int = REPLAY_CONNS, timeout: float = REPLAY_TIMEOUT):
+        parts = urlsplit(base_url)
+        self.scheme  = parts.scheme
+        self.netloc  = parts.netloc
+        self.timeout = timeout
+        self._free   = queue.LifoQueue()
+        self._slots  = asyncio.Semaphore(max(1, size))
+        self.stats   = {"requests": 0, "connections": 0, "reused": 0}
+
+    def _connect(self):
+        cls = http.client.HTTPSConnection if self.scheme == "https" else http.client.HTTPConnection
+        self.stats["connections"] += 1
+        return cls(self.netloc, timeout=self.timeout)
+
+    def _post(self, path: str, body: bytes, headers: dict) -> tuple[int, bytes]:
+        for attempt in (1, 2):
+            try:
+                if attempt == 2:
+                    raise queue.Empty
+                conn = self._free.get_nowait()
+                self.stats["reused"] += 1
+            except queue.Empty:
+                conn = self._connect()
+            try:
+                conn.request("POST", path, body=body, headers=headers)
+                resp = conn.getresponse()
+                data = resp.read()
+            except (OSError, http.client.HTTPException):
+                conn.close()
+                if attempt == 2:
+                    raise
+                continue   # conexión keep-alive vencida: una más, nueva
+            if resp.will_close:
+                conn.close()
+            else:
+                self._free.put(conn)
+            return resp.status, data
+
+    async def post_json(self, path: str, payload: dict, headers: dict) -> dict:
+        body = json.dumps(payload).encode("utf-8")
+        async with self._slots:
+            self.stats["requests"] += 1
+            try:
+                status, data = await asyncio.to_thread(self._post, path, body, headers)
+            except (OSError, http.client.HTTPException) as e:
+                raise ReplayError(f"HTTP: {e}")
+        if status != 200:
+            raise ReplayError(f"HTTP {status}")
+        try:
+            return json.loads(data)
+        except ValueError:
+            raise ReplayError("respuesta no es JSON")
+
+    def close(self):
+        while True:
+            try:
+                self._free.get_nowait().close()
+            except queue.Empty:
+                return
+
+
+class ReplayEngine:
+    """Plantillas querydata aprendidas y su re-envío por HTTP."""
+
+    def __init__(self, path: str = REPLAY_FILE, api_base: str = API_BASE,
+                 connections: int = REPLAY_CONNS, timeout: float = REPLAY_TIMEOUT):
+        self.path        = Path(path)
+        self.api_base    = api_base
+        self.connections = connections
+        self.timeout     = timeout
+        self.state       = self._load()
+        self._pool       = None
+        self.stats       = {"replays": 0, "failures": 0}
+
+    @classmethod
+    def from_env(cls) -> "ReplayEngine | None":
+        """Devuelve el motor configurado, o None si está desactivado."""
+        return None if REPLAY_MODE == "off" else cls()
+
+    @property
+    def ready(self) -> bool:
+        return bool(self.state.get("templates") and self.state.get("api_url") and self.state.get("resource_key"))
+
+    # ── Plantillas ───────────────────────────────────────────────────────────
+    def _load(self) -> dict:
+        try:
+            return json.loads(self.path.read_text(encoding="utf-8"))
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError) as e:
+            logger.warning(f"⚠️ Plantillas de replay ilegibles ({e}); se re-aprenderán.")
+            return {}
+
+    def _save(self):
+        try:
+            self.path.write_text(json.dumps(self.state, ensure_ascii=False), encoding="utf-8")
+        except OSError as e:
+            logger.warning(f"No se pudieron guardar las plantillas de replay: {e}")
+
+    def invalidate(self, reason: str):
+        if not self.state:
+            return
+        logger.warning(f"🗑️ Plantillas de replay descartadas ({reason}).")
+        self.state = {}
+        try:
+            self.path.unlink()
+        except OSError:
+            pass
+
+    def learn(self, capture: QueryCapture, report_url: str, filters: dict[str, str] | None = None) -> int:
+        """
+        Guarda como plantillas las querydata que hizo el navegador. `filters`
+        son los valores con los que se clickearon los slicers ({"mes": …});
+        se recuerda qué literal produjo cada uno. Devuelve cuántas plantillas.
+        """
+        key = resource_key_from_url(report_url)
+        if not key or not capture.sent:
+            return 0
+        same = self.state.get("resource_key") == key
+        templates = dict(self.state.get("templates", {})) if same else {}
+        literals  = dict(self.state.get("literals", {})) if same else {}
+        api_url = model_id = None
+        for url, request in capture.sent.values():
+            for query in request.get("queries") or []:
+                try:
+                    visual_id = _visual_id(query)
+                    select = _select_names(query)
+                except (KeyError, TypeError, IndexError):
+                    continue
+                kinds = set()
+                for cond, prop in _in_conditions(query):
+                    kind = _filter_kind(prop)
+                    if kind is None:
+                        continue
+                    kinds.add(kind)
+                    if filters and kind in filters:
+                        try:
+                            lit = cond["Values"][0][0]["Literal"]["Value"]
+                        except (KeyError, IndexError, TypeError):
+                            continue
+                        literals.setdefault(kind, {})[filters[kind]] = lit
+                kinds = sorted(kinds)
+                templates[f"{visual_id}|{','.join(kinds)}"] = {
+                    "visual_id": visual_id, "select": select, "filters": kinds, "query": query,
+                }
+            api_url = url
+            model_id = request.get("modelId", model_id)
+        if api_url is None:
+            return 0
+        self.state = {
+            "api_url": api_url, "resource_key": key, "model_id": model_id,
+            "learned": time.time(), "templates": templates, "literals": literals,
+        }
+        self._save()
+        logger.info(f"📚 Replay: {len(templates)} plantillas querydata aprendidas")
+        return len(templates)
+
+    def _templates(self, kinds: set[str], column: re.Pattern) -> list[dict]:
+        """Plantillas que filtran exactamente por `kinds` y traen una columna que calce."""
+        return [
+            t for t in self.state.get("templates", {}).values()
+            if set(t["filters"]) == kinds and any(column.search((n or "").split(".", 1)[-1]) for n in t["select"])
+        ]
+
+    # ── Envío ────────────────────────────────────────────────────────────────
+    def _endpoint(self) -> tuple[str, str]:
+        learned = urlsplit(self.state["api_url"])
+        base = urlsplit(self.api_base) if self.api_base else learned
+        path = learned.path + (f"?{learned.query}" if learned.query else "")
+        return f"{base.scheme}://{base.netloc}", path
+
+    async def _send(self, templates: list[dict], filters: dict[str, str]) -> QueryCapture:
+        if not self.ready:
+            raise ReplayError("sin plantillas")
+        base, path = self._endpoint()
+        if self._pool is None:
+            self._pool = HTTPPool(base, self.connections, self.timeout)
+        queries = [substitute(t["query"], filters, self.state.get("literals")) for t in templates]
+        request = {"version": "1.0.0", "queries": queries, "cancelQueries": [],
+                   "modelId": self.state.get("model_id")}
+        headers = {
+            "Content-Type": "application/json;charset=UTF-8",
+            "Accept": "application/json",
+            "X-PowerBI-ResourceKey": self.state["resource_key"],
+            "ActivityId": str(uuid.uuid4()),
+            "RequestId": str(uuid.uuid4()),
+        }
+        payload = await self._pool.post_json(path, request, headers)
+        capture = QueryCapture()
+        capture.ingest(request, payload)
+        for t in templates:
+            vis = capture.visuals.get(t["visual_id"])
+            if vis is None:
+                raise ReplayError(f"sin resultado para el visual {t['visual_id']}")
+            if vis.columns != t["select"]:
+                raise SchemaChanged(f"{t['visual_id']}: {vis.columns} ≠ {t['select']}")
+        self.stats["replays"] += 1
+        return capture
+
+    async def _guarded(self, coro):
+        try:
+            return await coro
+        except SchemaChanged as e:
+            self.stats["failures"] += 1
+            self.invalidate(f"cambió el esquema: {e}")
+        except ReplayError as e:
+            self.stats["failures"] += 1
+            logger.warning(f"⚠️ Replay falló ({e}); se usará el navegador.")
+        return None
+
+    # ── Lecturas ─────────────────────────────────────────────────────────────
+    async def record_update(self) -> str | None:
+        """RecordUpdate con el formato de la tarjeta, o None."""
+        templates = self._templates(set(), RECORD_RE)
+        if not self.ready or not templates:
+            return None
+        capture = await self._guarded(self._send(templates[:1], {}))
+        return capture.record_update() if capture else None
+
+    async def extract_scores(self, mes: str, supervisor: str, visitas: list[str],
+                             tiendas: list[str] | None = None) -> dict | None:
+        """
+        {tienda: {visita: nota}} con los mismos valores que el camino por
+        navegador, o None si el replay no alcanza (se usa el navegador).
+        Sin `tiendas` se toman todas las que traiga la tabla del supervisor.
+        """
+        table = self._templates({"mes", "supervisor", "visita"}, STORE_RE)
+        if not self.ready or not table:
+            return None
+        t0 = time.monotonic()
+        base = {"mes": mes, "supervisor": supervisor}
+        captures = await asyncio.gather(*(
+            self._guarded(self._send(table[:1], {**base, "visita": v})) for v in visitas
+        ))
+        if any(c is None for c in captures):
+            return None
+        if not any(vis.rows for c in captures for vis in c.visuals.values()):
+            # Ni una fila: filtros sin calce (p. ej. otro literal de Mes)
+            logger.info("Replay: la tabla vino vacía para todas las visitas; se usará el navegador.")
+            return None
+
+        present = [c.stores() for c in captures]
+        if tiendas is None:
+            tiendas = list(dict.fromkeys(t for names in present for t in names))
+        donut = self._templates({"mes", "supervisor", "visita", "tienda"}, SR_RE)
+        result = {t: {} for t in tiendas}
+        for visita, capture, names in zip(visitas, captures, present):
+            for tienda in tiendas:
+                score = capture.store_score(tienda, visita)
+                if not score and donut and tienda.upper() in names:
+                    filtered = await self._guarded(self._send(donut[:1], {**base, "visita": visita, "tienda": tienda}))
+                    if filtered is None:
+                        return None
+                    score = filtered.success_rate()
+                result[tienda][visita] = score or "Sin visita"
+        logger.info(f"⚡ Replay {supervisor}: notas en {time.monotonic() - t0:.2f}s "
+                    f"({self._pool.stats['requests']} requests, {self._pool.stats['connections']} conexiones)")
+        return result
+
+    async def extract_units(self, mes: str, supervisores: list[str], visitas: list[str],
+                            tiendas: list[str] | None = None) -> dict | None:
+        """Notas de todas las unidades (supervisor, visita) combinadas, o None."""
+        per_supervisor = await asyncio.gather(*(
+            self.extract_scores(mes, sup, visitas, tiendas) for sup in supervisores
+        ))
+        if any(scores is None for scores in per_supervisor):
+            return None
+        by_unit = {
+            (sup, visita): {t: v[visita] for t, v in scores.items()}
+            for sup, scores in zip(supervisores, per_supervisor) for visita in visitas
+        }
+        return merge_scores(by_unit, work_units(supervisores, visitas), tiendas or [], visitas)
+
+    def close(self):
+        if self._pool is not None:
+            self._pool.close()
+            self._pool = None
@@ -0,0 +1,305 @@
+"""
+querydata_capture.py — Lectura de datos desde las respuestas querydata de PowerBI.
+
+Cada visual del reporte pide sus datos con un POST a `.../querydata`. El
+request trae el VisualId (ApplicationContext.Sources) y la lista de columnas
+/medidas seleccionadas; la respuesta trae los valores en formato DSR. Este
+módulo escucha `page.on("response")`, asocia cada respuesta al visual que la
+pidió y expone RecordUpdate, Success Rate y las filas de la tabla de tiendas
+apenas llega la respuesta, sin esperar el render. El camino por DOM queda
+como respaldo en los scripts.
+
+Con POWERBI_QUERYDATA_DUMP=<dir> cada par request/respuesta se guarda como
+JSON en ese directorio; así se graban los fixtures de bench_dsr.py.
+"""
+
+import asyncio
+import json
+import logging
+import os
+import re
+import time
+import weakref
+from datetime import datetime, timezone
+from pathlib import Path
+
+import dsr_decoder
+
+logger = logging.getLogger(__name__)
+
+QUERY_RE  = re.compile(r"querydata", re.IGNORECASE)
+RECORD_RE = re.compile(r"record\s*update", re.IGNORECASE)
+SR_RE     = re.compile(r"suc+e?s+\s*rate", re.IGNORECASE)
+STORE_RE  = re.compile(r"tienda|store|local", re.IGNORECASE)
+VISITA_RE = re.compile(r"visita", re.IGNORECASE)
+DUMP_DIR  = os.getenv("POWERBI_QUERYDATA_DUMP", "")
+# Columnas que leen record_update/success_rate/stores/store_score; el resto no se guarda
+READ_RES  = (RECORD_RE, SR_RE, STORE_RE, VISITA_RE)
+MONTHS_EN = ["JAN", "FEB", "MAR", "APR", "MAY", "JUN", "JUL", "AUG", "SEP", "OCT", "NOV", "DEC"]
+
+
+class VisualResult:
+    """
+    Última respuesta querydata de un visual: todas las columnas del
+    descriptor y las filas planas, solo con las columnas que se leen.
+    """
+
+    def __init__(self, visual_id: str, columns: list[str], rows: list[dict]):
+        self.visual_id = visual_id
+        self.columns   = columns
+        self.rows      = rows
+        self.received  = time.monotonic()
+
+    def column(self, pattern: re.Pattern) -> str | None:
+        """Primera columna cuya propiedad (lo que sigue a 'Tabla.') calce con `pattern`."""
+        return next((c for c in self.columns if pattern.search(c.split(".", 1)[-1])), None)
+
+    def __repr__(self):
+        return f"VisualResult({self.visual_id}, cols={self.columns}, rows={len(self.rows)})"
+
+
+class QueryCapture:
+    """
+    Escucha las respuestas querydata de una página y guarda la última por
+    visual. Sin página sirve de contenedor para respuestas obtenidas por otra
+    vía (query_replay.py) con las mismas lecturas de alto nivel.
+    """
+
+    def __init__(self, page=None):
+        self.visuals: dict[str, VisualResult] = {}
+        # Última querydata exitosa por forma (visuales + columnas filtradas): {clave: (url, request)}.
+        # Sin tope fijo: con muchas tiendas y visitas un historial corto perdía la tarjeta y la tabla
+        self.sent: dict[tuple, tuple[str, dict]] = {}
+        self.responses = 0
+        self.errors    = 0
+        self._changed  = asyncio.Event()
+        self._pending  = set()
+        if page is not None:
+            page.on("response", self._on_response)
+
+    def reset(self):
+        self.visuals.clear()
+        self.sent.clear()
+        self.responses = 0
+        self.errors    = 0
+
+    # ── Captura ──────────────────────────────────────────────────────────────
+    def _on_response(self, response):
+        if response.request.method != "POST" or not QUERY_RE.search(response.url):
+            return
+        task = asyncio.ensure_future(self._ingest(response))
+        self._pending.add(task)
+        task.add_done_callback(self._pending.discard)
+
+    async def _ingest(self, response):
+        try:
+            if not response.ok:
+                return
+            request = response.request.post_data_json or {}
+            payload = await response.json()
+        except Exception as e:
+            self.errors += 1
+            logger.debug(f"querydata ilegible: {e}")
+            return
+        self.remember(response.url, request)
+        self.ingest(request, payload)
+        self._changed.set()
+
+    def remember(self, url: str, request: dict):
+        """Guarda `request` como la última de su forma (la plantilla que aprende query_replay)."""
+        try:
+            key = tuple((_visual_id(q), tuple(sorted(prop for _, prop in _in_conditions(q))))
+                        for q in request.get("queries") or [])
+        except (KeyError, TypeError, IndexError):
+            key = ("?",)
+        self.sent.pop(key, None)   # al final: la más reciente es la que da api_url/modelId
+        self.sent[key] = (url, request)
+
+    def ingest(self, request: dict, payload: dict):
+        """Asocia cada resultado de `payload` al visual de la query correspondiente."""
+        if DUMP_DIR:
+            _dump(request, payload)
+        queries = request.get("queries") or []
+        results = payload.get("results") or []
+        for query, res in zip(queries, results):
+            try:
+                visual_id = _visual_id(query)
+                data = res["result"]["data"]
+                columns = dsr_decoder.columns(data)
+                rows = _read_rows(data, columns)
+            except (KeyError, TypeError, IndexError, ValueError) as e:
+                self.errors += 1
+                logger.debug(f"querydata sin DSR reconocible: {e}")
+                continue
+            self.visuals[visual_id] = VisualResult(visual_id, columns, rows)
+            self.responses += 1
+
+    async def wait_for(self, getter, timeout: float):
+        """Espera hasta que `getter(self)` devuelva algo distinto de None (o vence)."""
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while True:
+            value = getter(self)
+            if value is not None:
+                return value
+            remaining = deadline - loop.time()
+            if remaining <= 0:
+                return None
+            self._changed.clear()
+            try:
+                await asyncio.wait_for(self._changed.wait(), timeout=remaining)
+            except asyncio.TimeoutError:
+                return getter(self)
+
+    # ── Lecturas de alto nivel ───────────────────────────────────────────────
+    def find(self, pattern: re.Pattern, since: float = 0.0) -> VisualResult | None:
+        """Visual más reciente (recibido después de `since`) con una columna que calce."""
+        hits = [v for v in self.visuals.values() if v.received >= since and v.column(pattern)]
+        return max(hits, key=lambda v: v.received, default=None)
+
+    def record_update(self) -> str | None:
+        vis = self.find(RECORD_RE)
+        if not vis or not vis.rows:
+            return None
+        return format_record_update(vis.rows[0].get(vis.column(RECORD_RE)))
+
+    def success_rate(self, since: float = 0.0) -> str | None:
+        """Success Rate del donut (visual sin columna de tienda)."""
+        hits = [v for v in self.visuals.values()
+                if v.received >= since and v.column(SR_RE) and not v.column(STORE_RE)]
+        vis = max(hits, key=lambda v: v.received, default=None)
+        if not vis or len(vis.rows) != 1:
+            return None
+        return format_percent(vis.rows[0].get(vis.column(SR_RE)))
+
+    def stores(self, since: float = 0.0) -> list[str]:
+        """
+        Tiendas de la tabla más reciente (recibida después de `since`), en
+        orden. Prefiere la tabla que trae Success Rate; si no, cualquier visual
+        con columna de tienda (la tabla Fecha / Visita / Tienda / Evidencia).
+        """
+        hits = [v for v in self.visuals.values() if v.received >= since and v.column(STORE_RE)]
+        with_sr = [v for v in hits if v.column(SR_RE)]
+        vis = max(with_sr or hits, key=lambda v: v.received, default=None)
+        if vis is None:
+            return []
+        col = vis.column(STORE_RE)
+        names = (_norm(row.get(col)) for row in vis.rows)
+        return list(dict.fromkeys(n for n in names if n))
+
+    def store_score(self, tienda: str, visita: str | None = None, since: float = 0.0) -> str | None:
+        """
+        Nota de una tienda desde la tabla (visual con columna tienda + Success
+        Rate) recibida después de `since`: una tabla de la visita anterior que
+        siga en la captura no cuenta.
+        """
+        tienda_norm = _norm(tienda)
+        visita_norm = _norm(visita) if visita else None
+        for vis in sorted(self.visuals.values(), key=lambda v: v.received, reverse=True):
+            if vis.received < since:
+                break
+            store_col, sr_col = vis.column(STORE_RE), vis.column(SR_RE)
+            if not store_col or not sr_col:
+                continue
+            # La tabla puede no tener columna de visita (el slicer ya filtra)
+            visita_col = vis.column(VISITA_RE)
+            for row in vis.rows:
+                if _norm(row.get(store_col)) != tienda_norm:
+                    continue
+                if visita_norm and visita_col and _norm(row.get(visita_col)) != visita_norm:
+                    continue
+                score = format_percent(row.get(sr_col))
+                if score:
+                    return score
+        return None
+
+
+# ── Registro por página ───────────────────────────────────────────────────────
+_captures = weakref.WeakKeyDictionary()
+
+
+def capture_for(page) -> QueryCapture:
+    """Instala (una sola vez por página) la captura de querydata."""
+    cap = _captures.get(page)
+    if cap is None:
+        cap = _captures[page] = QueryCapture(page)
+    return cap
+
+
+# ── Formatos compatibles con el camino DOM ────────────────────────────────────
+def format_percent(value) -> str | None:
+    """0.75 → '75%'; 75 → '75%'; fuera de rango → None."""
+    if isinstance(value, str):
+        m = re.search(r"(\d{1,3}(?:[.,]\d+)?)", value)
+        if not m:
+            return None
+        value = float(m.group(1).replace(",", "."))
+    if not isinstance(value, (int, float)):
+        return None
+    pct = value * 100 if 0 < value <= 1 else value
+    pct = int(round(pct))
+    return f"{pct}%" if 0 < pct <= 100 else None
+
+
+def format_record_update(value) -> str | None:
+    """
+    Devuelve el RecordUpdate con el mismo formato que muestra la tarjeta
+    ('27 - FEB    17 : 58'), para que la comparación con last_record.txt no
+    cambie según el camino usado.
+    """
+    if value is None:
+        return None
+    if isinstance(value, str):
+        return value.strip() or None
+    if isinstance(value, (int, float)):
+        # Fechas DSR sin tipo: milisegundos desde epoch
+        value = datetime.fromtimestamp(value / 1000, tz=timezone.utc)
+    if isinstance(value, datetime):
+        dt = value
+        return f"{dt.day} - {MONTHS_EN[dt.month - 1]}    {dt.hour} : {dt.minute:02d}"
+    return None
+
+
+def _dump(request: dict, payload: dict):
+    try:
+        path = Path(DUMP_DIR)
+        path.mkdir(parents=True, exist_ok=True)
+        name = f"querydata_{time.strftime('%Y%m%d_%H%M%S')}_{time.monotonic_ns() % 10**6:06d}.json"
+        (path / name).write_text(json.dumps({"request": request, "response": payload}, ensure_ascii=False),
+                                 encoding="utf-8")
+    except OSError as e:
+        logger.debug(f"No se pudo guardar querydata: {e}")
+
+
+def _read_rows(data: dict, columns: list[str]) -> list[dict]:
+    """Filas del DSR recortadas a las columnas que se leen; sin ninguna, ni se decodifican."""
+    keep = [c for c in columns if any(p.search(c.split(".", 1)[-1]) for p in READ_RES)]
+    if not keep:
+        return []
+    return [{c: row.get(c) for c in keep} for row in dsr_decoder.iter_rows(data)]
+
+
+def _in_conditions(node):
+    """Recorre la query y devuelve cada condición `In` sobre una sola columna."""
+    if isinstance(node, dict):
+        cond = node.get("In")
+        if isinstance(cond, dict):
+            exprs = cond.get("Expressions") or []
+            if len(exprs) == 1 and "Column" in exprs[0]:
+                yield cond, exprs[0]["Column"].get("Property", "")
+        for value in node.values():
+            yield from _in_conditions(value)
+    elif isinstance(node, list):
+        for item in node:
+            yield from _in_conditions(item)
+
+
+def _visual_id(query: dict) -> str:
+    sources = query["ApplicationContext"]["Sources"]
+    return sources[0].get("VisualId") or "?"
+
+
+def _norm(value) -> str:
+    if value is None:
+        return ""
+    return re.sub(r"\s+", " ", str(value).replace("\xa0", " ")).strip().upper()
@@ -0,0 +1,280 @@
+"""
+report_parser.py — Parser único para el texto del reporte (notas y RecordUpdate).
+
+`parse_success_rate`, `parse_record_update` y `parse_score_from_row` estaban
+copiados (y divergiendo) en check_and_notify.py y telegram_bot.py; cada
+llamada recompilaba sus regex, volvía a partir el texto y lo recorría hasta
+seis veces, una por estrategia. Aquí un solo `finditer` con todas las
+etiquetas y números precompilados en una alternancia recorre el texto una
+vez y produce todos los candidatos, con su procedencia:
+
+    record_update   RecordUpdate seguido de fecha; si no, la primera fecha suelta
+                    (en forma canónica, ver `canonical_record_update`)
+    success_rate    en orden de prioridad: SR directo, SR a ≤200 caracteres,
+                    línea aislada (últimas 80), Resumen General, Nota, Items con nota
+    row_score       primer porcentaje válido; si no hay, primer decimal válido
+
+`record_update` no tokeniza: son dos búsquedas con regex precompiladas
+("RecordUpdate + fecha" y, si no calza, la primera fecha suelta), que es
+lo más barato tanto para el texto corto de la tarjeta como para la página.
+`parse` no se memoiza: cada lectura de página es un texto distinto. `row_score` sí, por digest blake2b
+del texto y con pocas entradas: las mismas filas vuelven a pasar en cada
+visita.
+"""
+
+import hashlib
+import re
+from collections import OrderedDict
+from functools import wraps
+
+# Se aplica sobre el texto en minúsculas. Cada rama empieza por su primer
+# carácter literal, así el motor descarta rápido las posiciones que no abren
+# un token (una alternancia con IGNORECASE prueba todas las ramas en cada
+# carácter); los grupos toman el resto del token, sin ese primer carácter.
+_NUMBERS = (r"\d(?:(?P<date>\d?\s*-\s*(?P<month>[a-z]{3})\s*\d{1,2}\s*:\s*\d{2})"
+            r"|(?P<pct>\d{0,2})(?P<pct_dec>[.,]\d+)?\s*%"
+            r"|(?P<dec>\d{0,2})[.,]\d+)")
+_TOKEN_RE = re.compile(
+    r"s(?P<sr>uce?ss(?P<sr_ws>\s*)rat)"
+    r"|i(?P<items>tems\s+con\s+nota)"
+    r"|n(?P<nota>ota)"
+    r"|r(?:(?P<resumen>esumen\s+general)|(?P<ru>ecordupdat\s*e))"
+    r"|" + _NUMBERS
+)
+# Solo los números, para el texto de una fila (no hace falta buscar etiquetas)
+_NUMBER_RE    = re.compile(_NUMBERS, re.IGNORECASE)
+_WS_RE        = re.compile(r"\s+")
+_SR_DIRECT_RE = re.compile(r"[e\s]*")   # lo único que puede separar "Sucess Rat" del % directo
+_RU_DATE      = r"(?P<date>\d{1,2}\s*-\s*(?P<month>[a-z]{3})\s*\d{1,2}\s*:\s*\d{2})"
+_RU_LABELED_RE = re.compile(r"recordupdat\s*e\s*" + _RU_DATE, re.IGNORECASE)
+_RU_LOOSE_RE   = re.compile(_RU_DATE, re.IGNORECASE)
+_RU_PARTS_RE  = re.compile(r"(\d{1,2})\s*-\s*([A-Za-z]{3})\s*(\d{1,2})\s*:\s*(\d{2})")
+
+# Procedencia → texto para el log; el orden de SR_SOURCES es la prioridad
+SR_SOURCES = ["sr_directo", "sr_flexible", "linea_aislada", "resumen", "nota", "items"]
+LABELS = {
+    "sr_directo":    "patrón SR directo",
+    "sr_flexible":   "patrón SR flexible",
+    "linea_aislada": "línea aislada",
+    "resumen":       "patrón Resumen",
+    "nota":          "patrón Nota",
+    "items":         "patrón Items",
+    "porcentaje":    "fila",
+    "decimal":       "fila (decimal)",
+    "record_update": "RecordUpdate",
+    "fecha_suelta":  "fecha suelta",
+}
+# Etiqueta → (estrategia, distancia máxima al %, ¿admite dígitos en medio?)
+_LABELED = {"sr": ("sr_flexible", 200, True), "resumen": ("resumen", 200, True),
+            "nota": ("nota", 30, False), "items": ("items", 100, True)}
+TAIL_LINES = 80
+ROW_MEMO   = 256    # textos de fila recordados (las mismas filas en cada visita)
+
+
+class Candidate:
+    """Un valor encontrado en el texto y la estrategia que lo dio."""
+
+    __slots__ = ("kind", "value", "source", "pos")
+
+    def __init__(self, kind: str, value, source: str, pos: int):
+        self.kind   = kind
+        self.value  = value
+        self.source = source
+        self.pos    = pos
+
+    @property
+    def label(self) -> str:
+        return LABELS.get(self.source, self.source)
+
+    def __repr__(self):
+        return f"Candidate({self.kind}, {self.value!r}, {self.source}@{self.pos})"
+
+
+class ParsedText:
+    """Todos los candidatos de un texto, por tipo y en orden de prioridad."""
+
+    __slots__ = ("record_updates", "success_rates", "row_scores")
+
+    def __init__(self, record_updates: list, success_rates: list, row_scores: list):
+        self.record_updates = record_updates
+        self.success_rates  = success_rates
+        self.row_scores     = row_scores
+
+    @property
+    def candidates(self) -> list[Candidate]:
+        return self.record_updates + self.success_rates + self.row_scores
+
+    def __repr__(self):
+        return (f"ParsedText(ru={len(self.record_updates)}, sr={len(self.success_rates)}, "
+                f"filas={len(self.row_scores)})")
+
+
+def _memo(maxsize: int):
+    """Memoización LRU por digest del texto; `fn.__wrapped__` y `fn.cache_clear()` como lru_cache."""
+    def decorate(fn):
+        cache = OrderedDict()
+
+        @wraps(fn)
+        def memo(text: str):
+            key = hashlib.blake2b(text.encode("utf-8", "surrogatepass"), digest_size=16).digest()
+            if key in cache:
+                cache.move_to_end(key)
+                return cache[key]
+            result = cache[key] = fn(text)
+            if len(cache) > maxsize:
+                cache.popitem(last=False)
+            return result
+
+        memo.cache_clear = cache.clear
+        return memo
+    return decorate
+
+
+def _valid(n: int) -> bool:
+    return 0 < n <= 100
+
+
+def _span(gap: str) -> int:
+    """Largo de `gap` con los espacios colapsados (las distancias se miden sobre texto normalizado)."""
+    return len(_WS_RE.sub(" ", gap))
+
+
+def _in_tail(text: str, pos: int, n: int) -> bool:
+    """True si la línea de `pos` está entre las últimas `n` líneas no vacías."""
+    start = text.rfind("\n", 0, pos) + 1
+    return sum(1 for line in text[start:].split("\n") if line.strip()) <= n
+
+
+def _isolated(text: str, m) -> bool:
+    """True si el % ocupa solo su línea ('85 %'), sin decimales."""
+    if m.group("pct_dec"):
+        return False
+    start = text.rfind("\n", 0, m.start()) + 1
+    end = text.find("\n", m.end())
+    return text[start:end if end >= 0 else len(text)].strip() == m.group(0)
+
+
+def parse(text: str) -> ParsedText:
+    """Recorre `text` una vez y devuelve todos los candidatos."""
+    lowered = text.lower()
+    if len(lowered) != len(text):
+        # 'İ' es el único carácter que cambia de largo al pasar a minúsculas
+        lowered = text.replace("\u0130", "I").lower()
+
+    # Durante el recorrido solo tuplas (valor, posición); los Candidate se arman al final
+    ru_labeled = ru_loose = None
+    sr_first: dict[str, tuple] = {}              # estrategia → primer match (válido o no, como re.search)
+    isolated = pct_row = dec_row = None
+    pending: list[tuple[str, int, bool]] = []    # etiquetas SR/Resumen/Nota/Items esperando su %
+    prev_ru = -1                                 # fin del token anterior si fue "RecordUpdate"
+
+    for m in _TOKEN_RE.finditer(lowered):
+        # Los grupos anidados cierran antes que el externo; solo el decimal del % queda último
+        kind = "pct" if m.lastgroup == "pct_dec" else m.lastgroup
+        start = m.start()
+
+        if kind == "pct":
+            n = int(text[start:m.end("pct")])
+            for label, end, spaced in pending:
+                gap = lowered[end:start]
+                if "%" in gap:
+                    continue
+                if label == "sr" and spaced and "sr_directo" not in sr_first and _SR_DIRECT_RE.fullmatch(gap):
+                    sr_first["sr_directo"] = (n, start)
+                source, limit, digits = _LABELED[label]
+                if source in sr_first or _span(gap) > limit or (not digits and any(c.isdigit() for c in gap)):
+                    continue
+                sr_first[source] = (n, start)
+            pending.clear()
+            if _valid(n):
+                if pct_row is None:
+                    pct_row = (n, start)
+                if _isolated(lowered, m):
+                    isolated = (n, start)       # la última gana; abajo se exige que esté al final del texto
+        elif kind == "dec":
+            if dec_row is None:
+                n = int(text[start:m.end("dec")])
+                if _valid(n):
+                    dec_row = (n, start)
+        elif kind == "date":
+            value = (text[start:m.end()], m.group("month").capitalize())
+            if ru_loose is None:
+                ru_loose = (value, start)
+            if ru_labeled is None and prev_ru >= 0 and not lowered[prev_ru:start].strip():
+                ru_labeled = (value, start)
+        elif kind == "sr":
+            pending.append(("sr", m.end(), bool(m.group("sr_ws"))))
+        elif kind == "items":
+            # "Items con nota" también es una etiqueta "Nota" (el patrón original no exige límite de palabra)
+            pending.append(("items", m.end(), False))
+            pending.append(("nota", m.end(), False))
+        elif kind != "ru":
+            pending.append((kind, m.end(), False))
+        prev_ru = m.end() if kind == "ru" else -1
+
+    if isolated and not _in_tail(text, isolated[1], TAIL_LINES):
+        isolated = None
+    found = dict(sr_first, linea_aislada=isolated)
+    success_rates = [Candidate("success_rate", f"{found[s][0]}%", s, found[s][1])
+                     for s in SR_SOURCES if found.get(s) and _valid(found[s][0])]
+    record_updates = [Candidate("record_update", c[0], s, c[1])
+                      for s, c in (("record_update", ru_labeled), ("fecha_suelta", ru_loose)) if c]
+    row_scores = [Candidate("row_score", f"{c[0]}%", s, c[1])
+                  for s, c in (("porcentaje", pct_row), ("decimal", dec_row)) if c]
+    return ParsedText(record_updates, success_rates, row_scores)
+
+
+def success_rate(text: str) -> Candidate | None:
+    """Mejor candidato de Success Rate del texto de página, o None."""
+    rates = parse(text).success_rates
+    return rates[0] if rates else None
+
+
+def record_update(text: str) -> tuple[str | None, str | None]:
+    """(RecordUpdate, mes) del texto, o (None, None)."""
+    m = _RU_LABELED_RE.search(text) or _RU_LOOSE_RE.search(text)
+    if not m:
+        return None, None
+    return canonical_record_update(m.group("date")), m.group("month").capitalize()
+
+
+def canonical_record_update(value: str | None) -> str | None:
+    """
+    RecordUpdate en la forma de la tarjeta ('27 - FEB    17 : 58'): sin ceros a
+    la izquierda, mes en mayúsculas y espaciado fijo. El DOM, querydata y el
+    replay lo escriben distinto; se compara y se guarda siempre así.
+    """
+    if not value or not value.strip():
+        return None
+    m = _RU_PARTS_RE.search(value)
+    if not m:
+        return _WS_RE.sub(" ", value).strip()
+    day, month, hour, minute = m.groups()
+    return f"{int(day)} - {month.upper()}    {int(hour)} : {minute}"
+
+
+@_memo(ROW_MEMO)
+def row_score(text: str) -> Candidate | None:
+    """
+    Nota del texto de una fila: primer porcentaje válido, o el primer decimal.
+    Mismo resultado que `parse(text).row_scores[0]`, pero recorre solo los
+    números y corta en el primer porcentaje válido.
+    """
+    dec = None
+    for m in _NUMBER_RE.finditer(text):
+        kind = m.lastgroup
+        if kind == "dec":
+            n = int(text[m.start():m.end("dec")])
+            if dec is None and _valid(n):
+                dec = Candidate("row_score", f"{n}%", "decimal", m.start())
+        elif kind != "date":
+            n = int(text[m.start():m.end("pct")])
+            if _valid(n):
+                return Candidate("row_score", f"{n}%", "porcentaje", m.start())
+    return dec
+
+
+def first_percent(text: str) -> str | None:
+    """Primer porcentaje válido (1–100) del texto, sin caer a decimales."""
+    c = row_score(text)
+    return c.value if c and c.source == "porcentaje" else None
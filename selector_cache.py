@@ -0,0 +1,140 @@
+"""
+selector_cache.py — Selectores aprendidos entre corridas.
+
+Varias operaciones prueban selectores en un orden fijo (botón de cookies,
+variantes del borrador del slicer, selectores de fila) y cada fallo cuesta
+un timeout. Este almacén recuerda, por operación, qué selector, en qué
+frame y con qué estrategia funcionó; la corrida siguiente prueba eso
+primero.
+
+También guarda las coordenadas calibradas de los slicers (slicer_state.py).
+Lo aprendido vale para un layout del reporte: la huella (roles y títulos de
+los visuales, ver visual_index.py) se guarda junto a los selectores y, si un
+rediseño del reporte la cambia, todo lo aprendido se descarta solo.
+
+Configuración por entorno:
+    POWERBI_SELECTOR_CACHE = .powerbi_selectors.json   (off = no aprender)
+"""
+
+import json
+import logging
+import os
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+SELECTOR_CACHE = os.getenv("POWERBI_SELECTOR_CACHE", ".powerbi_selectors.json")
+
+
+class SelectorCache:
+    """{operación: {selector, frame, strategy}} por huella de layout, con aciertos/fallos."""
+
+    def __init__(self, path: str | None = SELECTOR_CACHE):
+        self.path  = Path(path) if path and path.lower() != "off" else None
+        self.state = self._load()
+        self.stats = {"hits": 0, "misses": 0, "coord_hits": 0, "coord_misses": 0}
+
+    # ── Persistencia ─────────────────────────────────────────────────────────
+    def _load(self) -> dict:
+        if self.path is None:
+            return {}
+        try:
+            state = json.loads(self.path.read_text(encoding="utf-8"))
+            return state if isinstance(state.get("ops"), dict) else {}
+        except FileNotFoundError:
+            return {}
+        except (OSError, ValueError, AttributeError) as e:
+            logger.warning(f"⚠️ Selectores aprendidos ilegibles ({e}); se re-aprenderán.")
+            return {}
+
+    def _save(self):
+        if self.path is None:
+            return
+        try:
+            tmp = self.path.with_suffix(self.path.suffix + ".tmp")
+            tmp.write_text(json.dumps(self.state, ensure_ascii=False, indent=1), encoding="utf-8")
+            os.replace(tmp, self.path)
+        except OSError as e:
+            logger.warning(f"No se pudieron guardar los selectores aprendidos: {e}")
+
+    def bind_layout(self, fingerprint: str):
+        """Fija la huella del layout actual; si cambió, descarta lo aprendido."""
+        known = self.state.get("fingerprint")
+        if known == fingerprint:
+            return
+        if known is None:
+            # Lo aprendido antes del primer render (cookies) pasa a este layout
+            self.state = {"fingerprint": fingerprint, "ops": self.state.get("ops", {}),
+                          "coords": self.state.get("coords", {})}
+            self._save()
+            return
+        if self.state.get("ops"):
+            logger.info(f"🧭 Layout del reporte cambió; {len(self.state['ops'])} selectores aprendidos descartados")
+        self.state = {"fingerprint": fingerprint, "ops": {}, "coords": {}}
+        self._save()
+
+    # ── Consulta y aprendizaje ───────────────────────────────────────────────
+    def get(self, op: str) -> dict | None:
+        return self.state.get("ops", {}).get(op)
+
+    def order(self, op: str, candidates: list[str]) -> list[str]:
+        """`candidates` con el selector aprendido para `op` al frente."""
+        learned = (self.get(op) or {}).get("selector")
+        if learned in candidates:
+            return [learned] + [c for c in candidates if c != learned]
+        return list(candidates)
+
+    def frame_order(self, op: str, frames: list, all_frames: list | None = None) -> list:
+        """
+        `frames` con el frame aprendido para `op` al frente. El frame se guarda
+        por su índice en `all_frames` (page.frames; por defecto `frames`).
+        """
+        all_frames = frames if all_frames is None else all_frames
+        i = (self.get(op) or {}).get("frame")
+        if isinstance(i, int) and 0 <= i < len(all_frames) and all_frames[i] in frames:
+            learned = all_frames[i]
+            return [learned] + [f for f in frames if f is not learned]
+        return list(frames)
+
+    def remember(self, op: str, selector: str, frame: int | None = None, strategy: str | None = None):
+        """
+        Registra el selector que funcionó. Cuenta acierto si era el aprendido
+        y fallo si no había nada aprendido o lo aprendido era otro.
+        """
+        entry = {"selector": selector, "frame": frame, "strategy": strategy}
+        known = self.get(op)
+        if known == entry:
+            self.stats["hits"] += 1
+            return
+        self.stats["misses"] += 1
+        self.state.setdefault("ops", {})[op] = entry
+        self._save()
+
+    # ── Coordenadas calibradas (slicer_state.py) ─────────────────────────────
+    def coords(self, name: str) -> dict | None:
+        return self.state.get("coords", {}).get(name)
+
+    def set_coords(self, name: str, data: dict):
+        self.state.setdefault("coords", {})[name] = data
+        self._save()
+
+    def drop_coords(self, name: str):
+        if self.state.get("coords", {}).pop(name, None) is not None:
+            self._save()
+
+    def format_summary(self) -> str:
+        s = self.stats
+        return (f"🧭 Selectores aprendidos: {s['hits']} aciertos, {s['misses']} fallos "
+                f"({len(self.state.get('ops', {}))} operaciones conocidas) | coordenadas: "
+                f"{s['coord_hits']} aciertos, {s['coord_misses']} fallos")
+
+
+_cache = None
+
+
+def selector_cache() -> SelectorCache:
+    """Almacén compartido del proceso (se carga una vez)."""
+    global _cache
+    if _cache is None:
+        _cache = SelectorCache()
+    return _cache
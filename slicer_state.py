@@ -0,0 +1,215 @@
+"""
+slicer_state.py — Estado actual de un slicer y aplicación mínima.
+
+Aplicar un slicer desde cero (abrir, borrar, "Seleccionar todo", buscar,
+clickear la opción) cuesta varios segundos y dispara una re-consulta de
+PowerBI aunque el slicer ya muestre el valor pedido. Aquí se lee primero la
+selección actual —el texto de restatement del dropdown ("Mayo", "Todas",
+"Varias selecciones") y los ítems con aria-selected / aria-checked— y:
+
+    1. si ya coincide con la opción pedida, no se toca nada;
+    2. si no, se intenta el cambio mínimo: abrir, clickear solo la opción
+       (en PowerBI un click sin Ctrl reemplaza la selección) y cerrar;
+    3. si después de eso no coincide, el script sigue con la secuencia
+       completa (`select` con borrar / "Seleccionar todo" / buscador).
+
+Tras la primera aplicación exitosa, `calibrate` mide una vez por layout las
+posiciones del header y de cada opción del dropdown (en coordenadas de la
+página, para el viewport actual) y las guarda en selector_cache. Las
+corridas siguientes clickean por coordenadas —sin resolver locators— y
+verifican la selección con una lectura barata; si no coincide, se descarta
+la calibración de ese slicer y se sigue con los pasos de arriba.
+
+Lecturas y clicks pasan por el ayudante JS de pbi_runtime.py: un round trip
+por operación.
+"""
+
+import logging
+import re
+
+import pbi_runtime
+from powerbi_wait import settle
+from selector_cache import selector_cache
+import timing
+
+logger = logging.getLogger(__name__)
+
+ALL_RE = re.compile(r"^(todos?|todas?|all|seleccionar todo|select all)$", re.IGNORECASE)
+OPEN_MS = 200   # lo que tarda en aparecer el popup del dropdown tras el click al header
+# Variantes del borrador; selector_cache.py pone primero la que funcionó la última vez
+CLEAR_SELECTORS = [".clear-filter", "i[title*='Borrar']", "i[title*='Clear']", ".slicer-clear"]
+
+
+def _norm(value: str | None) -> str:
+    return re.sub(r"\s+", " ", (value or "").replace("\xa0", " ")).strip().upper()
+
+
+class SlicerState:
+    """Selección leída de un slicer: texto de restatement e ítems marcados."""
+
+    def __init__(self, restatement: str | None, selected: list[str]):
+        self.restatement = restatement
+        self.selected    = selected
+
+    @property
+    def values(self) -> list[str] | None:
+        """Valores seleccionados; [] = todo/nada; None = no se pudo saber (p. ej. 'Varias selecciones')."""
+        if self.selected:
+            return [s for s in self.selected if not ALL_RE.match(s.strip())]
+        text = (self.restatement or "").strip()
+        if not text or ALL_RE.match(text):
+            return []
+        if re.search(r"varias|multiple", text, re.IGNORECASE):
+            return None
+        return [t.strip() for t in text.split(",") if t.strip()]
+
+    def matches(self, option: str) -> bool:
+        """True si la selección es exactamente `option` (comparación laxa, como el resto del script)."""
+        values = self.values
+        return bool(values) and len(values) == 1 and _norm(option) in _norm(values[0])
+
+    def __repr__(self):
+        return f"SlicerState({self.restatement!r}, selected={self.selected})"
+
+
+async def read_state(slicer) -> SlicerState | None:
+    """Lee la selección del slicer indexado (visual_index.Visual), o None."""
+    try:
+        st = await pbi_runtime.call(slicer.frame, "readSelection", f"key:{slicer.key}", timeout=3.0)
+    except Exception as e:
+        logger.debug(f"No se pudo leer el estado de {slicer}: {e}")
+        return None
+    return SlicerState(st["restatement"], st["selected"]) if st else None
+
+
+async def already_applied(slicer, option: str) -> bool:
+    state = await read_state(slicer)
+    if state is not None and state.matches(option):
+        logger.info(f"✔️ Slicer '{slicer.title}' ya está en '{option}'; sin clicks")
+        return True
+    return False
+
+
+async def select(page, slicer, option: str, **opts) -> dict | None:
+    """
+    `selectOnly` del ayudante JS (un round trip) y una sola espera al final.
+    Devuelve el resultado estructurado, o None si el frame no respondió.
+    """
+    try:
+        result = await pbi_runtime.call(slicer.frame, "selectOnly", f"key:{slicer.key}", option, opts)
+    except Exception as e:
+        logger.debug(f"selectOnly en {slicer} falló: {e}")
+        return None
+    if result and (result.get("clicked") or result.get("cleared")):
+        await settle(page)
+    return result
+
+
+async def apply_minimal(page, slicer, option: str) -> bool:
+    """
+    Abre el dropdown, clickea solo `option` y lo cierra. Devuelve True si al
+    final la selección coincide; False deja el slicer para la secuencia completa.
+    """
+    if not await select(page, slicer, option, search=False):
+        return False
+    state = await read_state(slicer)
+    ok = state is not None and state.matches(option)
+    if ok:
+        logger.info(f"✔️ Slicer '{slicer.title}' → '{option}' con un solo click")
+    return ok
+
+
+async def apply_full(page, slicer, option: str, deselect_all: bool = True) -> bool:
+    """Secuencia completa en un round trip: borrar, "Seleccionar todo", buscador, opción."""
+    cache = selector_cache()
+    result = await select(page, slicer, option, clear=cache.order("slicer_clear", CLEAR_SELECTORS),
+                          deselectAll=deselect_all)
+    if not result:
+        return False
+    if result.get("cleared"):
+        cache.remember("slicer_clear", result["cleared"], strategy="runtime")
+    logger.info(f"Slicer '{slicer.title}' → '{option}': {', '.join(result['steps']) or 'sin pasos'}")
+    return bool(result.get("ok"))
+
+
+# ── Camino rápido por coordenadas calibradas ─────────────────────────────────
+async def _frame_offset(frame) -> tuple[float, float]:
+    """Esquina del iframe en la página (bounding_box ya es relativo al viewport principal)."""
+    if frame.parent_frame is None:
+        return 0.0, 0.0
+    box = await (await frame.frame_element()).bounding_box()
+    return (box["x"], box["y"]) if box else (0.0, 0.0)
+
+
+async def calibrate(page, slicer) -> bool:
+    """Mide header y opciones del dropdown y los guarda para este layout y viewport."""
+    try:
+        m = await pbi_runtime.call(slicer.frame, "measure", f"key:{slicer.key}")
+        ox, oy = await _frame_offset(slicer.frame)
+    except Exception as e:
+        logger.debug(f"No se pudo calibrar {slicer}: {e}")
+        return False
+    if not m or not m["items"]:
+        return False
+
+    def shift(xy):
+        return [round(xy[0] + ox, 1), round(xy[1] + oy, 1)]
+
+    options = {_norm(it["text"]): shift(it["at"]) for it in m["items"] if it["text"]}
+    selector_cache().set_coords(slicer.title, {
+        "viewport": page.viewport_size, "header": shift(m["header"]), "options": options,
+    })
+    logger.info(f"📐 Slicer '{slicer.title}' calibrado: header {shift(m['header'])}, {len(options)} opciones")
+    return True
+
+
+async def apply_by_coords(page, slicer, option: str) -> bool:
+    """Click al header, a la opción y de nuevo al header por coordenadas; verifica la selección."""
+    cache = selector_cache()
+    cal = cache.coords(slicer.title)
+    if not cal or cal.get("viewport") != page.viewport_size:
+        return False
+    target = _norm(option)
+    at = cal["options"].get(target) or next(
+        (xy for text, xy in cal["options"].items() if target in text and not ALL_RE.match(text)), None)
+    if at is None:
+        return False
+    try:
+        await page.mouse.click(*cal["header"])
+        await page.wait_for_timeout(OPEN_MS)
+        await page.mouse.click(*at)
+        await page.mouse.click(*cal["header"])
+        await settle(page)
+    except Exception as e:
+        logger.debug(f"Click por coordenadas en {slicer} falló: {e}")
+    state = await read_state(slicer)
+    if state is not None and state.matches(option):
+        cache.stats["coord_hits"] += 1
+        logger.info(f"✔️ Slicer '{slicer.title}' → '{option}' por coordenadas")
+        return True
+    cache.stats["coord_misses"] += 1
+    cache.drop_coords(slicer.title)
+    logger.warning(f"⚠️ Coordenadas de '{slicer.title}' no verificaron ({state}); se recalibrará")
+    return False
+
+
+async def apply_option(page, slicer, option: str, deselect_all: bool = True) -> bool:
+    """
+    Deja el slicer en `option` por el camino más barato que funcione: nada si
+    ya está, coordenadas calibradas, cambio mínimo y secuencia completa.
+    """
+    if await already_applied(slicer, option):
+        timing.tag(strategy="already")
+        return True
+    if await apply_by_coords(page, slicer, option):
+        timing.tag(strategy="coords")
+        return True
+    if await apply_minimal(page, slicer, option):
+        timing.tag(strategy="minimal")
+        ok = True
+    else:
+        timing.tag(strategy="full")
+        ok = await apply_full(page, slicer, option, deselect_all)
+    if ok and selector_cache().coords(slicer.title) is None:
+        await calibrate(page, slicer)
+    return ok
@@ -0,0 +1,105 @@
+"""
+table_rows.py — Filas de las tablas del reporte en una sola evaluación por frame.
+
+Recorrer `frame.locator(sel).nth(i).inner_text()` fila por fila cuesta un
+round trip a Playwright por fila, por selector y por frame, y la búsqueda de
+respaldo (solo tienda) repetía todo el barrido. Aquí cada frame devuelve de
+una vez todas las filas candidatas como registros (texto, celdas, caja,
+índice estable); la búsqueda se hace en Python sobre esa lista y solo la
+fila ganadora pide un locator para el click.
+
+El índice estable es un atributo `data-pbi-row` que la evaluación deja en
+cada elemento; cada cosecha usa una generación nueva, así un locator de una
+cosecha vieja no apunta a una fila distinta después de un re-render.
+"""
+
+import asyncio
+import logging
+
+from selector_cache import selector_cache
+
+logger = logging.getLogger(__name__)
+
+# En orden de preferencia; un elemento cuenta una sola vez (con el primer selector que lo tomó)
+ROW_SELECTORS = ["tr", "div[role='row']", "[class*='row']", "[class*='tableRow']"]
+ROW_OP        = "table_row"
+CELL_SELECTOR = "td, th, [role='gridcell'], [role='cell'], [role='rowheader'], [role='columnheader']"
+
+_HARVEST_JS = r"""([selectors, cellSelector]) => {
+    if (!document.body) return [];
+    const gen = (window.__pbiRowGen = (window.__pbiRowGen || 0) + 1);
+    const seen = new Set();
+    const rows = [];
+    selectors.forEach((sel, s) => {
+        for (const el of document.querySelectorAll(sel)) {
+            if (seen.has(el)) continue;
+            seen.add(el);
+            const text = (el.innerText || '').trim();
+            if (!text) continue;
+            const key = `${gen}-${rows.length}`;
+            el.setAttribute('data-pbi-row', key);
+            const r = el.getBoundingClientRect();
+            rows.push({
+                key, selector: s, text,
+                cells: [...el.querySelectorAll(cellSelector)].map(c => (c.innerText || '').trim()),
+                box: [Math.round(r.x), Math.round(r.y), Math.round(r.width), Math.round(r.height)],
+            });
+        }
+    });
+    return rows;
+}"""
+
+
+class Row:
+    """Fila cosechada de un frame; `locator()` la recupera para hacer click."""
+
+    __slots__ = ("frame", "key", "selector", "text", "cells", "box")
+
+    def __init__(self, frame, record: dict, selectors: list[str]):
+        self.frame    = frame
+        self.key      = record["key"]
+        self.selector = selectors[record["selector"]]
+        self.text     = record["text"]
+        self.cells    = record["cells"]
+        self.box      = tuple(record["box"])
+
+    def locator(self):
+        return self.frame.locator(f"[data-pbi-row='{self.key}']")
+
+    async def click(self, **kwargs):
+        # Si la fila se re-renderizó desde la cosecha, falla rápido en vez de esperar 30 s
+        kwargs.setdefault("timeout", 5000)
+        await self.locator().click(**kwargs)
+
+    def __repr__(self):
+        return f"Row({self.selector}, {self.text[:60]!r})"
+
+
+async def _harvest_frame(frame, selectors: list[str], timeout: float) -> list[Row]:
+    try:
+        records = await asyncio.wait_for(
+            frame.evaluate(_HARVEST_JS, [selectors, CELL_SELECTOR]), timeout=timeout)
+    except Exception as e:
+        logger.debug(f"Sin filas en frame {frame.url[:60]}: {e}")
+        return []
+    return [Row(frame, r, selectors) for r in records]
+
+
+async def harvest_rows(page, frames: list | None = None, timeout: float = 8.0) -> list[Row]:
+    """
+    Todas las filas candidatas de `frames` (por defecto todos los de la
+    página), evaluados en paralelo. El frame y el selector que dieron la
+    fila ganadora en corridas anteriores (ver `remember_row`) van primero.
+    """
+    cache = selector_cache()
+    frames = cache.frame_order(ROW_OP, page.frames if frames is None else frames, page.frames)
+    selectors = cache.order(ROW_OP, ROW_SELECTORS)
+    per_frame = await asyncio.gather(*(_harvest_frame(f, selectors, timeout) for f in frames))
+    return [row for rows in per_frame for row in rows]
+
+
+def remember_row(page, row: Row):
+    """Aprende el selector y el frame de la fila que dio la nota."""
+    frames = page.frames
+    index = frames.index(row.frame) if row.frame in frames else None
+    selector_cache().remember(ROW_OP, row.selector, index, "harvest")
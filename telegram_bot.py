@@ -1,16 +1,18 @@
 import asyncio
 import logging
 import os
-import re
 import threading
 from datetime import datetime
 from http.server import BaseHTTPRequestHandler, HTTPServer
-from pathlib import Path
 
-from playwright.async_api import async_playwright
 from telegram import Update
 from telegram.ext import Application, CommandHandler, ContextTypes
 
+import timing
+from extraction_core import URL, Report, extract, make_pool
+from query_replay import ReplayEngine
+from page_workers import PARALLEL_PAGES
+
 # ─── Logging ──────────────────────────────────────────────────────────────────
 logging.basicConfig(
     format="%(asctime)s [%(levelname)s] %(message)s",
@@ -19,44 +21,16 @@ logging.basicConfig(
 logger = logging.getLogger(__name__)
 
 # ─── Config ───────────────────────────────────────────────────────────────────
+# URL, tiendas, supervisores y backend de extracción: extraction_core.py
 TOKEN   = os.getenv("TELEGRAM_TOKEN", "8759492692:AAHwjW2Lho1wynrFLpct_FxAO4bVFapK3nM")
-URL     = ("https://app.powerbi.com/view?r=eyJrIjoiZWQ1YWNiYjctNWNiNC00MTNlLThjOG"
-           "EtNjE1NDc2NTI4NWU2IiwidCI6ImE4MzE3NzZjLWM0ZTUtNDNhMC04ZmZhLTFkNjIxZW"
-           "NlZDAzNiIsImMiOjl9")
 
-TIENDAS       = ["PORONGOCHE", "MALL PORONGOCHE"]
+POOL_SIZE = int(os.getenv("BROWSER_POOL_SIZE", "1"))
+
 TIENDA_EMOJIS = {"PORONGOCHE": "🏪", "MALL PORONGOCHE": "🏬"}
-MESES_ES      = {
-    1:"Ene", 2:"Feb", 3:"Mar", 4:"Abr", 5:"May", 6:"Jun",
-    7:"Jul", 8:"Ago", 9:"Set", 10:"Oct", 11:"Nov", 12:"Dic",
-}
 
 CHAT_ID     = None
 LAST_RECORD = None
 
-
-def normalize_text(value: str) -> str:
-    """Normaliza espacios y mayúsculas para comparar texto del DOM."""
-    if value is None:
-        return ""
-    value = value.replace("\xa0", " ")
-    return re.sub(r"\s+", " ", value).strip().upper()
-
-
-def parse_score_from_row(row_text: str) -> str | None:
-    """Extrae el primer porcentaje válido encontrado en una fila de tabla."""
-    matches = re.findall(r"(\d{1,3})\s*%", row_text)
-    valid = [int(x) for x in matches if 0 < int(x) <= 100]
-    if valid:
-        return f"{valid[0]}%"
-
-    matches_dec = re.findall(r"(\d{1,3})[.,]\d+", row_text)
-    valid_dec = [int(x) for x in matches_dec if 0 < int(x) <= 100]
-    if valid_dec:
-        return f"{valid_dec[0]}%"
-
-    return None
-
 # ─── Servidor web dummy (Render plan gratis necesita un puerto abierto) ───────
 class DummyHandler(BaseHTTPRequestHandler):
     def do_GET(self):
@@ -70,425 +44,17 @@ def run_dummy_server():
     port = int(os.environ.get("PORT", 10000))
     HTTPServer(("0.0.0.0", port), DummyHandler).serve_forever()
 
-# ─── Utilidades Playwright ────────────────────────────────────────────────────
-async def page_text(page) -> str:
-    JS = """() => {
-        const walker = document.createTreeWalker(
-            document.body, NodeFilter.SHOW_TEXT, null
-        );
-        const parts = [];
-        let node;
-        while ((node = walker.nextNode())) {
-            const t = node.textContent.trim();
-            if (t) parts.push(t);
-        }
-        return parts.join('\\n');
-    }"""
-    txt = ""
-    for f in page.frames:
-        try:
-            result = await asyncio.wait_for(f.evaluate(JS), timeout=12.0)
-            txt += result + "\n"
-        except asyncio.TimeoutError:
-            logger.warning("page_text: frame timeout (12s), continuando...")
-            try:
-                txt += await f.inner_text("body", timeout=5000) + "\n"
-            except Exception:
-                pass
-        except Exception:
-            try:
-                txt += await f.inner_text("body", timeout=5000) + "\n"
-            except Exception:
-                pass
-    return txt
-
-async def click_slicer_option(page, label: str, option: str) -> bool:
-    """Abre el dropdown del slicer 'label' y selecciona 'option'."""
-    for frame in page.frames:
-        try:
-            headers = frame.locator("h3.slicer-header-text").filter(has_text=label)
-            if await headers.count() == 0:
-                continue
-            container = headers.first.locator(
-                "xpath=ancestor::div[contains(@class,'slicer-container')]"
-            ).first
-            box = container.locator(".slicer-restatement")
-
-            # Abrir dropdown
-            if await box.count() > 0:
-                await box.first.click(force=True)
-            else:
-                await container.click(force=True)
-            await page.wait_for_timeout(1200)
-
-            # Limpiar selección actual si existe botón borrar
-            clear = container.locator(
-                ".clear-filter, i[title*='Borrar'], i[title*='Clear'], .slicer-clear"
-            )
-            if await clear.count() > 0 and await clear.first.is_visible():
-                await clear.first.click(force=True)
-                await page.wait_for_timeout(800)
-
-            # Hacer "Seleccionar todo" primero para deseleccionar todo (toggle)
-            for select_all_text in ["Seleccionar todo", "Select all"]:
-                items = frame.locator(".slicerItemContainer")
-                cnt = await items.count()
-                for i in range(cnt):
-                    try:
-                        rt = await items.nth(i).inner_text(timeout=400)
-                        if select_all_text.lower() in rt.lower():
-                            await items.nth(i).click(force=True)
-                            await page.wait_for_timeout(800)
-                            break
-                    except Exception:
-                        continue
-
-            # Escribir en buscador
-            search = container.locator("input.searchInput")
-            if await search.count() > 0:
-                await search.first.fill(option)
-                await page.wait_for_timeout(800)
-
-            # Seleccionar la opción
-            items = frame.locator(".slicerItemContainer")
-            cnt = await items.count()
-            for i in range(cnt):
-                try:
-                    rt = await items.nth(i).inner_text(timeout=400)
-                    rt_norm = normalize_text(rt)
-                    option_norm = normalize_text(option)
-                    if (
-                        option_norm in rt_norm
-                        and "SELECCIONAR TODO" not in rt_norm
-                        and "SELECT ALL" not in rt_norm
-                    ):
-                        await items.nth(i).click(force=True)
-                        await page.wait_for_timeout(1000)
-                        
-                        # Cerrar slicer haciendo click fuera
-                        try:
-                            await page.mouse.click(10, 10)
-                            await page.wait_for_timeout(500)
-                        except Exception:
-                            pass
-                        return True
-                except Exception:
-                    pass
-        except Exception as e:
-            logger.warning(f"Error procesando frame para slicer '{label}': {e}")
-            pass
-    
-    logger.warning(f"Slicer '{label}' → '{option}' ❌ no encontrado")
-    return False
-
-async def click_store_filter(page, tienda: str) -> bool:
-    """Busca un visual que contenga el nombre de la tienda (y que no sea una tabla de detalles)
-    y hace click en él para filtrar el dashboard."""
-    tienda_norm = normalize_text(tienda)
-    tienda_regex = re.escape(tienda).replace(r"\ ", r"\s+")
-    tienda_pattern = re.compile(rf"\b{tienda_regex}\b", re.IGNORECASE)
-    for frame in page.frames:
-        try:
-            visuals = frame.locator(".visual-container-modern, visual-container-modern")
-            cnt = await visuals.count()
-            for i in range(cnt):
-                try:
-                    v = visuals.nth(i)
-                    v_text = await v.inner_text(timeout=400)
-                    if not v_text:
-                        continue
-
-                    v_text_norm = normalize_text(v_text)
-                    if tienda_norm not in v_text_norm:
-                        continue
-
-                    v_text_lower = v_text_norm.lower()
-                    # Evitar la matriz grande de criterios que tiene las preguntas y porcentajes de 100%
-                    if any(k in v_text_lower for k in ['experiencia', 'rapidez', 'frescura', 'calidad', 'apariencia', 'ambiente', '¿', 'pregunta']):
-                        continue
-                    
-                    # Intentar hacer click en el texto usando get_by_text
-                    # Se busca ignorando mayúsculas/minúsculas implícitamente
-                    targets = v.get_by_text(tienda_pattern)
-                    t_cnt = await targets.count()
-                    for j in range(t_cnt):
-                        el = targets.nth(j)
-                        if await el.is_visible():
-                            await el.click(force=True)
-                            logger.info(f"Click en '{tienda}' realizado en visual válido.")
-                            return True
-                    await v.click(force=True)
-                    logger.info(f"Click de respaldo en visual para '{tienda}'.")
-                    return True
-                except Exception:
-                    continue
-        except Exception as e:
-            pass
-    return False
-
-
-async def extract_success_rate_from_visual(page) -> str | None:
-    """Lee el porcentaje solamente desde el visual de Success Rate."""
-    for frame in page.frames:
-        try:
-            visuals = frame.locator(".visual-container-modern, visual-container-modern")
-            count = await visuals.count()
-            for i in range(count):
-                try:
-                    visual = visuals.nth(i)
-                    text = await visual.inner_text(timeout=700)
-                    text_norm = normalize_text(text)
-                    if "SUCCESS RATE" not in text_norm and "SUCESS RATE" not in text_norm:
-                        continue
-
-                    matches = re.findall(r"(\d{1,3})\s*%", text)
-                    valid = [int(x) for x in matches if 0 < int(x) <= 100]
-                    if valid:
-                        score = f"{valid[0]}%"
-                        logger.info(f"Success Rate leído desde visual: {score}")
-                        return score
-                except Exception:
-                    continue
-        except Exception:
-            continue
-    return None
-
-
-async def find_score_in_table(page, tienda: str, visita: str) -> str | None:
-    """Busca la nota en la tabla usando la visita activa y la tienda objetivo."""
-    tienda_norm = normalize_text(tienda)
-    visita_norm = normalize_text(visita)
-    row_selectors = ["tr", "div[role='row']", "[class*='row']", "[class*='tableRow']"]
-
-    async def try_get_score_from_row(row, label: str) -> str | None:
-        try:
-            row_text = await row.inner_text(timeout=1000)
-            score = parse_score_from_row(row_text)
-            if score:
-                logger.info(f"Score encontrado en fila {label}: {score}")
-                return score
-
-            logger.info(f"Fila {label} sin % directo; intentando leer visual de Success Rate...")
-            await row.click(force=True)
-            await page.wait_for_timeout(2500)
-
-            score = await extract_success_rate_from_visual(page)
-            if score:
-                logger.info(f"Score leído tras click en fila {label}: {score}")
-                return score
-
-            page_txt = await page_text(page)
-            return parse_success_rate(page_txt)
-        except Exception as e:
-            logger.warning(f"Error procesando fila {label}: {e}")
-            return None
-
-    for frame in page.frames:
-        for selector in row_selectors:
-            try:
-                rows = frame.locator(selector)
-                count = await rows.count()
-                for i in range(count):
-                    row = rows.nth(i)
-                    try:
-                        row_text = await row.inner_text(timeout=800)
-                        row_norm = normalize_text(row_text)
-                        if tienda_norm in row_norm and visita_norm in row_norm:
-                            score = await try_get_score_from_row(row, f"{tienda}/{visita}")
-                            if score:
-                                return score
-                    except Exception:
-                        continue
-            except Exception:
-                continue
-
-    logger.info(f"No encontré fila exacta para {tienda} + {visita}; probando solo tienda.")
-    for frame in page.frames:
-        for selector in row_selectors:
-            try:
-                rows = frame.locator(selector)
-                count = await rows.count()
-                for i in range(count):
-                    row = rows.nth(i)
-                    try:
-                        row_text = await row.inner_text(timeout=800)
-                        row_norm = normalize_text(row_text)
-                        if tienda_norm in row_norm and re.search(r"\d", row_text):
-                            score = await try_get_score_from_row(row, f"{tienda} (slicer)")
-                            if score:
-                                return score
-                    except Exception:
-                        continue
-            except Exception:
-                continue
-
-    logger.warning(f"Sin score en tabla para {tienda} / {visita}")
-    return None
-
-
-def parse_success_rate(text: str, tienda: str = None):
-    """Extrae el porcentaje del donut 'Success Rate' o de la vista general."""
-    lines = [line.strip() for line in text.split("\n") if line.strip()]
-    normalized = " ".join(lines)
-
-    # Buscar "Success Rate" del donut
-    sr_idx = None
-    for i, line in enumerate(lines):
-        if re.search(r"Suce?ss\s*Rate", line, re.IGNORECASE):
-            sr_idx = i
-            logger.info(f"🔍 'Success Rate' encontrado en línea {i}")
-            break
-
-    if sr_idx is not None:
-        after = lines[sr_idx + 1: sr_idx + 15]
-        for j, aline in enumerate(after):
-            if any(kw in aline.lower() for kw in ['top places', 'time line', 'controllers', 'criterio', 'barra de datos']):
-                continue
-            m = re.fullmatch(r"(\d{1,3})\s*%", aline)
-            if m:
-                val = int(m.group(1))
-                if 0 < val <= 100:
-                    logger.info(f"✅ parse_success_rate → {val}% (donut, DESPUÉS de SR)")
-                    return str(val) + "%"
-            if re.fullmatch(r"\d{1,3}", aline) and j + 1 < len(after):
-                if re.fullmatch(r"%", after[j + 1]):
-                    val = int(aline)
-                    if 0 < val <= 100:
-                        logger.info(f"✅ parse_success_rate → {val}% (donut SVG, DESPUÉS de SR)")
-                        return str(val) + "%"
-
-    logger.warning("❌ No se encontró Success Rate válido en el DOM.")
-    return None
-
-# ─── Extracción principal ─────────────────────────────────────────────────────
-async def extract_full_report() -> dict:
-    now = datetime.utcnow()
-    # Ajustar a hora Perú (UTC-5)
-    mes_idx = now.month if (now.hour - 5) >= 0 else (now.month - 1 or 12)
-    mes_actual = MESES_ES[mes_idx]
-    logger.info(f"Mes inicial: {mes_actual}")
-
-    result = {
-        "record_update": None,
-        "mes": mes_actual,
-        "tiendas": {t: {} for t in TIENDAS},
-    }
-
-    async with async_playwright() as p:
-        browser = await p.chromium.launch(
-            args=["--no-sandbox", "--disable-setuid-sandbox", "--disable-dev-shm-usage"],
-            headless=True,
-        )
-        ctx = await browser.new_context(
-            user_agent=(
-                "Mozilla/5.0 (Windows NT 10.0; Win64; x64) "
-                "AppleWebKit/537.36 (KHTML, like Gecko) Chrome/122.0.0.0 Safari/537.36"
-            ),
-            viewport={"width": 1920, "height": 1080},
-            locale="es-PE",
-        )
-        page = await ctx.new_page()
-
-        # ── Cargar página ────────────────────────────────────────────────────
-        logger.info("⏳ Cargando PowerBI (máx 60s)...")
-        try:
-            await page.goto(URL, wait_until="domcontentloaded", timeout=60000)
-        except Exception as e:
-            logger.warning(f"⚠️ Timeout en carga: {e}, continuando...")
-
-        # Aceptar cookies si aparecen
-        for sel in ["button:has-text('Accept')", "button:has-text('Aceptar')", "button:has-text('OK')"]:
-            try:
-                b = page.locator(sel).first
-                if await b.is_visible(timeout=1000):
-                    await b.click()
-                    await page.wait_for_timeout(500)
-            except Exception:
-                pass
-
-        logger.info("⏳ Esperando render (8s)...")
-        await page.wait_for_timeout(8000)
-
-        # ── RecordUpdate ─────────────────────────────────────────────────────
-        raw = await page_text(page)
-        norm_ru = re.sub(r"RecordUpdat\s*e", "RecordUpdate", raw, flags=re.IGNORECASE)
-        m = re.search(
-            r"RecordUpdate\s*([\d]{1,2}\s*-\s*([A-Za-z]{3})\s*[\d]{1,2}\s*:\s*[\d]{2})",
-            norm_ru, re.IGNORECASE,
-        )
-        if not m:
-            m = re.search(
-                r"([\d]{1,2}\s*-\s*([A-Za-z]{3})\s*[\d]{1,2}\s*:\s*[\d]{2})",
-                norm_ru, re.IGNORECASE,
-            )
-        if m:
-            result["record_update"] = m.group(1).strip()
-            mes_actual = m.group(2).strip().capitalize()
-            result["mes"] = mes_actual
-            logger.info(f"RecordUpdate: {result['record_update']}  |  Mes: {mes_actual}")
-        else:
-            logger.warning("No se encontró RecordUpdate")
-
-        # ── Filtros globales ─────────────────────────────────────────────────
-        logger.info(f"Aplicando filtro Mes = {mes_actual}")
-        await click_slicer_option(page, "Mes", mes_actual)
-        await page.wait_for_timeout(1500)
-
-        logger.info("Aplicando filtro Supervisor = YOHN")
-        await click_slicer_option(page, "Supervisor", "YOHN")
-        await page.wait_for_timeout(1500)
-
-        # ── Extraer scores por visita / tienda ───────────────────────────────
-        for visita in ["Visita 1", "Visita 2"]:
-            logger.info(f"\n{'='*40}\nProcesando {visita}")
-            await click_slicer_option(page, "Nro. Visita", visita)
-            await page.wait_for_timeout(3500)
-            
-            for tienda in TIENDAS:
-                logger.info(f"  Buscando score de {tienda} en tabla...")
-                score = "Sin visita"
-                
-                try:
-                    parsed = await find_score_in_table(page, tienda, visita)
-                    if parsed:
-                        
-                        if parsed:
-                            score = parsed
-                            logger.info(f"  ✅ {tienda} | {visita} = {score}")
-                        else:
-                            logger.warning(f"  ⚠️ No se encontró score para {tienda} | {visita}")
-                        
-                        # Limpiar filtro de tienda haciendo click en un espacio en blanco para deseleccionar
-                        try:
-                            await page.mouse.click(960, 30)
-                            await page.wait_for_timeout(1000)
-                        except Exception:
-                            pass
-                    else:
-                        logger.warning(f"  ⚠️ No se pudo hacer click para filtrar: {tienda}")
-                        
-                except Exception as e:
-                    logger.error(f"  ❌ Error en {tienda}: {e}", exc_info=True)
-
-                result["tiendas"][tienda][visita] = score
-                logger.info(f"  RESULTADO {tienda} | {visita}: {score}")
-
-        await ctx.close()
-        await browser.close()
-
-    return result
-
 # ─── Formateo de mensaje ──────────────────────────────────────────────────────
-def format_report_message(report: dict) -> str:
+def format_report_message(report: Report) -> str:
     year = datetime.now().year
-    mes    = report.get("mes", "?")
-    record = report.get("record_update", "?")
+    mes    = report.mes or "?"
+    record = report.record_update or "?"
     lines  = [
         f"✅ *Consulta Manual — {mes} {year}*",
         f"🕐 RecordUpdate: `{record}`",
         "",
     ]
-    for tienda, visitas in report.get("tiendas", {}).items():
+    for tienda, visitas in (report.tiendas or {}).items():
         emoji = TIENDA_EMOJIS.get(tienda, "🏪")
         lines.append(f"{emoji} *{tienda}*")
         if visitas:
@@ -500,46 +66,35 @@ def format_report_message(report: dict) -> str:
     lines.append(f"[Ver PowerBI]({URL})")
     return "\n".join(lines)
 
-# ─── Extracción solo RecordUpdate (para el check_job) ────────────────────────
-async def extract_record_update():
-    try:
-        async with async_playwright() as p:
-            browser = await p.chromium.launch(
-                args=["--no-sandbox", "--disable-setuid-sandbox", "--disable-dev-shm-usage"],
-                headless=True,
-            )
-            page = await browser.new_page()
-            await page.goto(URL, wait_until="networkidle", timeout=60000)
-            await page.wait_for_timeout(15000)
-            raw = await page_text(page)
-            await browser.close()
-            norm = re.sub(r"RecordUpdat\s*e", "RecordUpdate", raw, flags=re.IGNORECASE)
-            m = re.search(
-                r"RecordUpdate\s*([\d]{1,2}\s*-\s*[A-Za-z]{3}\s*\d{1,2}\s*:\s*\d{2})",
-                norm, re.IGNORECASE,
-            )
-            return m.group(1).strip() if m else None
-    except Exception as e:
-        logger.error(f"extract_record_update: {e}")
-        return None
-
 # ─── Handlers Telegram ────────────────────────────────────────────────────────
+async def extract_serialized(context: ContextTypes.DEFAULT_TYPE, **kwargs):
+    """Una extracción a la vez: check_job y /reporte comparten las páginas del pool."""
+    async with context.bot_data["extract_lock"]:
+        return await extract(context.bot_data["browser_pool"], context.bot_data.get("replay"), **kwargs)
+
 async def check_job(context: ContextTypes.DEFAULT_TYPE):
     global LAST_RECORD, CHAT_ID
     if not CHAT_ID:
         return
-    current = await extract_record_update()
-    if current and current != LAST_RECORD:
-        LAST_RECORD = current
-        report = await extract_full_report()
-        report["record_update"] = current
-        await context.bot.send_message(
-            chat_id=CHAT_ID,
-            text=format_report_message(report),
-            parse_mode="Markdown",
-        )
-    else:
-        logger.info(f"check_job: sin cambios ({current})")
+    with timing.trace("check_job") as run:
+        try:
+            report = await extract_serialized(context, last=LAST_RECORD)
+            if report is None or not report.extracted:
+                run.tag(outcome="unchanged" if report else "no_record")
+                logger.info(f"check_job: sin cambios ({report and report.record_update})")
+                return
+            LAST_RECORD = report.record_update
+            run.tag(outcome="changed", backend=report.backend)
+        except Exception as e:
+            run.tag(outcome="error", error=type(e).__name__)
+            logger.error(f"check_job: {e}", exc_info=True)
+            return
+        with timing.span("telegram"):
+            await context.bot.send_message(
+                chat_id=CHAT_ID,
+                text=format_report_message(report),
+                parse_mode="Markdown",
+            )
 
 async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     global CHAT_ID
@@ -559,25 +114,32 @@ async def start_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
 
 async def report_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
     await update.message.reply_text("🔍 Consultando PowerBI... (máx 3 minutos, por favor espera).")
-    try:
-        # Timeout de 3 minutos para toda la operación
-        report = await asyncio.wait_for(extract_full_report(), timeout=180)
-        if report.get("record_update"):
-            await update.message.reply_text(format_report_message(report), parse_mode="Markdown")
-        else:
+    # Los tiempos por fase del /reporte quedan en timing.jsonl (ver timing.py)
+    with timing.trace("reporte") as run:
+        try:
+            # Timeout de 3 minutos para toda la operación
+            report = await asyncio.wait_for(extract_serialized(context, force=True), timeout=180)
+            if report:
+                run.tag(outcome="ok", backend=report.backend)
+                with timing.span("telegram"):
+                    await update.message.reply_text(format_report_message(report), parse_mode="Markdown")
+            else:
+                run.tag(outcome="no_record")
+                await update.message.reply_text(
+                    "⚠️ No pude leer el RecordUpdate. El dashboard puede estar cargando lento.\n"
+                    "Intenta de nuevo en 1 minuto."
+                )
+        except asyncio.TimeoutError:
+            run.tag(outcome="timeout")
+            logger.error("report_command: Timeout después de 3 minutos")
             await update.message.reply_text(
-                "⚠️ No pude leer el RecordUpdate. El dashboard puede estar cargando lento.\n"
+                "⏱️ Timeout: PowerBI tardó demasiado en cargar.\n"
                 "Intenta de nuevo en 1 minuto."
             )
-    except asyncio.TimeoutError:
-        logger.error("report_command: Timeout después de 3 minutos")
-        await update.message.reply_text(
-            "⏱️ Timeout: PowerBI tardó demasiado en cargar.\n"
-            "Intenta de nuevo en 1 minuto."
-        )
-    except Exception as e:
-        logger.error(f"report_command error: {e}", exc_info=True)
-        await update.message.reply_text(f"❌ Error interno:\n`{e}`", parse_mode="Markdown")
+        except Exception as e:
+            run.tag(outcome="error", error=type(e).__name__)
+            logger.error(f"report_command error: {e}", exc_info=True)
+            await update.message.reply_text(f"❌ Error interno:\n`{e}`", parse_mode="Markdown")
 
 async def set_interval(update: Update, context: ContextTypes.DEFAULT_TYPE):
     try:
@@ -632,6 +194,28 @@ async def tienda_command(update: Update, context: ContextTypes.DEFAULT_TYPE):
         parse_mode="Markdown"
     )
 
+# ─── Ciclo de vida del pool de Chromium ──────────────────────────────────────
+async def on_startup(app: Application):
+    """Crea el pool de Chromium del bot y lo deja caliente antes del primer uso."""
+    # Una página por visita en paralelo necesita al menos ese tamaño de pool
+    pool = make_pool(max(POOL_SIZE, PARALLEL_PAGES))
+    app.bot_data["browser_pool"] = pool
+    app.bot_data["replay"] = ReplayEngine.from_env()
+    app.bot_data["extract_lock"] = asyncio.Lock()
+    try:
+        await pool.start()
+    except Exception as e:
+        # Se reintentará el lanzamiento en la primera extracción
+        logger.error(f"No se pudo lanzar Chromium al iniciar: {e}")
+
+async def on_shutdown(app: Application):
+    pool = app.bot_data.get("browser_pool")
+    if pool:
+        await pool.close()
+    replay = app.bot_data.get("replay")
+    if replay:
+        replay.close()
+
 # ─── Main ─────────────────────────────────────────────────────────────────────
 def main():
     if not TOKEN:
@@ -640,7 +224,13 @@ def main():
     threading.Thread(target=run_dummy_server, daemon=True).start()
     logger.info("Servidor web dummy iniciado.")
 
-    app = Application.builder().token(TOKEN).build()
+    app = (
+        Application.builder()
+        .token(TOKEN)
+        .post_init(on_startup)
+        .post_shutdown(on_shutdown)
+        .build()
+    )
     app.add_handler(CommandHandler("start",     start_command))
     app.add_handler(CommandHandler("reporte",   report_command))
     app.add_handler(CommandHandler("intervalo", set_interval))
@@ -0,0 +1,251 @@
+"""
+timing.py — Spans de latencia por fase de cada extracción.
+
+De un /reporte de 2–3 minutos solo quedaban líneas de log sueltas. Cada
+corrida abre una traza (`trace`) y las fases se marcan con `span`: lanzar
+Chromium, goto, reporte listo, cada slicer, cada tienda/visita, parseo y
+envío a Telegram. Los spans se anidan solos (contextvars: una tarea creada
+dentro de un span cuelga de él, también con varias páginas en paralelo) y
+llevan tags, entre ellos `strategy` (qué camino respondió: querydata, fila,
+donut, coordenadas...) y `outcome` (found, missing, error...).
+
+Al cerrar la traza:
+
+    - se escribe una línea JSON con el árbol completo en POWERBI_TIMING_LOG
+    - se suman los tiempos a histogramas por fase/estrategia/resultado en
+      POWERBI_TIMING_HIST (acumulan entre corridas)
+    - se loguea un resumen por fase
+
+Fuera de una traza (workers de extraction_workers.py, benchmarks) `span`
+no hace nada y casi no cuesta.
+
+    python timing.py                # histogramas acumulados
+    python timing.py --reset        # vaciarlos
+
+Configuración por entorno:
+    POWERBI_TIMING_LOG  = timing.jsonl           (off = sin líneas JSON)
+    POWERBI_TIMING_HIST = .powerbi_timing.json   (off = sin histogramas)
+"""
+
+import argparse
+import asyncio
+import json
+import logging
+import os
+import sys
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from datetime import datetime
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+TIMING_LOG  = os.getenv("POWERBI_TIMING_LOG", "timing.jsonl")
+TIMING_HIST = os.getenv("POWERBI_TIMING_HIST", ".powerbi_timing.json")
+# Límites superiores de los buckets (ms); el último bucket es "más que eso"
+BUCKETS_MS = (10, 25, 50, 100, 250, 500, 1000, 2500, 5000, 10000, 30000, 60000, 120000)
+
+_current: ContextVar["Span | None"] = ContextVar("timing_span", default=None)
+
+
+def _path(name: str) -> Path | None:
+    return Path(name) if name and name.lower() != "off" else None
+
+
+class Span:
+    """Una fase medida: nombre, tags, hijos y duración."""
+
+    __slots__ = ("name", "tags", "start", "end", "children")
+
+    def __init__(self, name: str, tags: dict):
+        self.name     = name
+        self.tags     = tags
+        self.start    = time.perf_counter()
+        self.end      = None
+        self.children = []
+
+    def tag(self, **tags):
+        self.tags.update(tags)
+
+    @property
+    def ms(self) -> float:
+        return ((self.end or time.perf_counter()) - self.start) * 1000
+
+    @property
+    def key(self) -> str:
+        """Clave del histograma: fase/estrategia:resultado."""
+        strategy, outcome = self.tags.get("strategy"), self.tags.get("outcome")
+        return self.name + (f"/{strategy}" if strategy else "") + (f":{outcome}" if outcome else "")
+
+    def walk(self):
+        yield self
+        for child in self.children:
+            yield from child.walk()
+
+    def as_dict(self, origin: float) -> dict:
+        out = {"name": self.name, "at": round((self.start - origin) * 1000, 1), "ms": round(self.ms, 1)}
+        if self.tags:
+            out["tags"] = self.tags
+        if self.children:
+            out["children"] = [c.as_dict(origin) for c in self.children]
+        return out
+
+    def __repr__(self):
+        return f"Span({self.key}, {self.ms:.0f} ms, {len(self.children)} hijos)"
+
+
+class _NoSpan:
+    """Lo que devuelve `span` fuera de una traza."""
+
+    __slots__ = ()
+
+    def tag(self, **tags):
+        pass
+
+
+_NO_SPAN = _NoSpan()
+
+
+@contextmanager
+def _enter(sp: Span):
+    token = _current.set(sp)
+    try:
+        yield sp
+    except asyncio.CancelledError:
+        sp.tags.setdefault("outcome", "cancelled")
+        raise
+    except BaseException as e:
+        sp.tags.setdefault("outcome", "error")
+        sp.tags.setdefault("error", type(e).__name__)
+        raise
+    finally:
+        sp.end = time.perf_counter()
+        _current.reset(token)
+
+
+@contextmanager
+def span(name: str, **tags):
+    """Fase dentro de la traza activa: `with span("goto"):` (también alrededor de awaits)."""
+    parent = _current.get()
+    if parent is None:
+        yield _NO_SPAN
+        return
+    sp = Span(name, tags)
+    parent.children.append(sp)
+    with _enter(sp):
+        yield sp
+
+
+def tag(**tags):
+    """Agrega tags al span activo (p. ej. la estrategia que terminó respondiendo)."""
+    sp = _current.get()
+    if sp is not None:
+        sp.tag(**tags)
+
+
+@contextmanager
+def trace(name: str, **tags):
+    """Una corrida completa; al salir escribe la línea JSON, los histogramas y el resumen."""
+    root = Span(name, tags)
+    try:
+        with _enter(root):
+            yield root
+    finally:
+        root.tags.setdefault("outcome", "ok")
+        try:
+            record(root)
+        except Exception as e:
+            logger.warning(f"No se pudieron guardar los tiempos: {e}")
+
+
+# ── Salida ────────────────────────────────────────────────────────────────────
+def record(root: Span):
+    log, hist = _path(TIMING_LOG), _path(TIMING_HIST)
+    if log:
+        line = {"ts": datetime.now().isoformat(timespec="seconds"), **root.as_dict(root.start)}
+        with log.open("a", encoding="utf-8") as f:
+            f.write(json.dumps(line, ensure_ascii=False, separators=(",", ":")) + "\n")
+    if hist:
+        update_histograms(hist, root)
+    logger.info(format_summary(root))
+
+
+def _bucket(ms: float) -> int:
+    return next((i for i, limit in enumerate(BUCKETS_MS) if ms <= limit), len(BUCKETS_MS))
+
+
+def load_histograms(path: Path) -> dict:
+    try:
+        data = json.loads(path.read_text(encoding="utf-8"))
+        return data if data.get("buckets_ms") == list(BUCKETS_MS) else {}
+    except (OSError, ValueError, AttributeError):
+        return {}
+
+
+def update_histograms(path: Path, root: Span):
+    """Suma cada span de la corrida a su histograma (clave fase/estrategia:resultado)."""
+    data = load_histograms(path) or {"buckets_ms": list(BUCKETS_MS), "runs": 0, "spans": {}}
+    data["runs"] += 1
+    for sp in root.walk():
+        key = sp.key if sp is not root else f"run:{sp.key}"
+        h = data["spans"].setdefault(key, {"count": 0, "sum_ms": 0.0, "max_ms": 0.0,
+                                           "counts": [0] * (len(BUCKETS_MS) + 1)})
+        h["count"] += 1
+        h["sum_ms"] = round(h["sum_ms"] + sp.ms, 1)
+        h["max_ms"] = round(max(h["max_ms"], sp.ms), 1)
+        h["counts"][_bucket(sp.ms)] += 1
+    tmp = path.with_suffix(path.suffix + ".tmp")
+    tmp.write_text(json.dumps(data, ensure_ascii=False, indent=1), encoding="utf-8")
+    os.replace(tmp, path)
+
+
+def quantile(h: dict, q: float) -> float:
+    """Cota superior (ms) del bucket donde cae el cuantil `q`."""
+    target, seen = q * h["count"], 0
+    for i, n in enumerate(h["counts"]):
+        seen += n
+        if n and seen >= target:
+            return BUCKETS_MS[i] if i < len(BUCKETS_MS) else h["max_ms"]
+    return h["max_ms"]
+
+
+def format_summary(root: Span) -> str:
+    """'⏱️ reporte 142.3s: goto 8.1s · slicer×6 9.3s · store×4 40.2s ...' por fase, en orden de aparición."""
+    phases = {}
+    for sp in root.walk():
+        if sp is not root:
+            n, total = phases.get(sp.name, (0, 0.0))
+            phases[sp.name] = (n + 1, total + sp.ms)
+    parts = [f"{name}{f'×{n}' if n > 1 else ''} {total / 1000:.1f}s" for name, (n, total) in phases.items()]
+    return f"⏱️ {root.key} {root.ms / 1000:.1f}s: " + (" · ".join(parts) or "sin fases")
+
+
+def format_histograms(data: dict) -> str:
+    lines = [f"📊 {data.get('runs', 0)} corridas"]
+    for key, h in sorted(data.get("spans", {}).items(), key=lambda kv: -kv[1]["sum_ms"]):
+        lines.append(f"   {key:<40} n={h['count']:<5} media={h['sum_ms'] / h['count']:>9.0f} ms  "
+                     f"p50≤{quantile(h, 0.5):>7.0f}  p95≤{quantile(h, 0.95):>7.0f}  máx={h['max_ms']:.0f}")
+    return "\n".join(lines)
+
+
+def main():
+    ap = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    ap.add_argument("--hist", default=TIMING_HIST)
+    ap.add_argument("--reset", action="store_true")
+    args = ap.parse_args()
+    path = _path(args.hist)
+    if path is None:
+        print("❌ Histogramas desactivados (POWERBI_TIMING_HIST=off)")
+        return 1
+    if args.reset:
+        path.unlink(missing_ok=True)
+        print(f"🧹 {path} vaciado")
+        return 0
+    data = load_histograms(path)
+    print(format_histograms(data) if data else f"❌ Sin histogramas en {path}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
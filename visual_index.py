@@ -0,0 +1,346 @@
+"""
+visual_index.py — Índice de frames y visuales del reporte, construido una vez.
+
+page_text, los slicers, el click por tienda, el donut de Success Rate y la
+búsqueda en la tabla recorrían cada uno todos los `page.frames` y todos los
+contenedores de visual (`.visual-container-modern` o `<visual-container>`,
+según la versión del visor) para encontrar lo suyo. Aquí una evaluación por
+frame clasifica los visuales una sola vez (slicer por título, tarjeta
+RecordUpdate, donut Success Rate, tabla, otro), los marca con un atributo
+`data-pbi-visual` y guarda {rol/título → frame + clave}; las búsquedas
+siguientes son un acceso al diccionario y un locator directo.
+
+`snapshot()` devuelve el estado vivo de los visuales (textos, aria-labels,
+celdas) con una evaluación por frame, para que los parsers vayan directo al
+donut de Success Rate o a la tarjeta RecordUpdate en vez de adivinar sobre
+el texto plano de toda la página.
+
+El índice se invalida cuando navega un frame de la página o cuando un
+visual indexado ya no está en el DOM (cambio de layout); la siguiente
+búsqueda lo reconstruye. Una búsqueda sin resultado también reconstruye una
+vez (el visual pudo pintarse después del índice). Un índice sin visuales o
+sin slicers (reporte aún sin render) no se guarda, para no dejar fija una
+página a medio pintar.
+"""
+
+import asyncio
+import hashlib
+import logging
+import weakref
+
+from report_parser import first_percent
+from selector_cache import selector_cache
+
+logger = logging.getLogger(__name__)
+
+SLICER, RECORD, SUCCESS_RATE, TABLE, OTHER = "slicer", "record", "success_rate", "table", "other"
+# Lo que tiene que estar pintado para tomar la huella del layout (un índice
+# parcial daría otra huella y borraría lo aprendido en selector_cache)
+LAYOUT_SLICERS = ("MES", "SUPERVISOR", "NRO. VISITA")
+LAYOUT_KINDS   = (RECORD,)
+
+# Texto de `document.body` o solo de los visuales pedidos, como lista de nodos de texto
+_TEXT_JS = r"""(keys) => {
+    const roots = keys === null ? [document.body]
+        : keys.map(k => document.querySelector(`[data-pbi-visual="${k}"]`));
+    const parts = [];
+    for (const root of roots) {
+        if (!root) continue;
+        const walker = document.createTreeWalker(root, NodeFilter.SHOW_TEXT, null);
+        let node;
+        while ((node = walker.nextNode())) {
+            const t = node.textContent.trim();
+            if (t) parts.push(t);
+        }
+    }
+    return parts;
+}"""
+
+# Estado vivo de los visuales indexados (todos o los de ciertos roles) en una evaluación
+_SNAPSHOT_JS = r"""(kinds) => {
+    const VISUALS = '.visual-container-modern, visual-container-modern, visual-container';
+    const sel = kinds ? kinds.map(k => `[data-pbi-kind="${k}"]`).join(',') : '[data-pbi-visual]';
+    const cellSel = 'td, th, [role="gridcell"], [role="cell"], [role="columnheader"], [role="rowheader"]';
+    return [...document.querySelectorAll(sel)].map(el => {
+        const v = el.closest(VISUALS) || el;
+        const parts = [];
+        const walker = document.createTreeWalker(v, NodeFilter.SHOW_TEXT, null);
+        let node;
+        while ((node = walker.nextNode())) {
+            const t = node.textContent.trim();
+            if (t) parts.push(t);
+        }
+        const aria = [v, ...v.querySelectorAll('[aria-label]')]
+            .map(e => e.getAttribute('aria-label')).filter(a => a).slice(0, 50);
+        const cells = [...v.querySelectorAll(cellSel)].map(c => (c.innerText || '').trim());
+        return {key: el.getAttribute('data-pbi-visual'), aria, parts, cells};
+    });
+}"""
+
+_INDEX_JS = r"""() => {
+    if (!document.body) return [];
+    const VISUALS = '.visual-container-modern, visual-container-modern, visual-container';
+    const gen = (window.__pbiVisualGen = (window.__pbiVisualGen || 0) + 1);
+    const out = [];
+    // Con un contenedor dentro de otro, cuenta solo el de afuera
+    [...document.querySelectorAll(VISUALS)].filter(v => !v.parentElement.closest(VISUALS)).forEach((v, i) => {
+        const header = v.querySelector('h3.slicer-header-text');
+        const text = (v.innerText || '').trim();
+        let kind = 'other', title = '';
+        let el = v;
+        if (header) {
+            kind = 'slicer';
+            title = header.textContent.trim();
+            el = header.closest('div.slicer-container') || v;
+        } else if (/R\s*e\s*c\s*o\s*r\s*d\s*U\s*p\s*d\s*a\s*t\s*e/i.test(text)) {
+            kind = 'record';
+        } else if (/suc+e?s+\s*rate/i.test(text) && !v.querySelector('tr, [role="row"]')) {
+            kind = 'success_rate';
+        } else if (v.querySelector('tr, [role="row"], [role="grid"], .pivotTable, .tableEx')) {
+            kind = 'table';
+        }
+        if (!title) {
+            const t = v.querySelector('.visualTitle, [class*="visualTitle"], [data-testid="visual-title"]');
+            title = t ? t.textContent.trim() : '';
+        }
+        const key = `${gen}-${i}`;
+        el.setAttribute('data-pbi-visual', key);
+        el.setAttribute('data-pbi-kind', kind);
+        const r = v.getBoundingClientRect();
+        out.push({key, kind, title,
+                  box: [Math.round(r.x), Math.round(r.y), Math.round(r.width), Math.round(r.height)]});
+    });
+    return out;
+}"""
+
+
+class Visual:
+    """Visual indexado: rol, título, caja y el frame donde vive."""
+
+    __slots__ = ("frame", "key", "kind", "title", "box")
+
+    def __init__(self, frame, record: dict):
+        self.frame = frame
+        self.key   = record["key"]
+        self.kind  = record["kind"]
+        self.title = record["title"]
+        self.box   = tuple(record["box"])
+
+    def locator(self):
+        return self.frame.locator(f"[data-pbi-visual='{self.key}']")
+
+    def __repr__(self):
+        return f"Visual({self.kind}, {self.title!r})"
+
+
+class Snapshot:
+    """Estado vivo de un visual: textos, aria-labels y celdas, más su entrada del índice."""
+
+    __slots__ = ("visual", "aria", "parts", "cells")
+
+    def __init__(self, visual: Visual, record: dict):
+        self.visual = visual
+        self.aria   = record["aria"]
+        self.parts  = record["parts"]
+        self.cells  = record["cells"]
+
+    @property
+    def kind(self) -> str:
+        return self.visual.kind
+
+    @property
+    def title(self) -> str:
+        return self.visual.title
+
+    @property
+    def text(self) -> str:
+        return "\n".join(self.parts)
+
+    def percent(self) -> str | None:
+        """Primer porcentaje válido (1–100) del visual: aria-label primero, luego el texto."""
+        return next(filter(None, map(first_percent, (*self.aria, *self.parts))), None)
+
+    def __repr__(self):
+        return f"Snapshot({self.kind}, {self.title!r}, {len(self.parts)} textos, {len(self.cells)} celdas)"
+
+
+class VisualIndex:
+    """Índice perezoso de una página; ver `index_for(page)`."""
+
+    def __init__(self, page):
+        self._page   = weakref.ref(page)
+        self.visuals: list[Visual] = []
+        self.by_kind: dict[str, list[Visual]] = {}
+        self.by_key:  dict[str, Visual] = {}
+        self.slicers: dict[str, Visual] = {}
+        self.frames  = []
+        self.stats   = {"builds": 0, "hits": 0, "invalidations": 0}
+        self._stale  = True
+        self._lock   = asyncio.Lock()
+        page.on("framenavigated", lambda frame: self.invalidate())
+
+    @property
+    def fingerprint(self) -> str:
+        """
+        Huella del layout: títulos de slicers y de visuales, que no cambian
+        con los filtros ni con el avance del render de los valores.
+        """
+        titles = sorted({f"{v.kind}:{v.title}" for v in self.visuals if v.kind == SLICER}
+                        | {f"title:{v.title}" for v in self.visuals if v.title and v.kind != SLICER})
+        return hashlib.sha1("\n".join(titles).encode("utf-8")).hexdigest()[:16]
+
+    @property
+    def complete(self) -> bool:
+        """True si el índice tiene los slicers y visuales que definen el layout."""
+        return (all(any(label in t for t in self.slicers) for label in LAYOUT_SLICERS)
+                and all(self.by_kind.get(k) for k in LAYOUT_KINDS))
+
+    def invalidate(self):
+        if not self._stale:
+            self._stale = True
+            self.stats["invalidations"] += 1
+
+    async def _build(self, page):
+        async def one(frame):
+            try:
+                return frame, await asyncio.wait_for(frame.evaluate(_INDEX_JS), timeout=5.0)
+            except Exception:
+                return frame, []
+
+        visuals = [Visual(frame, r) for frame, records in
+                   await asyncio.gather(*(one(f) for f in page.frames)) for r in records]
+        self.visuals = visuals
+        self.by_kind = {}
+        self.by_key  = {v.key: v for v in visuals}
+        for v in visuals:
+            self.by_kind.setdefault(v.kind, []).append(v)
+        self.slicers = {v.title.upper(): v for v in self.by_kind.get(SLICER, [])}
+        self.frames  = list(dict.fromkeys(v.frame for v in visuals))
+        self.stats["builds"] += 1
+        self._stale = not visuals or not self.slicers
+        if visuals:
+            if self.complete:
+                selector_cache().bind_layout(self.fingerprint)
+            logger.info(f"🗂️ Índice de visuales: {len(visuals)} en {len(self.frames)} frames "
+                        f"(slicers: {', '.join(self.slicers) or '-'}"
+                        f"{'' if self.complete else '; parcial, sin fijar huella'})")
+
+    async def ensure(self) -> "VisualIndex":
+        """Construye el índice si está vencido; si no, no toca la página."""
+        page = self._page()
+        if page is None:
+            return self
+        async with self._lock:
+            if self._stale:
+                await self._build(page)
+            else:
+                self.stats["hits"] += 1
+        return self
+
+    async def _lookup(self, find) -> Visual | None:
+        """
+        `find()` sobre el índice. Si no hay visual (índice armado a medio
+        render) o el hallado ya no está en el DOM (cambio de layout),
+        reconstruye una vez y vuelve a buscar.
+        """
+        await self.ensure()
+        visual = find()
+        if visual is None:
+            logger.info("🗂️ Visual no indexado; reconstruyendo índice")
+            self.invalidate()
+            await self.ensure()
+            return find()
+        try:
+            if await visual.locator().count() > 0:
+                return visual
+        except Exception:
+            pass
+        logger.info(f"🗂️ {visual} ya no está en el DOM; reconstruyendo índice")
+        self.invalidate()
+        await self.ensure()
+        return find()
+
+    async def slicer(self, label: str) -> Visual | None:
+        """Slicer cuyo título contiene `label` ('Supervisor', 'Nro. Visita', 'Mes')."""
+        label = label.upper()
+        return await self._lookup(lambda: self.slicers.get(label) or next(
+            (v for t, v in self.slicers.items() if label in t), None))
+
+    async def of_kind(self, *kinds: str) -> list[Visual]:
+        await self.ensure()
+        return [v for k in kinds for v in self.by_kind.get(k, [])]
+
+    async def snapshot(self, *kinds: str) -> list[Snapshot]:
+        """
+        Estado vivo de los visuales (todos, o solo los de `kinds`) con una
+        evaluación por frame, en paralelo. Si un visual desapareció, el índice
+        se reconstruye para la próxima llamada.
+        """
+        await self.ensure()
+        frames = list(dict.fromkeys(v.frame for v in self.visuals if not kinds or v.kind in kinds))
+
+        async def one(frame):
+            try:
+                return await asyncio.wait_for(frame.evaluate(_SNAPSHOT_JS, list(kinds) or None), timeout=8.0)
+            except Exception as e:
+                logger.debug(f"snapshot falló en {frame.url[:60]}: {e}")
+                return []
+
+        snaps = [Snapshot(self.by_key[r["key"]], r) for records in await asyncio.gather(*(one(f) for f in frames))
+                 for r in records if r["key"] in self.by_key]
+        expected = sum(1 for v in self.visuals if not kinds or v.kind in kinds)
+        if len(snaps) < expected:
+            self.invalidate()
+        return snaps
+
+    async def report_frames(self) -> list:
+        """Frames que tienen visuales; sin índice todavía, todos los de la página."""
+        await self.ensure()
+        if self.frames:
+            return self.frames
+        page = self._page()
+        return list(page.frames) if page is not None else []
+
+
+# ── Texto del reporte ─────────────────────────────────────────────────────────
+async def text_parts(page, visuals: list[Visual] | None = None, timeout: float = 12.0) -> list[str]:
+    """
+    Texto de los frames que tienen visuales —o solo de `visuals`— como lista
+    de partes (un nodo de texto por parte). Los frames se evalúan en paralelo:
+    cada llamada cuesta lo que el frame más lento, no la suma.
+    """
+    if visuals is None:
+        targets = {f: None for f in await index_for(page).report_frames()}
+    else:
+        targets = {}
+        for v in visuals:
+            targets.setdefault(v.frame, []).append(v.key)
+
+    async def one(frame, keys) -> list[str]:
+        try:
+            return await asyncio.wait_for(frame.evaluate(_TEXT_JS, keys), timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.warning(f"page_text: frame timeout ({timeout:.0f}s), continuando...")
+        except Exception:
+            pass
+        if keys is not None:
+            return []
+        try:
+            return (await frame.inner_text("body", timeout=5000)).split("\n")
+        except Exception:
+            return []
+
+    per_frame = await asyncio.gather(*(one(f, k) for f, k in targets.items()))
+    return [part for parts in per_frame for part in parts]
+
+
+# ── Registro por página ───────────────────────────────────────────────────────
+_indexes = weakref.WeakKeyDictionary()
+
+
+def index_for(page) -> VisualIndex:
+    """Índice (uno por página) de frames y visuales del reporte."""
+    idx = _indexes.get(page)
+    if idx is None:
+        idx = _indexes[page] = VisualIndex(page)
+    return idx